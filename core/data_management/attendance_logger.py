@@ -11,27 +11,53 @@ import json
 from pathlib import Path
 import threading
 import time
+from core.data_management.attendance_writer import AttendanceWriter
 
 class AttendanceLogger:
     """
     A class for logging and managing attendance records with improved reliability.
     """
     
-    def __init__(self, database_manager, config_manager):
+    def __init__(self, database_manager, config_manager, face_recognizer=None):
         """
         Initialize the attendance logger.
         
         Args:
             database_manager: Database manager instance
             config_manager: Configuration manager instance
+            face_recognizer (FaceRecognizer, optional): Recognizer scoped to the current subject's roster
         """
         self.db = database_manager
         self.config = config_manager
+        self.face_recognizer = face_recognizer
         self.current_subject = None
-        self.logging_active = False
-        self.logging_thread = None
-        self.attendance_buffer = []
-        self.buffer_lock = threading.Lock()
+        # (subject, roster) last passed to the face recognizer, and a counter bumped on each change
+        self._applied_roster = None
+        self.roster_version = 0
+        # Background group-commit writer, created by start_continuous_logging
+        self.writer = None
+        self.writer_lock = threading.Lock()
+        
+        # Seconds before a student already marked today is written again (0 = once per day)
+        try:
+            self.remark_window = float(self.config.get_value('Attendance', 'RemarkWindow', '0'))
+        except (TypeError, ValueError):
+            self.remark_window = 0.0
+        
+        # Flush once this many records are queued or the oldest has waited this many seconds
+        try:
+            self.write_batch_size = int(self.config.get_value('Attendance', 'WriteBatchSize', '64'))
+            self.write_latency = float(self.config.get_value('Attendance', 'WriteLatency', '0.5'))
+            self.write_queue_size = int(self.config.get_value('Attendance', 'WriteQueueSize', '10000'))
+        except (TypeError, ValueError):
+            self.write_batch_size = 64
+            self.write_latency = 0.5
+            self.write_queue_size = 10000
+    
+    @property
+    def logging_active(self):
+        """bool: True while the background writer is running."""
+        return self.writer is not None and self.writer.is_running()
     
     def set_subject(self, subject):
         """
@@ -39,22 +65,61 @@ class AttendanceLogger:
         
         Args:
             subject (str): Subject name
-            
+        
         Returns:
             bool: True if subject was set successfully, False otherwise
         """
         try:
+            # Nothing to do if the subject hasn't changed (called from the scanner hot path)
+            if subject == self.current_subject:
+                self._apply_roster()
+                return True
+            
+            # Queued records should be on disk before today's marks are reloaded; the wait
+            # is bounded because the scanner calls this from its frame loop
+            written = self.flush(timeout=self.write_latency * 4)
+            if not written:
+                print("Warning: attendance records are still waiting to be written; keeping their marks")
+            
             # Create subject directory if it doesn't exist
-            attendance_dir = self.config.get_path('Database', 'AttendanceDirectory')
-            subject_dir = os.path.join(attendance_dir, subject)
+            subject_dir = os.path.join(self.db.attendance_dir, subject)
             os.makedirs(subject_dir, exist_ok=True)
             
+            # Rebuild the "marked already" set from today's file, keeping the marks of
+            # records that are still queued
+            self.db.load_marked_attendance(subject, keep_marked=not written)
+            
             self.current_subject = subject
+            self._apply_roster()
             return True
         except Exception as e:
             print(f"Error setting subject: {e}")
             return False
     
+    def set_face_recognizer(self, face_recognizer):
+        """
+        Set the recognizer to scope to the current subject's roster.
+        
+        Args:
+            face_recognizer (FaceRecognizer): Face recognizer instance
+        """
+        self.face_recognizer = face_recognizer
+        self._applied_roster = None
+        self._apply_roster()
+    
+    def _apply_roster(self):
+        """Restrict the face recognizer to the current subject's roster if it changed."""
+        if self.face_recognizer is None or not self.current_subject:
+            return
+        
+        roster = self.db.get_subject_roster(self.current_subject)
+        if (self.current_subject, roster) == self._applied_roster:
+            return
+        
+        self.face_recognizer.set_roster(self.current_subject, roster)
+        self._applied_roster = (self.current_subject, roster)
+        self.roster_version += 1
+    
     def log_attendance(self, student_id, status="Present"):
         """
         Log attendance for a student.
@@ -62,7 +127,7 @@ class AttendanceLogger:
         Args:
             student_id (str): Student ID
             status (str): Attendance status (default: "Present")
-            
+        
         Returns:
             bool: True if attendance was logged successfully, False otherwise
         """
@@ -70,7 +135,37 @@ class AttendanceLogger:
             print("Error: No subject set for attendance logging")
             return False
         
-        return self.db.mark_attendance(student_id, self.current_subject, status)
+        writer = self.writer
+        if writer is None or not writer.is_running():
+            return self.db.mark_attendance(student_id, self.current_subject, status, remark_window=self.remark_window)
+        
+        # Reserve the mark now so repeat detections are skipped, and leave the write to the writer
+        success, pending = self.db.prepare_attendance(student_id, self.current_subject, status,
+                                                      remark_window=self.remark_window)
+        if pending is None:
+            return success
+        
+        subject, date, record = pending
+        if not writer.submit(subject, date, record):
+            self.db.forget_marked(subject, date, [record[0]])
+            print(f"Error: Attendance queue unavailable for student {student_id}")
+            return False
+        return True
+    
+    def is_marked(self, student_id):
+        """
+        Check if a student is already marked for the current subject.
+        
+        Args:
+            student_id (str): Student ID
+        
+        Returns:
+            bool: True if the student is marked and still within the re-mark window
+        """
+        if not self.current_subject:
+            return False
+        
+        return self.db.is_attendance_marked(student_id, self.current_subject, self.remark_window)
     
     def log_attendance_batch(self, attendance_records):
         """
@@ -78,7 +173,7 @@ class AttendanceLogger:
         
         Args:
             attendance_records (list): List of (student_id, status) tuples
-            
+        
         Returns:
             int: Number of records successfully logged
         """
@@ -86,93 +181,91 @@ class AttendanceLogger:
             print("Error: No subject set for attendance logging")
             return 0
         
-        success_count = 0
-        for student_id, status in attendance_records:
-            if self.db.mark_attendance(student_id, self.current_subject, status):
-                success_count += 1
-        
-        return success_count
+        subject = self.current_subject
+        return self.db.mark_attendance_many(
+            [(student_id, subject, status) for student_id, status in attendance_records]
+        )
     
     def start_continuous_logging(self, callback=None):
         """
-        Start continuous attendance logging in a separate thread.
+        Start the background writer so logged attendance is group-committed.
         
         Args:
-            callback (function, optional): Function to call when attendance is logged
-            
+            callback (function, optional): Called as callback(written, total) after each flush
+        
         Returns:
             bool: True if logging was started successfully, False otherwise
         """
-        if self.logging_active:
-            print("Continuous logging is already active")
-            return False
-        
-        if not self.current_subject:
-            print("Error: No subject set for attendance logging")
-            return False
-        
-        def logging_thread():
-            self.logging_active = True
-            print(f"Started continuous attendance logging for {self.current_subject}")
+        with self.writer_lock:
+            if self.logging_active:
+                print("Continuous logging is already active")
+                return False
             
-            while self.logging_active:
-                # Process any records in the buffer
-                with self.buffer_lock:
-                    records_to_process = self.attendance_buffer.copy()
-                    self.attendance_buffer = []
-                
-                if records_to_process:
-                    success_count = self.log_attendance_batch(records_to_process)
-                    
-                    if callback:
-                        callback(success_count, len(records_to_process))
-                
-                # Sleep for a short time
-                time.sleep(1)
-        
-        self.logging_thread = threading.Thread(target=logging_thread)
-        self.logging_thread.daemon = True
-        self.logging_thread.start()
+            if not self.current_subject:
+                print("Error: No subject set for attendance logging")
+                return False
+            
+            self.writer = AttendanceWriter(
+                self.db,
+                max_batch_size=self.write_batch_size,
+                max_latency=self.write_latency,
+                max_pending=self.write_queue_size,
+                callback=callback
+            )
+            self.writer.start()
+            print(f"Started continuous attendance logging for {self.current_subject}")
         
         return True
     
     def stop_continuous_logging(self):
         """
-        Stop continuous attendance logging.
+        Write any queued attendance and stop the background writer.
         
         Returns:
-            bool: True if logging was stopped successfully, False otherwise
+            bool: True if logging was stopped and everything was written, False otherwise
         """
-        if not self.logging_active:
-            print("Continuous logging is not active")
-            return False
+        with self.writer_lock:
+            if self.writer is None:
+                print("Continuous logging is not active")
+                return False
+            
+            writer = self.writer
+            self.writer = None
         
-        self.logging_active = False
+        return writer.close()
+    
+    def flush(self, timeout=None):
+        """
+        Wait until attendance queued in the background writer is written.
         
-        if self.logging_thread:
-            self.logging_thread.join(timeout=5)
-            self.logging_thread = None
+        Args:
+            timeout (float, optional): Seconds to wait. None waits until the queue is written.
         
-        return True
+        Returns:
+            bool: True if nothing is left waiting, False otherwise
+        """
+        writer = self.writer
+        if writer is None:
+            return True
+        
+        return writer.flush(timeout)
     
     def add_to_buffer(self, student_id, status="Present"):
         """
-        Add an attendance record to the buffer for continuous logging.
+        Queue an attendance record for the background writer.
         
         Args:
             student_id (str): Student ID
             status (str): Attendance status (default: "Present")
-            
+        
         Returns:
-            bool: True if record was added to buffer successfully, False otherwise
+            bool: True if record was queued successfully, False otherwise
         """
-        try:
-            with self.buffer_lock:
-                self.attendance_buffer.append((student_id, status))
-            return True
-        except Exception as e:
-            print(f"Error adding to attendance buffer: {e}")
-            return False
+        if not self.logging_active:
+            self.start_continuous_logging()
+        
+        # Falls back to a direct write if the writer could not be started
+        return self.log_attendance(student_id, status)
     
     def get_attendance_report(self, date=None):
         """
@@ -180,7 +273,7 @@ class AttendanceLogger:
         
         Args:
             date (str, optional): Date in YYYY-MM-DD format. If None, uses today's date.
-            
+        
         Returns:
             pandas.DataFrame: DataFrame containing attendance records
         """
@@ -197,7 +290,7 @@ class AttendanceLogger:
         Args:
             start_date (str, optional): Start date in YYYY-MM-DD format
             end_date (str, optional): End date in YYYY-MM-DD format
-            
+        
         Returns:
             pandas.DataFrame: DataFrame containing attendance summary
         """
@@ -216,7 +309,7 @@ class AttendanceLogger:
             format (str): Output format ('csv' or 'json')
             start_date (str, optional): Start date in YYYY-MM-DD format
             end_date (str, optional): End date in YYYY-MM-DD format
-            
+        
         Returns:
             bool: True if export was successful, False otherwise
         """
@@ -0,0 +1,260 @@
+"""
+Attendance Writer Module
+This module provides a background writer that group-commits attendance records.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+class AttendanceWriter:
+    """
+    A background writer for attendance records with group commit.
+    
+    Records are queued by the recognition path and written by one thread. A
+    flush happens once max_batch_size records are waiting or the oldest has
+    waited max_latency seconds, and writes each (subject, date) group with a
+    single append. The queue is bounded: when it is full, submitters wait.
+    Records whose write fails stay queued and are retried after a delay that
+    doubles with each failure, up to max_retry_delay.
+    """
+    
+    # First retry delay after a failed write, in seconds
+    INITIAL_RETRY_DELAY = 0.1
+    
+    def __init__(self, database_manager, max_batch_size=64, max_latency=0.5, max_pending=10000, callback=None,
+                 max_retry_delay=5.0):
+        """
+        Initialize the attendance writer.
+        
+        Args:
+            database_manager: Database manager instance (provides write_attendance)
+            max_batch_size (int): Waiting records that trigger a flush
+            max_latency (float): Seconds the oldest waiting record may wait before a flush
+            max_pending (int): Maximum number of waiting records
+            callback (function, optional): Called as callback(written, total) after each flush
+            max_retry_delay (float): Longest wait in seconds before retrying a failed write
+        """
+        self.db = database_manager
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, float(max_latency))
+        self.max_pending = max(1, int(max_pending))
+        self.callback = callback
+        self.max_retry_delay = max(self.INITIAL_RETRY_DELAY, float(max_retry_delay))
+        
+        # Waiting (subject, date, record) entries and the time the oldest was queued
+        self.condition = threading.Condition()
+        self.pending = deque()
+        self.oldest_time = None
+        self.writing = False
+        self.flush_requested = False
+        self.closed = False
+        self.thread = None
+        
+        # After a failed write: no flush before retry_at, and the current backoff
+        self.retry_at = None
+        self.retry_delay = 0.0
+        
+        # Counters
+        self.written_count = 0
+        self.failed_count = 0
+        self.flush_count = 0
+    
+    def start(self):
+        """Start the writer thread."""
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.closed = False
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+    
+    def is_running(self):
+        """
+        Check if the writer thread is running.
+        
+        Returns:
+            bool: True if running, False otherwise
+        """
+        return self.thread is not None and self.thread.is_alive()
+    
+    def submit(self, subject, date, record, timeout=None):
+        """
+        Queue a record for writing.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            record (tuple): (student_id, name, time, status)
+            timeout (float, optional): Seconds to wait while the queue is full. None waits until there is room.
+        
+        Returns:
+            bool: True if the record was queued, False if the queue stayed full or the writer is closed
+        """
+        with self.condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while len(self.pending) >= self.max_pending and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            
+            if self.closed:
+                return False
+            
+            # The first waiting record starts the latency timer, so wake the writer to
+            # sleep until it is due; a full batch wakes it to flush right away
+            first = not self.pending
+            if first:
+                self.oldest_time = time.monotonic()
+            self.pending.append((subject, date, record))
+            
+            if first or len(self.pending) >= self.max_batch_size:
+                self.condition.notify_all()
+            return True
+    
+    def _batch_ready(self):
+        """Check whether the writer should flush now (called with the condition held)."""
+        if not self.pending:
+            return False
+        if self.closed:
+            return True
+        return time.monotonic() >= self._due_time()
+    
+    def _due_time(self):
+        """Get the monotonic time the waiting records are due (called with the condition held)."""
+        if self.flush_requested or len(self.pending) >= self.max_batch_size:
+            due = 0.0
+        else:
+            due = self.oldest_time + self.max_latency
+        
+        # A failed write is not retried before its backoff, even for a full batch or a flush
+        if self.retry_at is not None:
+            due = max(due, self.retry_at)
+        return due
+    
+    def _run(self):
+        """Writer thread: wait for a batch, then write it outside the lock."""
+        while True:
+            with self.condition:
+                while not self._batch_ready():
+                    if self.closed:
+                        return
+                    
+                    # Sleep until the records are due, or until woken by submit/flush/close
+                    timeout = None
+                    if self.pending:
+                        timeout = max(0.0, self._due_time() - time.monotonic())
+                    self.condition.wait(timeout)
+                
+                batch = list(self.pending)
+                self.pending.clear()
+                self.oldest_time = None
+                self.flush_requested = False
+                self.writing = True
+                
+                # Room was freed for blocked submitters
+                self.condition.notify_all()
+            
+            failed = self._write(batch)
+            
+            with self.condition:
+                self.writing = False
+                if failed and not self.closed:
+                    # Retry after a growing backoff (at least the latency interval); keep queue order
+                    self.pending.extendleft(reversed(failed))
+                    self.oldest_time = time.monotonic()
+                    self.retry_delay = min(self.max_retry_delay, self.retry_delay * 2 or self.INITIAL_RETRY_DELAY)
+                    self.retry_at = self.oldest_time + max(self.max_latency, self.retry_delay)
+                elif failed:
+                    print(f"Dropping {len(failed)} attendance records that could not be written")
+                    for subject, date, record in failed:
+                        self.db.forget_marked(subject, date, [record[0]])
+                
+                if not failed:
+                    self.retry_at = None
+                    self.retry_delay = 0.0
+                self.condition.notify_all()
+    
+    def _write(self, batch):
+        """
+        Write a batch, one append per (subject, date) group.
+        
+        Args:
+            batch (list): (subject, date, record) entries in queue order
+        
+        Returns:
+            list: Entries whose write failed
+        """
+        groups = OrderedDict()
+        for subject, date, record in batch:
+            groups.setdefault((subject, date), []).append(record)
+        
+        written = 0
+        failed = []
+        for (subject, date), records in groups.items():
+            try:
+                self.db.write_attendance(subject, date, records)
+                written += len(records)
+            except Exception as e:
+                print(f"Error writing attendance for {subject} on {date}: {e}")
+                failed.extend((subject, date, record) for record in records)
+        
+        self.written_count += written
+        self.failed_count += len(failed)
+        self.flush_count += 1
+        
+        if self.callback:
+            try:
+                self.callback(written, len(batch))
+            except Exception as e:
+                print(f"Error in attendance writer callback: {e}")
+        
+        return failed
+    
+    def flush(self, timeout=None):
+        """
+        Write everything queued so far and wait for it.
+        
+        Args:
+            timeout (float, optional): Seconds to wait. None waits until the queue is written.
+        
+        Returns:
+            bool: True if the queue was written, False if records are still waiting
+        """
+        with self.condition:
+            if not self.is_running():
+                return not self.pending
+            
+            self.flush_requested = True
+            self.condition.notify_all()
+            
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.pending or self.writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+    
+    def close(self, timeout=5):
+        """
+        Write the remaining records and stop the writer thread.
+        
+        Args:
+            timeout (float): Seconds to wait for the final write
+        
+        Returns:
+            bool: True if everything was written, False otherwise
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        
+        if self.thread is not None:
+            self.thread.join(timeout)
+            if not self.thread.is_alive():
+                self.thread = None
+        
+        with self.condition:
+            return not self.pending and not self.writing
@@ -83,7 +83,29 @@ class ConfigManager:
                 "MinFaceSize": "30",
                 "ScaleFactor": "1.1",
                 "MinNeighbors": "5",
-                "ConfidenceThreshold": "80"
+                "ConfidenceThreshold": "80",
+                "DetectionInterval": "5",
+                "RecognitionVotes": "3",
+                "RecognitionVoteMargin": "2",
+                "RecognitionWorkers": "0",
+                "Backend": "opencv",
+                "TrainingWorkers": "0",
+                "ModelCheckInterval": "2",
+                "RosterCacheSize": "4"
+            },
+            "Attendance": {
+                "RemarkWindow": "0",
+                "WriteBatchSize": "64",
+                "WriteLatency": "0.5",
+                "WriteQueueSize": "10000"
+            },
+            "Database": {
+                "Backend": "csv",
+                "DatabaseFile": "attendance.db",
+                "AppendHandles": "16",
+                "FsyncRecords": "64",
+                "FsyncInterval": "1.0",
+                "ConnectionCheckInterval": "5"
             },
             "AlertSystem": {
                 "AlertDuration": "5",
@@ -4,23 +4,33 @@ This module provides functionality for managing student and attendance data.
 """
 
 import os
-import csv
+import numpy as np
 import pandas as pd
 import datetime
 import json
-from pathlib import Path
+import threading
+from time import monotonic
+
+from core.data_management.storage import create_storage
+from core.data_management.presence_index import PresenceIndex
+from core.data_management.history_index import StudentHistoryIndex, HISTORY_COLUMNS
+from utils.validators import validate_student_ids, validate_names
+
+# Columns of the per-row report returned by add_students_bulk
+BULK_REPORT_COLUMNS = ['Row', 'ID', 'Name', 'Result']
 
 class DatabaseManager:
     """
     A class for managing student and attendance data with improved reliability.
     """
     
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, config=None):
         """
         Initialize the database manager.
         
         Args:
             data_dir (str): Path to the data directory
+            config (ConfigManager, optional): Configuration manager selecting the storage backend
         """
         if data_dir is None:
             # Use the default data directory
@@ -38,14 +48,64 @@ class DatabaseManager:
         # Path to the student details file
         self.student_details_file = os.path.join(self.students_dir, 'student_details.csv')
         
-        # Create student details file if it doesn't exist
-        if not os.path.exists(self.student_details_file):
-            with open(self.student_details_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['ID', 'Name', 'Registration_Date'])
+        # Storage backend selected in the configuration: "csv" files or a "sqlite" database
+        self.backend = 'csv'
+        database_file = None
+        
+        # Seconds a successful connection check is trusted before it is repeated
+        self.connection_check_interval = 5.0
+        
+        # CSV attendance files kept open between appends, and how often they are fsynced
+        max_open_files = 16
+        fsync_records = 64
+        fsync_interval = 1.0
+        
+        if config is not None:
+            self.backend = str(config.get_value('Database', 'Backend', 'csv')).strip().lower()
+            database_file = config.get_value('Database', 'DatabaseFile', '')
+            try:
+                max_open_files = int(config.get_value('Database', 'AppendHandles', '16'))
+                fsync_records = int(config.get_value('Database', 'FsyncRecords', '64'))
+                fsync_interval = float(config.get_value('Database', 'FsyncInterval', '1.0'))
+                self.connection_check_interval = float(config.get_value('Database', 'ConnectionCheckInterval', '5'))
+            except (TypeError, ValueError):
+                pass
+        self.storage = create_storage(self.backend, data_dir, self.students_dir, self.attendance_dir, database_file,
+                                      max_open_files, fsync_records, fsync_interval)
+        
+        # Create the roster file or database if it doesn't exist
+        self.storage.initialize()
+        
+        # Path to the subject rosters file (subject -> list of enrolled student IDs)
+        self.subject_rosters_file = os.path.join(self.students_dir, 'subject_rosters.json')
+        self._subject_rosters = None
+        self._subject_rosters_signature = None
+        self._subject_rosters_lock = threading.Lock()
+        
+        # In-memory roster index (ID -> record), reloaded when the file changes
+        self._roster = None
+        self._roster_signature = None
+        self._roster_lock = threading.RLock()
+        
+        # Attendance already marked, keyed by (subject, date) -> {student_id: last marked datetime}
+        self._marked = {}
+        self._marked_lock = threading.Lock()
+        
+        # Serializes appends, so concurrent writers never interleave a day's file
+        self._write_lock = threading.Lock()
+        
+        # Packed-bit presence index per subject, loaded on first use and persisted under indexes/
+        self.index_dir = os.path.join(data_dir, 'indexes')
+        self._presence = {}
+        self._presence_lock = threading.RLock()
         
+        # Per-student history index across subjects, loaded on first use and persisted under indexes/
+        self._history = None
+        self._history_lock = threading.RLock()
+
         # Initialize connection status
         self._connected = self._check_connection()
+        self._connection_checked_at = monotonic()
     
     def _check_connection(self):
         """
@@ -65,15 +125,13 @@ class DatabaseManager:
             if not os.path.exists(self.attendance_dir) or not os.access(self.attendance_dir, os.W_OK):
                 return False
             
-            # Check if student details file is accessible
-            if os.path.exists(self.student_details_file):
-                # Try to read the file
-                pd.read_csv(self.student_details_file)
+            # Check if the roster is accessible
+            if self.storage.exists():
+                # Try to read it (served from the roster index when unchanged)
+                self._get_roster()
             else:
-                # Try to create the file
-                with open(self.student_details_file, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['ID', 'Name', 'Registration_Date'])
+                # Try to create it
+                self.storage.initialize()
             
             return True
         except Exception as e:
@@ -84,13 +142,68 @@ class DatabaseManager:
         """
         Check if the database is connected and accessible.
         
+        A successful check is trusted for connection_check_interval seconds, so
+        lookups on the recognition path don't touch the file system. A failed
+        check, or a failed write, is rechecked on the next call.
+        
         Returns:
             bool: True if connected, False otherwise
         """
+        now = monotonic()
+        if (self._connected and self._connection_checked_at is not None
+                and now - self._connection_checked_at < self.connection_check_interval):
+            return True
+        
         # Refresh connection status
         self._connected = self._check_connection()
+        self._connection_checked_at = now
         return self._connected
     
+    def _connection_failed(self):
+        """Force the next is_connected call to recheck, after a storage operation failed."""
+        self._connection_checked_at = None
+    
+    def _roster_file_signature(self):
+        """
+        Get the signature used to detect changes to the stored roster.
+        
+        Returns:
+            Signature from the storage backend, or None if the roster doesn't exist
+        """
+        return self.storage.students_signature()
+    
+    def _get_roster(self):
+        """
+        Get the in-memory roster index, reloading it if the file has changed.
+        
+        Returns:
+            dict: Mapping of student ID (str) to a dict with 'Name' and 'Registration_Date'
+        """
+        with self._roster_lock:
+            signature = self._roster_file_signature()
+            
+            if self._roster is not None and signature == self._roster_signature:
+                return self._roster
+            
+            roster = {}
+            if signature is not None:
+                df = self.storage.read_students(as_text=True)
+                for student_id, name, registration_date in zip(
+                    df['ID'].str.strip(), df['Name'], df.get('Registration_Date', [''] * len(df))
+                ):
+                    # Keep the first record for duplicated IDs, matching the old lookup order
+                    roster.setdefault(student_id, {'Name': name, 'Registration_Date': registration_date})
+            
+            self._roster = roster
+            self._roster_signature = signature
+            return self._roster
+    
+    def invalidate_roster(self):
+        """Drop the in-memory roster index so it is reloaded on next access."""
+        with self._roster_lock:
+            self._roster = None
+            self._roster_signature = None
+    
     def add_student(self, student_id, name):
         """
         Add a new student to the database.
@@ -108,24 +221,97 @@ class DatabaseManager:
                 print("Database is not connected")
                 return False
                 
-            # Check if student already exists
-            if self.student_exists(student_id):
-                print(f"Student with ID {student_id} already exists")
-                return False
-            
             # Get current date
             registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # Add student to the CSV file
-            with open(self.student_details_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([student_id, name, registration_date])
+            with self._roster_lock:
+                roster = self._get_roster()
+                
+                # Check if student already exists
+                if str(student_id).strip() in roster:
+                    print(f"Student with ID {student_id} already exists")
+                    return False
+                
+                # Add student to the stored roster
+                self.storage.add_student(student_id, name, registration_date)
+                
+                # Update the roster index in place instead of re-reading it
+                roster[str(student_id).strip()] = {'Name': name, 'Registration_Date': registration_date}
+                self._roster_signature = self._roster_file_signature()
             
             return True
         except Exception as e:
             print(f"Error adding student: {e}")
+            self._connection_failed()
             return False
     
+    def add_students_bulk(self, records):
+        """
+        Add many students with one roster lookup and one write.
+        
+        Each row is checked against the ID and name rules, against earlier rows
+        of the same import, and against the roster. Valid new students are
+        written together.
+        
+        Args:
+            records: DataFrame with ID and Name columns, or an iterable of (student_id, name) pairs
+        
+        Returns:
+            pandas.DataFrame: One row per input record with Row (1-based), ID, Name and Result
+                ('Added', 'Invalid ID', 'Invalid name', 'Duplicate in import' or 'Already registered').
+                Empty if the import failed.
+        """
+        try:
+            # Check connection
+            if not self.is_connected():
+                print("Database is not connected")
+                return pd.DataFrame(columns=BULK_REPORT_COLUMNS)
+            
+            if not isinstance(records, pd.DataFrame):
+                records = pd.DataFrame(list(records), columns=['ID', 'Name'])
+            
+            ids = records['ID'].astype(object).fillna('').astype(str).str.strip().reset_index(drop=True)
+            names = records['Name'].astype(object).fillna('').astype(str).str.strip().reset_index(drop=True)
+            
+            # Validate every row at once
+            valid_id = validate_student_ids(ids).to_numpy()
+            valid_name = validate_names(names).to_numpy()
+            duplicate = ids.duplicated(keep='first').to_numpy()
+            
+            registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            
+            with self._roster_lock:
+                roster = self._get_roster()
+                registered = ids.isin(roster.keys()).to_numpy()
+                
+                # The first failing check decides the row's result
+                result = np.select(
+                    [~valid_id, ~valid_name, registered, duplicate],
+                    ['Invalid ID', 'Invalid name', 'Already registered', 'Duplicate in import'],
+                    default='Added'
+                )
+                added = result == 'Added'
+                
+                if added.any():
+                    rows = [(student_id, name, registration_date) for student_id, name in zip(ids[added], names[added])]
+                    self.storage.add_students(rows)
+                    
+                    # Update the roster index in place instead of re-reading it
+                    for student_id, name, _ in rows:
+                        roster[student_id] = {'Name': name, 'Registration_Date': registration_date}
+                    self._roster_signature = self._roster_file_signature()
+            
+            return pd.DataFrame({
+                'Row': np.arange(1, len(ids) + 1),
+                'ID': ids,
+                'Name': names,
+                'Result': result
+            }, columns=BULK_REPORT_COLUMNS)
+        except Exception as e:
+            print(f"Error adding students: {e}")
+            self._connection_failed()
+            return pd.DataFrame(columns=BULK_REPORT_COLUMNS)
+
     def student_exists(self, student_id):
         """
         Check if a student with the given ID exists.
@@ -142,14 +328,8 @@ class DatabaseManager:
                 print("Database is not connected")
                 return False
                 
-            # Read the student details file
-            if not os.path.exists(self.student_details_file):
-                return False
-            
-            df = pd.read_csv(self.student_details_file)
-            
             # Check if the student ID exists
-            return str(student_id) in df['ID'].astype(str).values
+            return str(student_id).strip() in self._get_roster()
         except Exception as e:
             print(f"Error checking if student exists: {e}")
             return False
@@ -170,19 +350,13 @@ class DatabaseManager:
                 print("Database is not connected")
                 return None
                 
-            # Read the student details file
-            if not os.path.exists(self.student_details_file):
-                return None
-            
-            df = pd.read_csv(self.student_details_file)
-            
             # Find the student
-            student = df[df['ID'].astype(str) == str(student_id)]
+            student = self._get_roster().get(str(student_id).strip())
             
-            if len(student) == 0:
+            if student is None:
                 return None
             
-            return student['Name'].values[0]
+            return student['Name']
         except Exception as e:
             print(f"Error getting student name: {e}")
             return None
@@ -200,71 +374,394 @@ class DatabaseManager:
                 print("Database is not connected")
                 return pd.DataFrame(columns=['ID', 'Name', 'Registration_Date'])
                 
-            # Read the student details file
-            if not os.path.exists(self.student_details_file):
+            # Read the stored roster
+            if not self.storage.exists():
                 return pd.DataFrame(columns=['ID', 'Name', 'Registration_Date'])
             
-            return pd.read_csv(self.student_details_file)
+            return self.storage.read_students()
         except Exception as e:
             print(f"Error getting all students: {e}")
             return pd.DataFrame(columns=['ID', 'Name', 'Registration_Date'])
     
-    def mark_attendance(self, student_id, subject, status="Present"):
+    def _get_subject_rosters(self):
         """
-        Mark attendance for a student.
+        Get the subject rosters, reloading them if the file has changed.
+        
+        Returns:
+            dict: Mapping of subject name to a list of student IDs (str)
+        """
+        with self._subject_rosters_lock:
+            try:
+                stat = os.stat(self.subject_rosters_file)
+                signature = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            
+            if self._subject_rosters is not None and signature == self._subject_rosters_signature:
+                return self._subject_rosters
+            
+            rosters = {}
+            if signature is not None:
+                try:
+                    with open(self.subject_rosters_file, 'r') as f:
+                        rosters = {
+                            str(subject): [str(student_id).strip() for student_id in student_ids]
+                            for subject, student_ids in json.load(f).items()
+                        }
+                except Exception as e:
+                    print(f"Error reading subject rosters: {e}")
+            
+            self._subject_rosters = rosters
+            self._subject_rosters_signature = signature
+            return self._subject_rosters
+    
+    def get_subject_roster(self, subject):
+        """
+        Get the students enrolled in a subject.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            list: Student IDs (str), or None if the subject has no roster (every student may attend)
+        """
+        roster = self._get_subject_rosters().get(subject)
+        return None if roster is None else list(roster)
+    
+    def set_subject_roster(self, subject, student_ids):
+        """
+        Set the students enrolled in a subject.
+        
+        Args:
+            subject (str): Subject name
+            student_ids (list): Student IDs on the roster, or None to remove the roster
+        
+        Returns:
+            bool: True if the roster was saved successfully, False otherwise
+        """
+        try:
+            rosters = dict(self._get_subject_rosters())
+            if student_ids is None:
+                rosters.pop(subject, None)
+            else:
+                # Keep the given order but drop duplicates
+                rosters[subject] = list(dict.fromkeys(str(student_id).strip() for student_id in student_ids))
+            
+            # Write to a temporary file and swap it in, so readers never see a partial file
+            temp_file = self.subject_rosters_file + '.tmp'
+            with open(temp_file, 'w') as f:
+                json.dump(rosters, f, indent=2)
+            os.replace(temp_file, self.subject_rosters_file)
+            
+            with self._subject_rosters_lock:
+                self._subject_rosters = None
+            return True
+        except Exception as e:
+            print(f"Error saving subject roster: {e}")
+            return False
+    
+    def _get_marked(self, subject, date):
+        """
+        Get the students already marked for a subject on a date.
+        
+        The first access for a (subject, date) pair rebuilds the set from that day's
+        attendance file; later accesses are served from memory.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            
+        Returns:
+            dict: Mapping of student ID (str) to the datetime it was last marked
+        """
+        key = (subject, date)
+        marked = self._marked.get(key)
+        if marked is not None:
+            return marked
+        
+        marked = {}
+        try:
+            df = self.storage.read_attendance(subject, date, as_text=True)
+            for student_id, time in zip(df['ID'].astype(str).str.strip(), df['Time']):
+                try:
+                    marked_at = datetime.datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    marked_at = datetime.datetime.strptime(date, "%Y-%m-%d")
+                if student_id not in marked or marked_at > marked[student_id]:
+                    marked[student_id] = marked_at
+        except Exception as e:
+            print(f"Error reading attendance for {subject} on {date}: {e}")
+        
+        # Forget days before today so the set doesn't grow across sessions
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        for old_key in [k for k in self._marked if k[1] < today]:
+            del self._marked[old_key]
+        
+        self._marked[key] = marked
+        return marked
+    
+    def load_marked_attendance(self, subject, date=None, keep_marked=False):
+        """
+        Rebuild the "marked already" set for a subject from the day's attendance file.
+        
+        Args:
+            subject (str): Subject name
+            date (str, optional): Date in YYYY-MM-DD format. If None, uses today's date.
+            keep_marked (bool): Merge in the marks already held in memory, such as those
+                reserved for records that are still waiting to be written
+        
+        Returns:
+            int: Number of students already marked
+        """
+        if date is None:
+            date = datetime.datetime.now().strftime("%Y-%m-%d")
+        
+        with self._marked_lock:
+            previous = self._marked.pop((subject, date), None)
+            marked = self._get_marked(subject, date)
+            if keep_marked and previous:
+                for student_id, marked_at in previous.items():
+                    if student_id not in marked or marked_at > marked[student_id]:
+                        marked[student_id] = marked_at
+            return len(marked)
+    
+    def is_attendance_marked(self, student_id, subject, remark_window=0, now=None):
+        """
+        Check if a student's attendance is already marked for a subject today.
+        
+        Args:
+            student_id (str): Student ID
+            subject (str): Subject name
+            remark_window (float): Seconds after which a student counts as unmarked again.
+                0 or less means once per day.
+            now (datetime.datetime, optional): Reference time. If None, uses the current time.
+            
+        Returns:
+            bool: True if attendance is marked and still within the re-mark window
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        
+        with self._marked_lock:
+            last_marked = self._get_marked(subject, now.strftime("%Y-%m-%d")).get(str(student_id).strip())
+        
+        return self._within_remark_window(last_marked, now, remark_window)
+    
+    @staticmethod
+    def _within_remark_window(last_marked, now, remark_window):
+        """
+        Check if a previous mark still covers the given time.
+        
+        Args:
+            last_marked (datetime.datetime): Time of the previous mark, or None
+            now (datetime.datetime): Reference time
+            remark_window (float): Re-mark window in seconds (0 or less means once per day)
+            
+        Returns:
+            bool: True if the previous mark is still within the window
+        """
+        if last_marked is None:
+            return False
+        
+        if remark_window is None or remark_window <= 0:
+            return True
+        
+        return (now - last_marked).total_seconds() < remark_window
+    
+    def prepare_attendance(self, student_id, subject, status="Present", remark_window=None, now=None):
+        """
+        Check an attendance mark and reserve it without writing it.
+        
+        The student counts as marked from here on, so a record waiting in a
+        background writer's queue is not queued twice. The returned record is
+        written with write_attendance.
         
         Args:
             student_id (str): Student ID
             subject (str): Subject name
             status (str): Attendance status (default: "Present")
+            remark_window (float, optional): If set, skip the mark when the student was
+                already marked within this many seconds (0 or less means once per day).
+                If None, a record is always produced.
+            now (datetime.datetime, optional): Time of the mark. If None, uses the current time.
             
         Returns:
-            bool: True if attendance was marked successfully, False otherwise
+            tuple: (success, pending) where pending is (subject, date, record) to write, or None
+                if there is nothing to write (already marked, or success is False)
         """
         try:
             # Check connection
             if not self.is_connected():
                 print("Database is not connected")
-                return False
-                
-            # Check if student exists
-            if not self.student_exists(student_id):
+                return False, None
+            
+            # Check if student exists (one roster lookup also gives the name)
+            student = self._get_roster().get(str(student_id).strip())
+            if student is None:
                 print(f"Student with ID {student_id} does not exist")
-                return False
+                return False, None
             
             # Get current date and time
-            now = datetime.datetime.now()
+            if now is None:
+                now = datetime.datetime.now()
             date = now.strftime("%Y-%m-%d")
             time = now.strftime("%H:%M:%S")
             
-            # Create subject directory if it doesn't exist
-            subject_dir = os.path.join(self.attendance_dir, subject)
-            os.makedirs(subject_dir, exist_ok=True)
+            with self._marked_lock:
+                # Load the day's marks before appending so the new row isn't read back twice
+                marked = self._get_marked(subject, date)
+                
+                # Skip the disk append for repeat recognitions
+                if remark_window is not None and self._within_remark_window(
+                    marked.get(str(student_id).strip()), now, remark_window
+                ):
+                    return True, None
+                
+                marked[str(student_id).strip()] = now.replace(microsecond=0)
+            
+            return True, (subject, date, (student_id, student['Name'], time, status))
+        except Exception as e:
+            print(f"Error preparing attendance: {e}")
+            return False, None
+    
+    def write_attendance(self, subject, date, records):
+        """
+        Write attendance records of one subject and day in a single append.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            records (list): (student_id, name, time, status) tuples, e.g. from prepare_attendance
             
-            # Path to the attendance file for today
-            attendance_file = os.path.join(subject_dir, f"{date}.csv")
+        Raises:
+            Exception: If the storage backend fails to write the records
+        """
+        with self._write_lock:
+            # Write the records (and update loaded presence and history indexes in place)
+            before = self._indexed_day_signature(subject, date)
+            try:
+                self.storage.append_attendance(subject, date, records)
+            except Exception:
+                self._connection_failed()
+                raise
+            self._update_presence_index(subject, date, records, before)
+            self._update_history_index(subject, date, records, before)
+    
+    def forget_marked(self, subject, date, student_ids):
+        """
+        Drop reserved marks whose records could not be written, so the students can be marked again.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            student_ids (list): Student IDs to drop
+        """
+        with self._marked_lock:
+            marked = self._marked.get((subject, date))
+            if marked is not None:
+                for student_id in student_ids:
+                    marked.pop(str(student_id).strip(), None)
+    
+    def mark_attendance(self, student_id, subject, status="Present", remark_window=None):
+        """
+        Mark attendance for a student.
+        
+        Args:
+            student_id (str): Student ID
+            subject (str): Subject name
+            status (str): Attendance status (default: "Present")
+            remark_window (float, optional): If set, skip writing when the student was
+                already marked within this many seconds (0 or less means once per day).
+                If None, a record is always written.
             
-            # Create attendance file if it doesn't exist
-            file_exists = os.path.exists(attendance_file)
+        Returns:
+            bool: True if attendance was marked successfully (or was already marked), False otherwise
+        """
+        try:
+            success, pending = self.prepare_attendance(student_id, subject, status, remark_window)
+            if pending is None:
+                return success
             
-            with open(attendance_file, 'a', newline='') as f:
-                writer = csv.writer(f)
-                
-                # Write header if file doesn't exist
-                if not file_exists:
-                    writer.writerow(['ID', 'Name', 'Time', 'Status'])
-                
-                # Get student name
-                name = self.get_student_name(student_id)
-                
-                # Write attendance record
-                writer.writerow([student_id, name, time, status])
+            # Write attendance record
+            subject, date, record = pending
+            try:
+                self.write_attendance(subject, date, [record])
+            except Exception:
+                self.forget_marked(subject, date, [student_id])
+                raise
             
             return True
         except Exception as e:
             print(f"Error marking attendance: {e}")
             return False
     
+    def mark_attendance_many(self, records, remark_window=None):
+        """
+        Mark attendance for many students with one roster lookup and one write per file.
+        
+        Args:
+            records (list): (student_id, subject, status) tuples, optionally with a fourth
+                datetime.datetime element giving the time of the mark (default: now)
+            remark_window (float, optional): If set, skip writing when the student was
+                already marked within this many seconds (0 or less means once per day).
+                If None, a record is always written.
+        
+        Returns:
+            int: Number of records marked successfully (or already marked)
+        """
+        try:
+            # Check connection
+            if not self.is_connected():
+                print("Database is not connected")
+                return 0
+            
+            roster = self._get_roster()
+            default_now = datetime.datetime.now()
+            success_count = 0
+            
+            # Group the new records by (subject, date) file, reserving each mark. Each day's
+            # marks are looked up once, so a past day evicted from the cache mid-batch
+            # still sees the batch's own reservations
+            groups = {}
+            batch_marked = {}
+            with self._marked_lock:
+                for record in records:
+                    student_id, subject, status = record[:3]
+                    now = record[3] if len(record) > 3 and record[3] is not None else default_now
+                    key = str(student_id).strip()
+                    
+                    student = roster.get(key)
+                    if student is None:
+                        print(f"Student with ID {student_id} does not exist")
+                        continue
+                    
+                    date = now.strftime("%Y-%m-%d")
+                    marked = batch_marked.get((subject, date))
+                    if marked is None:
+                        marked = batch_marked[(subject, date)] = self._get_marked(subject, date)
+                    if remark_window is not None and self._within_remark_window(marked.get(key), now, remark_window):
+                        success_count += 1
+                        continue
+                    
+                    marked[key] = now.replace(microsecond=0)
+                    groups.setdefault((subject, date), []).append(
+                        (student_id, student['Name'], now.strftime("%H:%M:%S"), status)
+                    )
+            
+            # Write each file's records in one append
+            for (subject, date), group in groups.items():
+                try:
+                    self.write_attendance(subject, date, group)
+                    success_count += len(group)
+                except Exception as e:
+                    print(f"Error marking attendance for {subject} on {date}: {e}")
+                    self.forget_marked(subject, date, [student_id for student_id, _, _, _ in group])
+            
+            return success_count
+        except Exception as e:
+            print(f"Error marking attendance: {e}")
+            return 0
+
     def get_attendance(self, subject, date=None):
         """
         Get attendance records for a subject on a specific date.
@@ -286,21 +783,13 @@ class DatabaseManager:
             if date is None:
                 date = datetime.datetime.now().strftime("%Y-%m-%d")
             
-            # Path to the attendance file
-            subject_dir = os.path.join(self.attendance_dir, subject)
-            attendance_file = os.path.join(subject_dir, f"{date}.csv")
-            
-            # Check if the file exists
-            if not os.path.exists(attendance_file):
-                return pd.DataFrame(columns=['ID', 'Name', 'Time', 'Status'])
-            
-            # Read the attendance file
-            return pd.read_csv(attendance_file)
+            # Read the day's records
+            return self.storage.read_attendance(subject, date)
         except Exception as e:
             print(f"Error getting attendance: {e}")
             return pd.DataFrame(columns=['ID', 'Name', 'Time', 'Status'])
     
-    def get_attendance_range(self, subject, start_date=None, end_date=None):
+    def get_attendance_range(self, subject, start_date=None, end_date=None, columns=None):
         """
         Get attendance records for a subject over a date range.
         
@@ -308,60 +797,24 @@ class DatabaseManager:
             subject (str): Subject name
             start_date (str, optional): Start date in YYYY-MM-DD format
             end_date (str, optional): End date in YYYY-MM-DD format
+            columns (list, optional): Columns to load, e.g. ['ID', 'Date', 'Status'] to skip
+                parsing names and times. Defaults to all columns.
             
         Returns:
-            pandas.DataFrame: DataFrame containing attendance records
+            pandas.DataFrame: DataFrame containing attendance records (every column read as text)
         """
+        empty_columns = columns or ['ID', 'Name', 'Date', 'Time', 'Status']
         try:
             # Check connection
             if not self.is_connected():
                 print("Database is not connected")
-                return pd.DataFrame(columns=['ID', 'Name', 'Date', 'Time', 'Status'])
+                return pd.DataFrame(columns=empty_columns)
                 
-            # Path to the subject directory
-            subject_dir = os.path.join(self.attendance_dir, subject)
-            
-            # Check if the directory exists
-            if not os.path.exists(subject_dir):
-                return pd.DataFrame(columns=['ID', 'Name', 'Date', 'Time', 'Status'])
-            
-            # Get all attendance files
-            attendance_files = [f for f in os.listdir(subject_dir) if f.endswith('.csv')]
-            
-            # Filter by date range if specified
-            if start_date:
-                attendance_files = [f for f in attendance_files if f.split('.')[0] >= start_date]
-            if end_date:
-                attendance_files = [f for f in attendance_files if f.split('.')[0] <= end_date]
-            
-            # Sort by date
-            attendance_files.sort()
-            
-            # Initialize result DataFrame
-            result = pd.DataFrame(columns=['ID', 'Name', 'Date', 'Time', 'Status'])
-            
-            # Process each attendance file
-            for file in attendance_files:
-                date = file.split('.')[0]
-                file_path = os.path.join(subject_dir, file)
-                
-                # Read the attendance file
-                try:
-                    attendance = pd.read_csv(file_path)
-                    
-                    # Add date column
-                    attendance['Date'] = date
-                    
-                    # Append to result
-                    result = pd.concat([result, attendance])
-                except Exception as e:
-                    print(f"Error reading attendance file {file_path}: {e}")
-                    continue
-            
-            return result
+            # Read the records of every day in the range
+            return self.storage.read_attendance_range(subject, start_date, end_date, columns)
         except Exception as e:
             print(f"Error getting attendance range: {e}")
-            return pd.DataFrame(columns=['ID', 'Name', 'Date', 'Time', 'Status'])
+            return pd.DataFrame(columns=empty_columns)
     
     def get_attendance_summary(self, subject, start_date=None, end_date=None):
         """
@@ -373,7 +826,8 @@ class DatabaseManager:
             end_date (str, optional): End date in YYYY-MM-DD format
             
         Returns:
-            pandas.DataFrame: DataFrame containing attendance summary
+            pandas.DataFrame: Summary indexed by student ID with a Name column, one Present/Absent
+                column per date, the number of days present (Total) and the attendance Percentage
         """
         try:
             # Check connection
@@ -381,58 +835,302 @@ class DatabaseManager:
                 print("Database is not connected")
                 return pd.DataFrame()
                 
-            # Path to the subject directory
-            subject_dir = os.path.join(self.attendance_dir, subject)
-            
-            # Check if the directory exists
-            if not os.path.exists(subject_dir):
+            # Check if the subject exists
+            if not self.storage.has_subject(subject):
                 return pd.DataFrame()
             
-            # Get all attendance files
-            attendance_files = [f for f in os.listdir(subject_dir) if f.endswith('.csv')]
-            
-            # Filter by date range if specified
-            if start_date:
-                attendance_files = [f for f in attendance_files if f.split('.')[0] >= start_date]
-            if end_date:
-                attendance_files = [f for f in attendance_files if f.split('.')[0] <= end_date]
+            # Students in roster order, one row per ID
+            roster = self._get_roster()
+            student_ids = pd.Index(list(roster.keys()), name='ID')
             
-            # Sort by date
-            attendance_files.sort()
+            # Student x date presence matrix from the presence index (days without records count as absent)
+            index = self.get_presence_index(subject)
+            start, end = index.column_range(start_date, end_date)
+            attendance_dates = index.dates[start:end]
+            presence = index.matrix(start_date, end_date, student_ids)
             
-            # Initialize summary DataFrame
-            all_students = self.get_all_students()
-            summary = pd.DataFrame(index=all_students['ID'].astype(str))
-            summary['Name'] = all_students['Name']
-            
-            # Process each attendance file
-            for file in attendance_files:
-                date = file.split('.')[0]
-                file_path = os.path.join(subject_dir, file)
-                
-                # Read the attendance file
-                attendance = pd.read_csv(file_path)
-                
-                # Create a pivot table for this date
-                pivot = pd.pivot_table(
-                    attendance, 
-                    values='Status', 
-                    index='ID', 
-                    columns=None, 
-                    aggfunc=lambda x: 'Present' if 'Present' in x.values else 'Absent'
-                )
-                
-                # Add to summary
-                summary[date] = 'Absent'
-                for idx, row in pivot.iterrows():
-                    if str(idx) in summary.index:
-                        summary.at[str(idx), date] = row['Status']
+            # Name, one Present/Absent column per date, then totals
+            summary = pd.DataFrame(
+                np.where(presence, 'Present', 'Absent'), index=student_ids, columns=attendance_dates, dtype=object
+            )
+            summary.insert(0, 'Name', [student['Name'] for student in roster.values()])
+            summary['Total'] = presence.sum(axis=1)
+            summary['Percentage'] = (100.0 * summary['Total'] / max(len(attendance_dates), 1)).round(2)
             
             return summary
         except Exception as e:
             print(f"Error getting attendance summary: {e}")
             return pd.DataFrame()
     
+    def _presence_index_path(self, subject):
+        """Get the path of a subject's persisted presence index."""
+        return os.path.join(self.index_dir, f"{subject}.presence.npz")
+    
+    def _refresh_presence_index(self, subject, index):
+        """
+        Bring a presence index up to date with the stored records.
+        
+        Only days whose storage signature changed since they were indexed are re-read.
+        
+        Args:
+            subject (str): Subject name
+            index (PresenceIndex): Index to refresh
+        
+        Returns:
+            PresenceIndex: The refreshed index (a new one if days were deleted)
+        """
+        signatures = self.storage.day_signatures(subject)
+        
+        # Deleted days can't be patched out; rebuild from scratch
+        if any(date not in signatures for date in index.dates):
+            index = PresenceIndex()
+        
+        stale = {date: signature for date, signature in signatures.items() if index.signatures.get(date) != signature}
+        if not stale:
+            return index
+        
+        # One range read covering the changed days
+        records = self.storage.read_attendance_range(subject, min(stale), max(stale), columns=['ID', 'Date', 'Status'])
+        present = records[(records['Status'] == 'Present') & records['Date'].isin(list(stale))]
+        index.set_days(stale, present['ID'].to_numpy(), present['Date'].to_numpy())
+        return index
+    
+    def get_presence_index(self, subject):
+        """
+        Get the presence index of a subject, loading and refreshing it as needed.
+        
+        The index answers percentages, streaks, absentee lists and per-day
+        counts with popcounts instead of re-reading the attendance records
+        (see PresenceIndex). It is saved to indexes/<subject>.presence.npz.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            PresenceIndex: Index with a row for every roster student
+        """
+        with self._presence_lock:
+            path = self._presence_index_path(subject)
+            index = self._presence.get(subject)
+            
+            if index is None and os.path.exists(path):
+                try:
+                    index = PresenceIndex.load(path)
+                except Exception as e:
+                    print(f"Error loading presence index {path}: {e}")
+            if index is None:
+                index = PresenceIndex()
+            
+            index = self._refresh_presence_index(subject, index)
+            
+            # Students without any record still get a (empty) row
+            for student_id in self._get_roster():
+                index.add_student(student_id)
+            
+            self._presence[subject] = index
+            self._save_presence_index(subject, index)
+            return index
+    
+    def _save_presence_index(self, subject, index):
+        """Save a presence index if it has unsaved changes."""
+        if not index.dirty:
+            return
+        
+        path = self._presence_index_path(subject)
+        try:
+            index.save(path)
+        except Exception as e:
+            print(f"Error saving presence index {path}: {e}")
+    
+    def _indexed_day_signature(self, subject, date):
+        """
+        Get a day's storage signature before a write, if an index covering the day is loaded.
+        
+        Returns:
+            tuple: Signature of the day, or None if neither the subject's presence index
+                nor the history index is loaded
+        """
+        if subject not in self._presence and self._history is None:
+            return None
+        return self.storage.day_signature(subject, date)
+    
+    def _update_presence_index(self, subject, date, records, before):
+        """
+        Apply written records to a loaded presence index.
+        
+        The index is only patched when it was current before the write;
+        otherwise the day is left stale and re-read on the next refresh.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            records (list): Written (student_id, name, time, status) tuples
+            before (tuple): Day signature taken before the write
+        """
+        index = self._presence.get(subject)
+        if index is None:
+            return
+        
+        with self._presence_lock:
+            if index.signatures.get(date) != before:
+                return
+            
+            index.add_date(date)
+            for student_id, _, _, status in records:
+                if status == 'Present':
+                    index.mark(str(student_id).strip(), date)
+            index.signatures[date] = self.storage.day_signature(subject, date)
+    
+    def _history_index_path(self):
+        """Get the path of the persisted history index."""
+        return os.path.join(self.index_dir, "history.npz")
+    
+    def _refresh_history_index(self, index):
+        """
+        Bring the history index up to date with the stored records.
+        
+        Only days whose storage signature changed since they were indexed are re-read.
+        
+        Args:
+            index (StudentHistoryIndex): Index to refresh
+        """
+        subjects = self.storage.list_subjects()
+        
+        # Days of subjects that no longer exist
+        index.remove_days([day for day in index.signatures if day[0] not in subjects])
+        
+        for subject in subjects:
+            signatures = self.storage.day_signatures(subject)
+            index.remove_days([day for day in index.days(subject) if day[1] not in signatures])
+            
+            stale = {date: signature for date, signature in signatures.items()
+                     if index.signatures.get((subject, date)) != signature}
+            if not stale:
+                continue
+            
+            # One range read covering the subject's changed days
+            records = self.storage.read_attendance_range(
+                subject, min(stale), max(stale), columns=['ID', 'Date', 'Time', 'Status']
+            )
+            index.set_days(subject, stale, records)
+    
+    def get_history_index(self):
+        """
+        Get the per-student history index, loading and refreshing it as needed.
+        
+        The index maps each student to their (subject, date, time, status)
+        postings, so a student's history is read without walking every
+        subject's records (see StudentHistoryIndex). It is saved to
+        indexes/history.npz.
+        
+        Returns:
+            StudentHistoryIndex: Index of every stored attendance record
+        """
+        with self._history_lock:
+            path = self._history_index_path()
+            index = self._history
+            
+            if index is None and os.path.exists(path):
+                try:
+                    index = StudentHistoryIndex.load(path)
+                except Exception as e:
+                    print(f"Error loading history index {path}: {e}")
+            if index is None:
+                index = StudentHistoryIndex()
+            
+            self._refresh_history_index(index)
+            
+            self._history = index
+            self._save_history_index()
+            return index
+    
+    def rebuild_history_index(self):
+        """
+        Rebuild the history index from all stored attendance records.
+        
+        Returns:
+            StudentHistoryIndex: The rebuilt index
+        """
+        with self._history_lock:
+            self._history = None
+            path = self._history_index_path()
+            if os.path.exists(path):
+                os.remove(path)
+            return self.get_history_index()
+    
+    def _save_history_index(self):
+        """Save the history index if it has unsaved changes."""
+        index = self._history
+        if index is None or not index.dirty:
+            return
+        
+        path = self._history_index_path()
+        try:
+            index.save(path)
+        except Exception as e:
+            print(f"Error saving history index {path}: {e}")
+    
+    def _update_history_index(self, subject, date, records, before):
+        """
+        Apply written records to a loaded history index.
+        
+        The index is only patched when the day was current before the write;
+        otherwise it is left stale and re-read on the next refresh.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            records (list): Written (student_id, name, time, status) tuples
+            before (tuple): Day signature taken before the write
+        """
+        index = self._history
+        if index is None:
+            return
+        
+        with self._history_lock:
+            if index.signatures.get((subject, date)) != before:
+                return
+            
+            index.add(subject, date, [record[0] for record in records], [record[2] for record in records],
+                      [record[3] for record in records])
+            index.signatures[(subject, date)] = self.storage.day_signature(subject, date)
+    
+    def get_student_history(self, student_id, start_date=None, end_date=None):
+        """
+        Get a student's attendance across all subjects over a date range.
+        
+        Args:
+            student_id (str): Student ID
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            pandas.DataFrame: Records with Subject, Date, Time and Status columns in date and time order
+        """
+        try:
+            # Check connection
+            if not self.is_connected():
+                print("Database is not connected")
+                return pd.DataFrame(columns=HISTORY_COLUMNS)
+            
+            postings = self.get_history_index().history(student_id, start_date, end_date)
+            history = pd.DataFrame(postings, columns=['Date', 'Time', 'Subject', 'Status'], dtype=object)
+            return history[HISTORY_COLUMNS]
+        except Exception as e:
+            print(f"Error getting student history: {e}")
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+    
+    def close(self):
+        """Save the presence and history indexes and close the storage backend (database connections)."""
+        with self._presence_lock:
+            for subject, index in self._presence.items():
+                self._save_presence_index(subject, index)
+        
+        with self._history_lock:
+            self._save_history_index()
+
+        self.storage.close()
+    
     def export_attendance(self, subject, output_file, format='csv', start_date=None, end_date=None):
         """
         Export attendance records to a file.
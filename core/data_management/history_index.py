@@ -0,0 +1,237 @@
+"""
+History Index Module
+This module provides a per-student attendance history index across subjects.
+"""
+
+import os
+import bisect
+import numpy as np
+import pandas as pd
+
+# Columns of a student's attendance history
+HISTORY_COLUMNS = ['Subject', 'Date', 'Time', 'Status']
+
+# Fields of a posting, in tuple order
+POSTING_FIELDS = ('date', 'time', 'subject', 'status')
+
+class StudentHistoryIndex:
+    """
+    Attendance postings of every student across all subjects.
+    
+    Each student maps to a list of (date, time, subject, status) postings in
+    date order, so a date range is two bisections. For every indexed
+    (subject, date) day the storage signature and the students it holds are
+    kept, so a changed day is replaced without touching other students and a
+    persisted index only re-reads the days that changed.
+    """
+    
+    def __init__(self):
+        """Initialize an empty history index."""
+        # Student ID -> sorted (date, time, subject, status) postings
+        self.postings = {}
+        
+        # (subject, date) -> storage signature, and -> IDs of the students it holds
+        self.signatures = {}
+        self.day_students = {}
+        
+        # Whether there are changes not yet saved
+        self.dirty = False
+    
+    def __len__(self):
+        """Get the number of postings."""
+        return sum(len(postings) for postings in self.postings.values())
+    
+    def days(self, subject=None):
+        """
+        Get the indexed days.
+        
+        Args:
+            subject (str, optional): Only the days of this subject
+        
+        Returns:
+            list: (subject, date) pairs
+        """
+        return [day for day in self.signatures if subject is None or day[0] == subject]
+    
+    def add(self, subject, date, student_ids, times, statuses):
+        """
+        Add postings of one day.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            student_ids: Student ID of each record (surrounding whitespace is ignored)
+            times: Time of each record
+            statuses: Status of each record
+        """
+        students = self.day_students.setdefault((subject, date), set())
+        for student_id, time, status in zip(student_ids, times, statuses):
+            student_id = str(student_id).strip()
+            postings = self.postings.setdefault(student_id, [])
+            posting = (date, str(time), subject, str(status))
+            
+            # Records usually arrive in time order, so this is an append
+            if not postings or postings[-1] <= posting:
+                postings.append(posting)
+            else:
+                bisect.insort(postings, posting)
+            students.add(student_id)
+        self.dirty = True
+    
+    def remove_days(self, days):
+        """
+        Remove the postings of some days.
+        
+        Args:
+            days (list): (subject, date) pairs to remove
+        """
+        days = set(days)
+        affected = set()
+        for day in days:
+            affected.update(self.day_students.pop(day, ()))
+            self.signatures.pop(day, None)
+        
+        for student_id in affected:
+            postings = [posting for posting in self.postings[student_id] if (posting[2], posting[0]) not in days]
+            if postings:
+                self.postings[student_id] = postings
+            else:
+                del self.postings[student_id]
+        
+        if days:
+            self.dirty = True
+    
+    def set_days(self, subject, signatures, records):
+        """
+        Replace the postings of several days of a subject.
+        
+        Args:
+            subject (str): Subject name
+            signatures (dict): Mapping of each replaced date to the storage signature of its records
+            records (pandas.DataFrame): The days' records with ID, Date, Time and Status columns
+        """
+        self.remove_days([(subject, date) for date in signatures])
+        
+        records = records[records['Date'].isin(list(signatures))]
+        if len(records):
+            # Strip each distinct ID once, then sort the records by student, date and time
+            codes, uniques = pd.factorize(records['ID'].astype(object))
+            student_ids = np.array([str(student_id).strip() for student_id in uniques], dtype=object)
+            records = records.assign(_student=student_ids[codes]).sort_values(['_student', 'Date', 'Time'], kind='stable')
+            
+            students = records['_student'].tolist()
+            postings = list(zip(records['Date'].astype(str).tolist(), records['Time'].astype(str).tolist(),
+                                [subject] * len(records), records['Status'].astype(str).tolist()))
+            
+            # One extend per student; sort only if the new postings interleave with older ones
+            starts = [0] + [i for i in range(1, len(students)) if students[i] != students[i - 1]] + [len(students)]
+            for start, end in zip(starts[:-1], starts[1:]):
+                student_postings = self.postings.setdefault(students[start], [])
+                in_order = not student_postings or student_postings[-1] <= postings[start]
+                student_postings.extend(postings[start:end])
+                if not in_order:
+                    student_postings.sort()
+            
+            for date, day_students in records.groupby('Date', sort=False)['_student']:
+                self.day_students[(subject, date)] = set(day_students.tolist())
+        
+        for date, signature in signatures.items():
+            self.signatures[(subject, date)] = signature
+            self.day_students.setdefault((subject, date), set())
+        self.dirty = True
+    
+    def history(self, student_id, start_date=None, end_date=None):
+        """
+        Get a student's postings over a date range.
+        
+        Args:
+            student_id (str): Student ID
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            list: (date, time, subject, status) postings in date and time order
+        """
+        postings = self.postings.get(str(student_id).strip(), [])
+        start = bisect.bisect_left(postings, (start_date,)) if start_date else 0
+        end = bisect.bisect_left(postings, (end_date + "\0",)) if end_date else len(postings)
+        return postings[start:end]
+    
+    def save(self, path):
+        """
+        Save the index (written to a temporary file and swapped in).
+        
+        Postings are stored as codes into small tables of the distinct dates,
+        times, subjects and statuses.
+        
+        Args:
+            path (str): Path to the .npz index file
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path[:-len(".npz")] + ".tmp.npz" if path.endswith(".npz") else path + ".tmp"
+        
+        student_ids = list(self.postings)
+        postings = [posting for student_id in student_ids for posting in self.postings[student_id]]
+        fields = list(zip(*postings)) if postings else [(), (), (), ()]
+        
+        arrays = {}
+        for name, values in zip(POSTING_FIELDS, fields):
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+            arrays[f"{name}_codes"] = codes.astype(np.int32)
+            arrays[f"{name}_values"] = np.array(list(uniques), dtype=str)
+        
+        signed_days = [day for day, signature in self.signatures.items() if signature is not None]
+        np.savez(
+            temp_path,
+            student_ids=np.array(student_ids, dtype=str),
+            posting_counts=np.array([len(self.postings[student_id]) for student_id in student_ids], dtype=np.int64),
+            days=np.array(signed_days, dtype=str).reshape(-1, 2),
+            signatures=np.array([self.signatures[day] for day in signed_days], dtype=np.int64).reshape(-1, 2),
+            **arrays
+        )
+        os.replace(temp_path, path)
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save.
+        
+        Args:
+            path (str): Path to the .npz index file
+        
+        Returns:
+            StudentHistoryIndex: The loaded index
+        """
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            student_ids = np.array(data['student_ids'].tolist(), dtype=object)
+            counts = data['posting_counts']
+            days = [tuple(day) for day in data['days'].tolist()]
+            signatures = [tuple(signature) for signature in data['signatures'].tolist()]
+            codes = {name: data[f"{name}_codes"] for name in POSTING_FIELDS}
+            values = {name: np.array(data[f"{name}_values"].tolist(), dtype=object) for name in POSTING_FIELDS}
+        
+        if len(student_ids) != len(counts) or len(days) != len(signatures) or any(
+            len(field_codes) != counts.sum() for field_codes in codes.values()
+        ):
+            raise ValueError(f"History index {path} is inconsistent")
+        
+        # Rebuild the posting tuples from the value tables (shared strings)
+        postings = list(zip(*(values[name][codes[name]].tolist() for name in POSTING_FIELDS)))
+        offsets = np.concatenate(([0], np.cumsum(counts))).tolist()
+        for student_id, start, end in zip(student_ids.tolist(), offsets[:-1], offsets[1:]):
+            index.postings[student_id] = postings[start:end]
+        
+        # Students of each day, grouping the postings by (subject, date) codes
+        index.signatures = dict(zip(days, signatures))
+        index.day_students = {day: set() for day in days}
+        posting_students = np.repeat(np.arange(len(student_ids)), counts)
+        day_codes = codes['subject'].astype(np.int64) * max(len(values['date']), 1) + codes['date']
+        order = np.argsort(day_codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(day_codes[order])) + 1
+        for group in np.split(order, boundaries) if len(order) else []:
+            first = group[0]
+            day = (values['subject'][codes['subject'][first]], values['date'][codes['date'][first]])
+            index.day_students[day] = set(student_ids[posting_students[group]].tolist())
+        return index
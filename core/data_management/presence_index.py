@@ -0,0 +1,369 @@
+"""
+Presence Index Module
+This module provides a packed-bit student x day presence index for attendance analytics.
+"""
+
+import os
+import bisect
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+class PresenceIndex:
+    """
+    A presence matrix of one subject, one bit per student per day.
+    
+    Rows are students and columns are days in date order. Each row is packed
+    into bytes (np.packbits order), so counts over a date range are popcounts
+    of the masked bytes. For every indexed day the storage signature is kept,
+    so a persisted index only re-reads the days that changed.
+    """
+    
+    def __init__(self):
+        """Initialize an empty presence index."""
+        # Row <-> student ID and column <-> date maps
+        self.student_ids = []
+        self.rows = {}
+        self.dates = []
+        self.columns = {}
+        
+        # Packed bits with spare capacity: (row capacity, byte capacity)
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+        
+        # Storage signature of each day when it was indexed
+        self.signatures = {}
+        
+        # Whether there are changes not yet saved
+        self.dirty = False
+    
+    @property
+    def byte_count(self):
+        """
+        Get the number of bytes holding the indexed days of one row.
+        
+        Returns:
+            int: Bytes per row in use
+        """
+        return (len(self.dates) + 7) // 8
+    
+    def _reserve(self, row_count, column_count):
+        """Grow the bit matrix (doubling) to hold the given rows and columns."""
+        rows, byte_columns = self.bits.shape
+        needed_bytes = (column_count + 7) // 8
+        
+        if row_count <= rows and needed_bytes <= byte_columns:
+            return
+        
+        bits = np.zeros((max(row_count, rows * 2, 64), max(needed_bytes, byte_columns * 2, 8)), dtype=np.uint8)
+        bits[:rows, :byte_columns] = self.bits
+        self.bits = bits
+    
+    def add_student(self, student_id):
+        """
+        Add a student row if it doesn't exist.
+        
+        Args:
+            student_id (str): Student ID
+        
+        Returns:
+            int: Row of the student
+        """
+        row = self.rows.get(student_id)
+        if row is None:
+            row = len(self.student_ids)
+            self._reserve(row + 1, len(self.dates))
+            self.student_ids.append(student_id)
+            self.rows[student_id] = row
+            self.dirty = True
+        return row
+    
+    def add_date(self, date):
+        """
+        Add a day column if it doesn't exist, keeping columns in date order.
+        
+        Args:
+            date (str): Date in YYYY-MM-DD format
+        
+        Returns:
+            int: Column of the day
+        """
+        column = self.columns.get(date)
+        if column is not None:
+            return column
+        
+        self.dirty = True
+        
+        # Days are normally added in order: append a column
+        if not self.dates or date > self.dates[-1]:
+            column = len(self.dates)
+            self._reserve(len(self.student_ids), column + 1)
+            self.dates.append(date)
+            self.columns[date] = column
+            return column
+        
+        # An earlier day: shift the later columns right by one bit
+        column = bisect.bisect_left(self.dates, date)
+        matrix = self.matrix()
+        matrix = np.insert(matrix, column, False, axis=1)
+        
+        self.dates.insert(column, date)
+        self.columns = {day: i for i, day in enumerate(self.dates)}
+        self._reserve(len(self.student_ids), len(self.dates))
+        self.bits[:len(self.student_ids), :self.byte_count] = np.packbits(matrix, axis=1)
+        return column
+    
+    def mark(self, student_id, date):
+        """
+        Mark a student present on a day.
+        
+        Args:
+            student_id (str): Student ID
+            date (str): Date in YYYY-MM-DD format
+        """
+        column = self.add_date(date)
+        row = self.add_student(student_id)
+        self.bits[row, column >> 3] |= np.uint8(0x80 >> (column & 7))
+        self.dirty = True
+    
+    def set_days(self, signatures, present_ids, present_dates):
+        """
+        Replace the columns of several days with their present students.
+        
+        Args:
+            signatures (dict): Mapping of each replaced date to the storage signature of its records
+            present_ids: Student ID of each present record (surrounding whitespace is ignored)
+            present_dates: Date of each present record
+        """
+        # Columns for every replaced day, even days nobody attended
+        for date in sorted(signatures):
+            self.add_date(date)
+        
+        # Resolve each distinct ID and date once, then map the records through their codes
+        id_codes, ids = pd.factorize(pd.Series(present_ids, dtype=object))
+        date_codes, dates = pd.factorize(pd.Series(present_dates, dtype=object))
+        id_rows = np.array([self.add_student(str(student_id).strip()) for student_id in ids], dtype=np.intp)
+        date_columns = np.array([self.columns[date] if date in signatures else -1 for date in dates], dtype=np.intp)
+        
+        rows = id_rows[id_codes]
+        columns = date_columns[date_codes]
+        kept = columns >= 0
+        rows, columns = rows[kept], columns[kept]
+        
+        # Clear the replaced columns, then set one bit per present record
+        for date in signatures:
+            column = self.columns[date]
+            self.bits[:len(self.student_ids), column >> 3] &= ~np.uint8(0x80 >> (column & 7))
+        np.bitwise_or.at(self.bits, (rows, columns >> 3), (0x80 >> (columns & 7)).astype(np.uint8))
+        
+        self.signatures.update(signatures)
+        self.dirty = True
+    
+    def column_range(self, start_date=None, end_date=None):
+        """
+        Get the columns of the days in a date range.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            tuple: (first column, end column) as a half-open range
+        """
+        start = 0 if not start_date else bisect.bisect_left(self.dates, start_date)
+        end = len(self.dates) if not end_date else bisect.bisect_right(self.dates, end_date)
+        return start, max(start, end)
+    
+    def _range_mask(self, start, end):
+        """Get the byte mask selecting the columns [start, end) of a packed row."""
+        selected = np.zeros(self.byte_count * 8, dtype=bool)
+        selected[start:end] = True
+        return np.packbits(selected)
+    
+    def _select_rows(self, student_ids):
+        """Get the rows of the given students (-1 for students not in the index)."""
+        # Missing students read row 0 and are cleared afterwards, so keep at least one row
+        self._reserve(1, len(self.dates))
+        
+        if student_ids is None:
+            return np.arange(len(self.student_ids))
+        return np.array([self.rows.get(str(student_id), -1) for student_id in student_ids], dtype=np.intp)
+    
+    def matrix(self, start_date=None, end_date=None, student_ids=None):
+        """
+        Get the unpacked presence matrix.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            student_ids (list, optional): Rows to return, in order. Defaults to every indexed student.
+        
+        Returns:
+            numpy.ndarray: Boolean matrix of shape (students, days in range)
+        """
+        start, end = self.column_range(start_date, end_date)
+        rows = self._select_rows(student_ids)
+        
+        unpacked = np.unpackbits(self.bits[np.maximum(rows, 0), :self.byte_count], axis=1, count=len(self.dates))
+        matrix = unpacked[:, start:end].astype(bool)
+        matrix[rows < 0] = False
+        return matrix
+    
+    def counts(self, start_date=None, end_date=None, student_ids=None):
+        """
+        Count the days each student was present.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            student_ids (list, optional): Students to count. Defaults to every indexed student.
+        
+        Returns:
+            pandas.Series: Days present, indexed by student ID
+        """
+        start, end = self.column_range(start_date, end_date)
+        rows = self._select_rows(student_ids)
+        
+        # Popcount of the masked bytes of each row
+        masked = self.bits[np.maximum(rows, 0), :self.byte_count] & self._range_mask(start, end)
+        counts = POPCOUNT[masked].sum(axis=1, dtype=np.int64)
+        counts[rows < 0] = 0
+        
+        index = self.student_ids if student_ids is None else [str(student_id) for student_id in student_ids]
+        return pd.Series(counts, index=pd.Index(index, name='ID'), name='Days')
+    
+    def percentages(self, start_date=None, end_date=None, student_ids=None):
+        """
+        Get the attendance percentage of each student over a date range.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            student_ids (list, optional): Students to include. Defaults to every indexed student.
+        
+        Returns:
+            pandas.Series: Percentage of days present, indexed by student ID
+        """
+        start, end = self.column_range(start_date, end_date)
+        counts = self.counts(start_date, end_date, student_ids)
+        return (100.0 * counts / max(end - start, 1)).round(2).rename('Percentage')
+    
+    def day_counts(self, start_date=None, end_date=None):
+        """
+        Count the students present on each day.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            pandas.Series: Students present, indexed by date
+        """
+        start, end = self.column_range(start_date, end_date)
+        counts = self.matrix(start_date, end_date).sum(axis=0, dtype=np.int64)
+        return pd.Series(counts, index=pd.Index(self.dates[start:end], name='Date'), name='Present')
+    
+    def absentees(self, date, student_ids=None):
+        """
+        Get the students absent on a day.
+        
+        Args:
+            date (str): Date in YYYY-MM-DD format
+            student_ids (list, optional): Students expected (e.g. the roster). Defaults to every indexed student.
+        
+        Returns:
+            list: IDs of the students not present that day
+        """
+        if student_ids is None:
+            student_ids = self.student_ids
+        column = self.columns.get(date)
+        if column is None:
+            return [str(student_id) for student_id in student_ids]
+        
+        rows = self._select_rows(student_ids)
+        present = (self.bits[np.maximum(rows, 0), column >> 3] & (0x80 >> (column & 7))) != 0
+        present[rows < 0] = False
+        return [str(student_id) for student_id, is_present in zip(student_ids, present) if not is_present]
+    
+    def streaks(self, start_date=None, end_date=None, student_ids=None):
+        """
+        Get the attendance streaks of each student.
+        
+        Args:
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            student_ids (list, optional): Students to include. Defaults to every indexed student.
+        
+        Returns:
+            pandas.DataFrame: Current (ending on the last day) and Longest streak, indexed by student ID
+        """
+        matrix = self.matrix(start_date, end_date, student_ids)
+        count, days = matrix.shape
+        
+        # Runs of present days start at +1 and end at -1 steps of the zero-padded rows
+        padded = np.zeros((count, days + 2), dtype=np.int8)
+        padded[:, 1:-1] = matrix
+        steps = np.diff(padded, axis=1)
+        run_rows, run_starts = np.nonzero(steps == 1)
+        _, run_ends = np.nonzero(steps == -1)
+        lengths = run_ends - run_starts
+        
+        longest = np.zeros(count, dtype=np.int64)
+        np.maximum.at(longest, run_rows, lengths)
+        
+        current = np.zeros(count, dtype=np.int64)
+        ongoing = run_ends == days
+        current[run_rows[ongoing]] = lengths[ongoing]
+        
+        index = self.student_ids if student_ids is None else [str(student_id) for student_id in student_ids]
+        return pd.DataFrame({'Current': current, 'Longest': longest}, index=pd.Index(index, name='ID'))
+    
+    def save(self, path):
+        """
+        Save the index (written to a temporary file and swapped in).
+        
+        Args:
+            path (str): Path to the .npz index file
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path[:-len(".npz")] + ".tmp.npz" if path.endswith(".npz") else path + ".tmp"
+        
+        signed_dates = [date for date in self.dates if self.signatures.get(date) is not None]
+        np.savez(
+            temp_path,
+            student_ids=np.array(self.student_ids, dtype=str),
+            dates=np.array(self.dates, dtype=str),
+            bits=self.bits[:len(self.student_ids), :self.byte_count],
+            signature_dates=np.array(signed_dates, dtype=str),
+            signatures=np.array([self.signatures[date] for date in signed_dates], dtype=np.int64).reshape(-1, 2)
+        )
+        os.replace(temp_path, path)
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save.
+        
+        Args:
+            path (str): Path to the .npz index file
+        
+        Returns:
+            PresenceIndex: The loaded index
+        """
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            index.student_ids = [str(student_id) for student_id in data['student_ids']]
+            index.dates = [str(date) for date in data['dates']]
+            index.bits = np.array(data['bits'], dtype=np.uint8)
+            index.signatures = {
+                str(date): tuple(int(value) for value in signature)
+                for date, signature in zip(data['signature_dates'], data['signatures'])
+            }
+        
+        index.rows = {student_id: row for row, student_id in enumerate(index.student_ids)}
+        index.columns = {date: column for column, date in enumerate(index.dates)}
+        if index.bits.shape != (len(index.student_ids), index.byte_count):
+            raise ValueError(f"Presence index {path} is inconsistent")
+        return index
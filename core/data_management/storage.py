@@ -0,0 +1,959 @@
+"""
+Storage Module
+This module provides the storage backends used by the database manager.
+"""
+
+import os
+import sys
+import csv
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+STUDENT_COLUMNS = ['ID', 'Name', 'Registration_Date']
+ATTENDANCE_COLUMNS = ['ID', 'Name', 'Time', 'Status']
+ATTENDANCE_RANGE_COLUMNS = ['ID', 'Name', 'Date', 'Time', 'Status']
+
+# Attendance columns are read as text: no type inference, IDs keep leading zeros
+ATTENDANCE_DTYPES = {'ID': str, 'Name': str, 'Time': str, 'Status': str}
+
+def _get_range_columns(columns):
+    """
+    Validate a column projection of attendance range records.
+    
+    Args:
+        columns (list): Requested columns, or None for all of them
+    
+    Returns:
+        list: Requested columns in the standard order
+    """
+    if columns is None:
+        return list(ATTENDANCE_RANGE_COLUMNS)
+    
+    unknown = set(columns) - set(ATTENDANCE_RANGE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown attendance columns: {sorted(unknown)}")
+    return [column for column in ATTENDANCE_RANGE_COLUMNS if column in columns]
+
+STORAGE_BACKENDS = ('csv', 'sqlite')
+
+def get_database_file(data_dir, database_file=None):
+    """
+    Get the SQLite database path for a data directory.
+    
+    Args:
+        data_dir (str): Path to the data directory
+        database_file (str, optional): Configured database file, relative to data_dir if not absolute
+    
+    Returns:
+        str: Path to the SQLite database file
+    """
+    if not database_file:
+        database_file = 'attendance.db'
+    return os.path.join(data_dir, database_file)
+
+class AppenderPool:
+    """
+    Open append handles for daily attendance files, kept between writes.
+    
+    Each (subject, date) file is opened once, and its header is written only if
+    the file is empty at that point. Every append is flushed to the OS before
+    returning, so readers see whole rows. fsync runs once fsync_records records
+    have been written since the last one, or once fsync_interval seconds have
+    passed since the last one (checked on append and by a timer, so a file that
+    goes idle is synced too). Opening a day's file closes the subject's
+    older days (midnight rollover). Beyond max_open handles the least recently
+    used one is closed.
+    
+    Files are assumed to be written only through the pool while it holds them.
+    """
+    
+    def __init__(self, max_open=16, fsync_records=64, fsync_interval=1.0):
+        """
+        Initialize the appender pool.
+        
+        Args:
+            max_open (int): Maximum number of open handles
+            fsync_records (int): Records written before an fsync (0 or less disables)
+            fsync_interval (float): Seconds after the last fsync before another (0 or less disables)
+        """
+        self.max_open = max(1, int(max_open))
+        self.fsync_records = int(fsync_records)
+        self.fsync_interval = float(fsync_interval)
+        
+        # (subject, date) -> handle dict, least recently used first
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Timer syncing files whose fsync_interval elapsed without another append
+        self._timer = None
+    
+    def __len__(self):
+        """Get the number of open handles."""
+        return len(self._handles)
+    
+    def append(self, key, path, header, rows):
+        """
+        Append rows to a file through its pooled handle.
+        
+        Args:
+            key (tuple): (subject, date) of the file
+            path (str): Path of the file
+            header (list): Header row written if the file is empty
+            rows (list): Rows to append
+        """
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._open(key, path, header)
+            else:
+                self._handles.move_to_end(key)
+            
+            try:
+                handle['writer'].writerows(rows)
+                handle['file'].flush()
+                handle['unsynced'] += len(rows)
+                
+                if self._sync_due(handle):
+                    self._sync(handle)
+                elif handle['unsynced']:
+                    self._schedule_sync()
+            except Exception:
+                # Don't keep a handle in an unknown state
+                self._close(key)
+                raise
+    
+    def _open(self, key, path, header):
+        """Open a pooled handle, closing older days of the subject and the LRU handle if full."""
+        subject, date = key
+        for other in [other for other in self._handles if other[0] == subject and other[1] < date]:
+            self._close(other)
+        
+        while len(self._handles) >= self.max_open:
+            self._close(next(iter(self._handles)))
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, 'a', newline='')
+        try:
+            writer = csv.writer(f)
+            
+            # Write header if the file is new (append mode starts at the end)
+            if f.tell() == 0:
+                writer.writerow(header)
+        except Exception:
+            f.close()
+            raise
+        
+        handle = {'file': f, 'writer': writer, 'unsynced': 0, 'synced_at': time.monotonic()}
+        self._handles[key] = handle
+        return handle
+    
+    def _sync_due(self, handle):
+        """Check the fsync policy for a handle."""
+        if self.fsync_records > 0 and handle['unsynced'] >= self.fsync_records:
+            return True
+        return self.fsync_interval > 0 and time.monotonic() - handle['synced_at'] >= self.fsync_interval
+    
+    def _schedule_sync(self, delay=None):
+        """Start the sync timer if it isn't running (called with the lock held)."""
+        if self.fsync_interval <= 0 or self._timer is not None:
+            return
+        
+        self._timer = threading.Timer(self.fsync_interval if delay is None else delay, self._sync_elapsed)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _sync_elapsed(self):
+        """Timer callback: fsync files whose interval elapsed, and wait for the rest."""
+        with self._lock:
+            self._timer = None
+            now = time.monotonic()
+            next_due = None
+            for key, handle in self._handles.items():
+                if not handle['unsynced']:
+                    continue
+                
+                due = handle['synced_at'] + self.fsync_interval
+                if due <= now:
+                    try:
+                        self._sync(handle)
+                    except OSError as e:
+                        print(f"Error syncing attendance file for {key[0]} on {key[1]}: {e}")
+                else:
+                    next_due = due if next_due is None else min(next_due, due)
+            
+            if next_due is not None:
+                self._schedule_sync(next_due - now)
+    
+    def _sync(self, handle):
+        """fsync a handle's file if it has unsynced records."""
+        if handle['unsynced']:
+            os.fsync(handle['file'].fileno())
+            handle['unsynced'] = 0
+        handle['synced_at'] = time.monotonic()
+    
+    def _close(self, key):
+        """Flush, fsync and close a pooled handle."""
+        handle = self._handles.pop(key, None)
+        if handle is None:
+            return
+        
+        try:
+            handle['file'].flush()
+            self._sync(handle)
+        except OSError as e:
+            print(f"Error syncing attendance file for {key[0]} on {key[1]}: {e}")
+        finally:
+            handle['file'].close()
+    
+    def sync(self):
+        """fsync every open handle."""
+        with self._lock:
+            for handle in self._handles.values():
+                self._sync(handle)
+    
+    def close(self):
+        """Close every open handle."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for key in list(self._handles):
+                self._close(key)
+
+class CSVStorage:
+    """
+    Storage backend keeping the roster in one CSV file and attendance in one CSV file
+    per subject per day (attendance/<subject>/<date>.csv).
+    """
+    
+    def __init__(self, students_dir, attendance_dir, max_open_files=16, fsync_records=64, fsync_interval=1.0):
+        """
+        Initialize the CSV storage.
+        
+        Args:
+            students_dir (str): Directory holding student_details.csv
+            attendance_dir (str): Directory holding one directory of daily files per subject
+            max_open_files (int): Attendance files kept open for appending
+            fsync_records (int): Records appended before an fsync (0 or less disables)
+            fsync_interval (float): Seconds between fsyncs of an open file (0 or less disables)
+        """
+        self.students_dir = students_dir
+        self.attendance_dir = attendance_dir
+        self.student_details_file = os.path.join(students_dir, 'student_details.csv')
+        
+        # Thread pool for reading date ranges (pandas releases the GIL while parsing),
+        # created on first use; range reads come from several threads
+        self.executor = None
+        self.max_workers = min(8, (os.cpu_count() or 1) + 4)
+        self._executor_lock = threading.Lock()
+        self._closed = False
+        
+        # Attendance files stay open between appends
+        self.appenders = AppenderPool(max_open_files, fsync_records, fsync_interval)
+    
+    def exists(self):
+        """
+        Check if the roster file exists.
+        
+        Returns:
+            bool: True if it exists, False otherwise
+        """
+        return os.path.exists(self.student_details_file)
+    
+    def initialize(self):
+        """Create the roster file with its header if it doesn't exist."""
+        if not os.path.exists(self.student_details_file):
+            with open(self.student_details_file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(STUDENT_COLUMNS)
+    
+    def students_signature(self):
+        """
+        Get a value that changes whenever the roster changes.
+        
+        Returns:
+            tuple: (mtime_ns, size) of the roster file, or None if it doesn't exist
+        """
+        try:
+            stat = os.stat(self.student_details_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def read_students(self, as_text=False):
+        """
+        Read the roster.
+        
+        Args:
+            as_text (bool): Read every column as text (no type inference, empty cells stay '')
+        
+        Returns:
+            pandas.DataFrame: Roster with ID, Name and Registration_Date columns
+        """
+        if not os.path.exists(self.student_details_file):
+            return pd.DataFrame(columns=STUDENT_COLUMNS)
+        
+        if as_text:
+            return pd.read_csv(self.student_details_file, dtype=str, keep_default_na=False)
+        return pd.read_csv(self.student_details_file)
+    
+    def add_student(self, student_id, name, registration_date):
+        """
+        Append a student to the roster.
+        
+        Args:
+            student_id (str): Student ID
+            name (str): Student name
+            registration_date (str): Registration time (YYYY-MM-DD HH:MM:SS)
+        """
+        with open(self.student_details_file, 'a', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([student_id, name, registration_date])
+    
+    def add_students(self, rows):
+        """
+        Append many students to the roster in one write.
+        
+        Args:
+            rows (list): (student_id, name, registration_date) tuples
+        """
+        with open(self.student_details_file, 'a', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerows(rows)
+    
+    def _attendance_file(self, subject, date):
+        """Get the path of a subject's attendance file for a date."""
+        return os.path.join(self.attendance_dir, subject, f"{date}.csv")
+    
+    def read_attendance(self, subject, date, as_text=False):
+        """
+        Read a subject's attendance records for a date.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            as_text (bool): Read every column as text (no type inference, empty cells stay '')
+        
+        Returns:
+            pandas.DataFrame: Records with ID, Name, Time and Status columns
+        """
+        attendance_file = self._attendance_file(subject, date)
+        if not os.path.exists(attendance_file):
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+        
+        if as_text:
+            return pd.read_csv(attendance_file, dtype=str, keep_default_na=False)
+        return pd.read_csv(attendance_file)
+    
+    def append_attendance(self, subject, date, records):
+        """
+        Append attendance records to a subject's file for a date.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            records (list): (student_id, name, time, status) tuples
+        """
+        # The pooled handle creates the directory and header on first use
+        self.appenders.append((subject, date), self._attendance_file(subject, date), ATTENDANCE_COLUMNS, records)
+    
+    def list_dates(self, subject, start_date=None, end_date=None):
+        """
+        List the dates a subject has attendance for.
+        
+        Args:
+            subject (str): Subject name
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            list: Sorted dates in YYYY-MM-DD format
+        """
+        subject_dir = os.path.join(self.attendance_dir, subject)
+        if not os.path.exists(subject_dir):
+            return []
+        
+        dates = [f.split('.')[0] for f in os.listdir(subject_dir) if f.endswith('.csv')]
+        
+        # Filter by date range if specified
+        if start_date:
+            dates = [date for date in dates if date >= start_date]
+        if end_date:
+            dates = [date for date in dates if date <= end_date]
+        
+        return sorted(dates)
+    
+    def day_signature(self, subject, date):
+        """
+        Get a value that changes whenever a subject's records of a day change.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+        
+        Returns:
+            tuple: (mtime_ns, size) of the day file, or None if it doesn't exist
+        """
+        try:
+            stat = os.stat(self._attendance_file(subject, date))
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def day_signatures(self, subject):
+        """
+        Get the signature of every day a subject has attendance for.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            dict: Mapping of date to (mtime_ns, size) of the day file
+        """
+        subject_dir = os.path.join(self.attendance_dir, subject)
+        if not os.path.isdir(subject_dir):
+            return {}
+        
+        signatures = {}
+        with os.scandir(subject_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith('.csv') and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name[:-len('.csv')]] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+    
+    def has_subject(self, subject):
+        """
+        Check if a subject has been used for attendance.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            bool: True if the subject directory exists, False otherwise
+        """
+        return os.path.isdir(os.path.join(self.attendance_dir, subject))
+    
+    def list_subjects(self):
+        """
+        List the subjects that have been used for attendance.
+        
+        Returns:
+            list: Sorted subject names
+        """
+        if not os.path.isdir(self.attendance_dir):
+            return []
+        
+        with os.scandir(self.attendance_dir) as entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+    
+    def _read_day(self, subject, date, columns):
+        """
+        Read one day of a subject's records for a range query.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            columns (list): Columns to return (validated, in standard order)
+        
+        Returns:
+            pandas.DataFrame: The day's records, or None if the file can't be read
+        """
+        file_path = self._attendance_file(subject, date)
+        file_columns = [column for column in columns if column != 'Date']
+        
+        try:
+            # Only the requested columns are parsed
+            attendance = pd.read_csv(
+                file_path,
+                usecols=file_columns,
+                dtype={column: ATTENDANCE_DTYPES[column] for column in file_columns},
+                keep_default_na=False
+            )
+        except Exception as e:
+            print(f"Error reading attendance file {file_path}: {e}")
+            return None
+        
+        # Add date column
+        if 'Date' in columns:
+            attendance['Date'] = date
+        return attendance
+    
+    def read_attendance_range(self, subject, start_date=None, end_date=None, columns=None):
+        """
+        Read a subject's attendance records over a date range.
+        
+        The day files are listed once, read across a thread pool and
+        concatenated in one step.
+        
+        Args:
+            subject (str): Subject name
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            columns (list, optional): Columns to load, e.g. ['ID', 'Date', 'Status']. Defaults to all.
+        
+        Returns:
+            pandas.DataFrame: Records with ID, Name, Date, Time and Status columns (or the requested ones)
+        """
+        columns = _get_range_columns(columns)
+        dates = self.list_dates(subject, start_date, end_date)
+        
+        days = None
+        executor = self._get_executor() if len(dates) > 1 else None
+        if executor is not None:
+            try:
+                days = list(executor.map(lambda date: self._read_day(subject, date, columns), dates))
+            except RuntimeError:
+                # The pool was shut down by close() while this read was scheduling
+                days = None
+        if days is None:
+            days = [self._read_day(subject, date, columns) for date in dates]
+        
+        # One concatenation, in date order
+        days = [day for day in days if day is not None]
+        if not days:
+            return pd.DataFrame(columns=columns)
+        
+        return pd.concat(days, ignore_index=True)[columns]
+    
+    def _get_executor(self):
+        """
+        Get the range reading thread pool, creating it on first use.
+        
+        Returns:
+            ThreadPoolExecutor: The pool, or None if reads should run serially
+        """
+        if self.max_workers <= 1:
+            return None
+        
+        with self._executor_lock:
+            if self._closed:
+                return None
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+    
+    def close(self):
+        """Close the pooled attendance files and shut down the range reading thread pool."""
+        self.appenders.close()
+        
+        with self._executor_lock:
+            self._closed = True
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+class SQLiteStorage:
+    """
+    Storage backend keeping the roster and all attendance in one SQLite database in WAL mode.
+    
+    Each thread gets its own connection; WAL lets the scanner keep writing while
+    reports read. Attendance is indexed by (subject, date) and (student_id, date).
+    """
+    
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS students (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL DEFAULT '',
+            registration_date TEXT NOT NULL DEFAULT ''
+        )""",
+        """CREATE TABLE IF NOT EXISTS attendance (
+            subject TEXT NOT NULL,
+            date TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            name TEXT NOT NULL DEFAULT '',
+            time TEXT NOT NULL DEFAULT '',
+            status TEXT NOT NULL DEFAULT ''
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_subject_date ON attendance (subject, date)",
+        "CREATE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance (student_id, date)",
+        # Roster change counter, so other processes can tell when to reload their roster index
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('students_version', 0)",
+        """CREATE TRIGGER IF NOT EXISTS students_insert AFTER INSERT ON students BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS students_update AFTER UPDATE ON students BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS students_delete AFTER DELETE ON students BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'students_version';
+        END""",
+    ]
+    
+    # Attendance table column of each range column
+    RANGE_COLUMN_NAMES = {'ID': 'student_id', 'Name': 'name', 'Date': 'date', 'Time': 'time', 'Status': 'status'}
+    
+    def __init__(self, database_file):
+        """
+        Initialize the SQLite storage.
+        
+        Args:
+            database_file (str): Path to the SQLite database file
+        """
+        self.database_file = database_file
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+    
+    def _connection(self):
+        """
+        Get the calling thread's connection, opening it on first use.
+        
+        Returns:
+            sqlite3.Connection: Connection to the database
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_file, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints; a power cut can lose only the last transactions
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def exists(self):
+        """
+        Check if the database file exists.
+        
+        Returns:
+            bool: True if it exists, False otherwise
+        """
+        return os.path.exists(self.database_file)
+    
+    def initialize(self):
+        """Create the database file, tables and indexes if they don't exist."""
+        conn = self._connection()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+    
+    def students_signature(self):
+        """
+        Get a value that changes whenever the roster changes.
+        
+        Returns:
+            int: Roster change counter, or None if the database isn't initialized
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM meta WHERE key = 'students_version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return None if row is None else row[0]
+    
+    def read_students(self, as_text=False):
+        """
+        Read the roster.
+        
+        Args:
+            as_text (bool): Unused; every column is stored as text
+        
+        Returns:
+            pandas.DataFrame: Roster with ID, Name and Registration_Date columns
+        """
+        return pd.read_sql_query(
+            "SELECT id AS ID, name AS Name, registration_date AS Registration_Date "
+            "FROM students ORDER BY rowid",
+            self._connection()
+        )
+    
+    def add_student(self, student_id, name, registration_date):
+        """
+        Add a student to the roster.
+        
+        Args:
+            student_id (str): Student ID
+            name (str): Student name
+            registration_date (str): Registration time (YYYY-MM-DD HH:MM:SS)
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO students (id, name, registration_date) VALUES (?, ?, ?)",
+                (str(student_id), name, registration_date)
+            )
+    
+    def add_students(self, rows):
+        """
+        Add many students to the roster in one transaction.
+        
+        Args:
+            rows (list): (student_id, name, registration_date) tuples
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO students (id, name, registration_date) VALUES (?, ?, ?)",
+                [(str(student_id), name, registration_date) for student_id, name, registration_date in rows]
+            )
+    
+    def read_attendance(self, subject, date, as_text=False):
+        """
+        Read a subject's attendance records for a date.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            as_text (bool): Unused; every column is stored as text
+        
+        Returns:
+            pandas.DataFrame: Records with ID, Name, Time and Status columns
+        """
+        return pd.read_sql_query(
+            "SELECT student_id AS ID, name AS Name, time AS Time, status AS Status "
+            "FROM attendance WHERE subject = ? AND date = ? ORDER BY rowid",
+            self._connection(),
+            params=(subject, date)
+        )
+    
+    def append_attendance(self, subject, date, records):
+        """
+        Insert attendance records for a subject and date in one transaction.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+            records (list): (student_id, name, time, status) tuples
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO attendance (subject, date, student_id, name, time, status) VALUES (?, ?, ?, ?, ?, ?)",
+                [(subject, date, str(student_id), name or '', time, status)
+                 for student_id, name, time, status in records]
+            )
+    
+    def _date_filter(self, subject, start_date, end_date):
+        """Build the WHERE clause and parameters selecting a subject's date range."""
+        clause = "subject = ?"
+        params = [subject]
+        if start_date:
+            clause += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            clause += " AND date <= ?"
+            params.append(end_date)
+        return clause, params
+    
+    def list_dates(self, subject, start_date=None, end_date=None):
+        """
+        List the dates a subject has attendance for.
+        
+        Args:
+            subject (str): Subject name
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+        
+        Returns:
+            list: Sorted dates in YYYY-MM-DD format
+        """
+        clause, params = self._date_filter(subject, start_date, end_date)
+        rows = self._connection().execute(
+            f"SELECT DISTINCT date FROM attendance WHERE {clause} ORDER BY date", params
+        ).fetchall()
+        return [row[0] for row in rows]
+    
+    def day_signature(self, subject, date):
+        """
+        Get a value that changes whenever a subject's records of a day change.
+        
+        Args:
+            subject (str): Subject name
+            date (str): Date in YYYY-MM-DD format
+        
+        Returns:
+            tuple: (record count, last rowid) of the day, or None if it has no records
+        """
+        row = self._connection().execute(
+            "SELECT COUNT(*), MAX(rowid) FROM attendance WHERE subject = ? AND date = ?", (subject, date)
+        ).fetchone()
+        return None if not row[0] else (row[0], row[1])
+    
+    def day_signatures(self, subject):
+        """
+        Get the signature of every day a subject has attendance for.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            dict: Mapping of date to (record count, last rowid) of the day
+        """
+        rows = self._connection().execute(
+            "SELECT date, COUNT(*), MAX(rowid) FROM attendance WHERE subject = ? GROUP BY date", (subject,)
+        ).fetchall()
+        return {date: (count, last_rowid) for date, count, last_rowid in rows}
+    
+    def has_subject(self, subject):
+        """
+        Check if a subject has been used for attendance.
+        
+        Args:
+            subject (str): Subject name
+        
+        Returns:
+            bool: True if the subject has any records, False otherwise
+        """
+        row = self._connection().execute(
+            "SELECT 1 FROM attendance WHERE subject = ? LIMIT 1", (subject,)
+        ).fetchone()
+        return row is not None
+    
+    def list_subjects(self):
+        """
+        List the subjects that have attendance records.
+        
+        Returns:
+            list: Sorted subject names
+        """
+        rows = self._connection().execute(
+            "SELECT DISTINCT subject FROM attendance ORDER BY subject"
+        ).fetchall()
+        return [row[0] for row in rows]
+    
+    def read_attendance_range(self, subject, start_date=None, end_date=None, columns=None):
+        """
+        Read a subject's attendance records over a date range.
+        
+        Args:
+            subject (str): Subject name
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            columns (list, optional): Columns to load, e.g. ['ID', 'Date', 'Status']. Defaults to all.
+        
+        Returns:
+            pandas.DataFrame: Records with ID, Name, Date, Time and Status columns (or the requested ones)
+        """
+        selected = ", ".join(
+            f"{self.RANGE_COLUMN_NAMES[column]} AS {column}" for column in _get_range_columns(columns)
+        )
+        clause, params = self._date_filter(subject, start_date, end_date)
+        return pd.read_sql_query(
+            f"SELECT {selected} FROM attendance WHERE {clause} ORDER BY date, rowid",
+            self._connection(),
+            params=params
+        )
+    
+    def close(self):
+        """Close every connection opened by this storage."""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+def create_storage(backend, data_dir, students_dir, attendance_dir, database_file=None,
+                   max_open_files=16, fsync_records=64, fsync_interval=1.0):
+    """
+    Create the storage backend selected in the configuration.
+    
+    Args:
+        backend (str): "csv" or "sqlite"
+        data_dir (str): Path to the data directory
+        students_dir (str): Directory of the CSV roster
+        attendance_dir (str): Directory of the CSV attendance files
+        database_file (str, optional): SQLite database file, relative to data_dir if not absolute
+        max_open_files (int): CSV attendance files kept open for appending
+        fsync_records (int): CSV records appended before an fsync (0 or less disables)
+        fsync_interval (float): Seconds between fsyncs of an open CSV file (0 or less disables)
+    
+    Returns:
+        CSVStorage or SQLiteStorage: Storage backend
+    """
+    if backend not in STORAGE_BACKENDS:
+        print(f"Unknown storage backend {backend!r}, using csv")
+    
+    if backend == 'sqlite':
+        return SQLiteStorage(get_database_file(data_dir, database_file))
+    return CSVStorage(students_dir, attendance_dir, max_open_files, fsync_records, fsync_interval)
+
+def migrate_csv_to_sqlite(data_dir, database_file=None):
+    """
+    Copy the CSV roster and attendance tree into a SQLite database.
+    
+    Students already in the database are kept, and (subject, date) pairs that
+    already have records are skipped, so running the migration again doesn't
+    duplicate records.
+    
+    Args:
+        data_dir (str): Path to the data directory (with students/ and attendance/)
+        database_file (str, optional): SQLite database file, relative to data_dir if not absolute
+    
+    Returns:
+        tuple: (students migrated, attendance records migrated)
+    """
+    source = CSVStorage(os.path.join(data_dir, 'students'), os.path.join(data_dir, 'attendance'))
+    target = SQLiteStorage(get_database_file(data_dir, database_file))
+    
+    try:
+        target.initialize()
+        conn = target._connection()
+        
+        student_count = 0
+        record_count = 0
+        
+        with conn:
+            # Keep the first record of duplicated IDs, like the CSV roster lookup
+            students = source.read_students(as_text=True)
+            for student_id, name, registration_date in zip(
+                students['ID'].str.strip(), students['Name'],
+                students.get('Registration_Date', [''] * len(students))
+            ):
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO students (id, name, registration_date) VALUES (?, ?, ?)",
+                    (student_id, name, registration_date)
+                )
+                student_count += cursor.rowcount
+            
+            subjects = []
+            if os.path.isdir(source.attendance_dir):
+                subjects = sorted(
+                    d for d in os.listdir(source.attendance_dir)
+                    if os.path.isdir(os.path.join(source.attendance_dir, d))
+                )
+            
+            for subject in subjects:
+                migrated_dates = set(target.list_dates(subject))
+                for date in source.list_dates(subject):
+                    if date in migrated_dates:
+                        continue
+                    
+                    try:
+                        attendance = source.read_attendance(subject, date, as_text=True)
+                    except Exception as e:
+                        print(f"Error reading attendance file for {subject} on {date}: {e}")
+                        continue
+                    
+                    records = list(zip(
+                        attendance['ID'].str.strip(), attendance['Name'], attendance['Time'], attendance['Status']
+                    ))
+                    conn.executemany(
+                        "INSERT INTO attendance (subject, date, student_id, name, time, status) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(subject, date) + record for record in records]
+                    )
+                    record_count += len(records)
+        
+        return student_count, record_count
+    finally:
+        target.close()
+
+# Migrate a CSV data directory from the command line
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m core.data_management.storage <data_dir> [attendance.db]")
+        sys.exit(1)
+    
+    students, records = migrate_csv_to_sqlite(*sys.argv[1:])
+    print(f"Migrated {students} students and {records} attendance records")
@@ -7,6 +7,9 @@ import os
 import cv2
 import numpy as np
 
+from core.face_recognition.face_preprocessor import FacePreprocessor
+from core.face_recognition.face_tracker import FaceTracker
+
 class FaceDetector:
     """
     A class for detecting faces in images using Haar cascades.
@@ -50,6 +53,14 @@ class FaceDetector:
         self.min_face_size = (30, 30)
         self.scale_factor = 1.1
         self.min_neighbors = 5
+        
+        # Tracking parameters (a detection interval of 1 runs the detector on every frame)
+        self.detection_interval = 1
+        self.frames_since_detection = self.detection_interval
+        self.tracker = FaceTracker()
+        
+        # Shared preprocessing with a reusable grayscale buffer
+        self.preprocessor = FacePreprocessor()
     
     def set_parameters(self, min_face_size=(30, 30), scale_factor=1.1, min_neighbors=5):
         """
@@ -64,6 +75,25 @@ class FaceDetector:
         self.scale_factor = scale_factor
         self.min_neighbors = min_neighbors
     
+    def set_tracking(self, detection_interval=5, search_margin=0.5, match_threshold=0.6):
+        """
+        Set face tracking parameters used by detect_and_track.
+        
+        Args:
+            detection_interval (int): Run full detection every N frames (1 disables tracking)
+            search_margin (float): Tracker search window margin as a fraction of the face size
+            match_threshold (float): Minimum template match score to keep a track
+        """
+        self.detection_interval = max(1, int(detection_interval))
+        self.tracker.search_margin = search_margin
+        self.tracker.match_threshold = match_threshold
+        self.reset_tracking()
+    
+    def reset_tracking(self):
+        """Drop all tracks so the next call to detect_and_track runs a full detection."""
+        self.tracker.reset()
+        self.frames_since_detection = self.detection_interval
+    
     def detect_faces(self, image):
         """
         Detect faces in an image.
@@ -75,10 +105,7 @@ class FaceDetector:
             numpy.ndarray: Array of face rectangles (x, y, w, h)
         """
         # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
+        gray = self.preprocessor.gray(image)
         
         # Detect faces
         faces = self.face_cascade.detectMultiScale(
@@ -91,6 +118,33 @@ class FaceDetector:
         
         return faces
     
+    def detect_and_track(self, image):
+        """
+        Detect faces, running the full detector only every N frames.
+        
+        Between detections, faces are carried forward by a template-matching tracker.
+        A full detection is also forced on the frame after a track is lost.
+        
+        Args:
+            image: Input image
+            
+        Returns:
+            tuple: (faces, track_ids) where faces is an array of rectangles (x, y, w, h)
+                   and track_ids is a list of stable IDs, one per face
+        """
+        # Convert to grayscale once for both the detector and the tracker
+        gray = self.preprocessor.gray(image)
+        
+        self.frames_since_detection += 1
+        
+        if (self.frames_since_detection >= self.detection_interval
+                or self.tracker.lost
+                or self.detection_interval <= 1):
+            self.frames_since_detection = 0
+            return self.tracker.update(gray, self.detect_faces(gray))
+        
+        return self.tracker.track(gray)
+    
     def detect_and_draw(self, image, color=(0, 255, 0), thickness=2):
         """
         Detect faces in an image and draw rectangles around them.
@@ -0,0 +1,81 @@
+"""
+Face Preprocessor Module
+This module provides the canonical face preprocessing shared by training and recognition.
+"""
+
+import cv2
+import numpy as np
+
+# Canonical face size (width, height) used for training and recognition
+FACE_SIZE = (100, 100)
+
+def preprocess_face(image, box=None, out=None):
+    """
+    Produce the canonical grayscale face from an image.
+    
+    Args:
+        image (numpy.ndarray): BGR or grayscale image (a full frame or a face crop)
+        box (tuple, optional): Face rectangle (x, y, w, h) within the image
+        out (numpy.ndarray, optional): Preallocated (100, 100) uint8 output buffer
+    
+    Returns:
+        numpy.ndarray: The 100x100 grayscale face (the out buffer if one was given)
+    """
+    if box is not None:
+        x, y, w, h = box
+        image = image[y:y + h, x:x + w]
+    
+    # Convert only the face region to grayscale
+    if len(image.shape) > 2 and image.shape[2] > 1:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    if out is None:
+        out = np.empty((FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+    
+    cv2.resize(image, FACE_SIZE, dst=out)
+    return out
+
+class FacePreprocessor:
+    """
+    A class for preprocessing faces into reusable, preallocated buffers.
+    
+    The returned arrays are overwritten by the next call, so callers must use
+    (or copy) them before preprocessing another frame or face.
+    """
+    
+    def __init__(self):
+        """Initialize the face preprocessor."""
+        self.gray_buffer = None
+        self.face_buffer = np.empty((FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+    
+    def gray(self, frame):
+        """
+        Convert a frame to grayscale into the preallocated frame buffer.
+        
+        Args:
+            frame (numpy.ndarray): BGR or grayscale frame
+        
+        Returns:
+            numpy.ndarray: Grayscale frame
+        """
+        if len(frame.shape) == 2:
+            return frame
+        
+        # Reallocate only when the frame size changes
+        if self.gray_buffer is None or self.gray_buffer.shape != frame.shape[:2]:
+            self.gray_buffer = np.empty(frame.shape[:2], dtype=np.uint8)
+        
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray_buffer)
+    
+    def face(self, image, box=None):
+        """
+        Produce the canonical 100x100 grayscale face into the preallocated face buffer.
+        
+        Args:
+            image (numpy.ndarray): Grayscale frame, BGR frame, or face crop
+            box (tuple, optional): Face rectangle (x, y, w, h) within the image
+        
+        Returns:
+            numpy.ndarray: The 100x100 grayscale face
+        """
+        return preprocess_face(image, box, out=self.face_buffer)
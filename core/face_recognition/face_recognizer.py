@@ -7,6 +7,12 @@ import os
 import cv2
 import numpy as np
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from core.face_recognition.face_preprocessor import FacePreprocessor, preprocess_face, FACE_SIZE
+from core.face_recognition.lbph_engine import LBPHEngine, is_binary_model, get_binary_model_path
 
 class FaceRecognizer:
     """
@@ -23,33 +29,269 @@ class FaceRecognizer:
         """
         self.model_path = model_path
         self.config = config
+        # Binary model used by the NumPy backend (memory-mapped, shared between processes)
+        self.binary_model_path = get_binary_model_path(model_path)
         self.logger = logging.getLogger("AttendanceSystem")
         self.recognizer = None
         self.face_module_available = False
         self.model_loaded = False
+        self.preprocessor = FacePreprocessor()
+        
+        # Hot reload: version of the active model and the file state it was loaded from
+        self.model_version = 0
+        self._model_signature = None
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        
+        # Roster scope: matching restricted to one subject's students
+        self.roster_subject = None
+        self.roster_labels = None
+        # Per-subject gallery subsets built on first use (subject -> (model version, labels, engine)), LRU
+        self._roster_indexes = OrderedDict()
+        self.roster_cache_size = 4
+        if self.config is not None:
+            try:
+                self.roster_cache_size = max(1, int(self.config.get_value('FaceRecognition', 'RosterCacheSize', '4')))
+            except (TypeError, ValueError):
+                pass
+        
+        # Thread pool for batched recognition (OpenCV releases the GIL in predict)
+        self.executor = None
+        self.max_workers = os.cpu_count() or 1
+        if self.config is not None:
+            try:
+                workers = int(self.config.get_value('FaceRecognition', 'RecognitionWorkers', '0'))
+                if workers > 0:
+                    self.max_workers = workers
+            except (TypeError, ValueError):
+                pass
+        
+        # Recognizer backend: "opencv" (cv2.face LBPH) or "numpy" (vectorized LBPHEngine)
+        self.backend = 'opencv'
+        if self.config is not None:
+            self.backend = str(self.config.get_value('FaceRecognition', 'Backend', 'opencv')).strip().lower()
         
         # Try to initialize face recognizer
         try:
-            # Check if OpenCV face module is available
-            if hasattr(cv2, 'face'):
-                self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+            self.recognizer = self._create_recognizer()
+            
+            if self.recognizer is not None:
                 self.face_module_available = True
-                
-                # Try to load model if it exists
-                if os.path.exists(model_path):
-                    try:
-                        self.recognizer.read(model_path)
-                        self.model_loaded = True
-                        self.logger.info(f"Face recognition model loaded from {model_path}")
-                    except Exception as e:
-                        self.logger.warning(f"Failed to load face recognition model: {e}")
-                else:
-                    self.logger.warning(f"Face recognition model not found at {model_path}")
+                self._model_signature = self._get_model_signature()
+                self.model_loaded = self._load_model(self.recognizer)
+                if self.model_loaded:
+                    self.model_version = 1
             else:
                 self.logger.warning("OpenCV face module not available. Face recognition will not work.")
         except Exception as e:
             self.logger.error(f"Error initializing face recognizer: {e}")
     
+    def _create_recognizer(self):
+        """
+        Create an empty recognizer for the configured backend.
+        
+        Returns:
+            LBPHEngine or cv2.face.LBPHFaceRecognizer, or None if the face module is missing
+        """
+        # The NumPy engine reads the same model file and needs no contrib module
+        if self.backend == 'numpy':
+            return LBPHEngine()
+        
+        # Check if OpenCV face module is available
+        if hasattr(cv2, 'face'):
+            return cv2.face.LBPHFaceRecognizer_create()
+        
+        return None
+    
+    def _get_model_signature(self):
+        """
+        Get the state of the model files, to detect a retrained model.
+        
+        Returns:
+            tuple: (mtime_ns, size) or None per model file (YAML, binary, delta journal)
+        """
+        signature = []
+        for path in (self.model_path, self.binary_model_path, self.binary_model_path + ".delta"):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def model_changed(self):
+        """
+        Check whether the model files changed since the active model was loaded.
+        
+        Returns:
+            bool: True if changed, False otherwise
+        """
+        return self.face_module_available and self._get_model_signature() != self._model_signature
+    
+    def reload_model(self):
+        """
+        Load the model files into a new recognizer and swap it in.
+        
+        The current model keeps serving predictions while the new one loads, so
+        this can run on a background thread. If loading fails the current model
+        is kept.
+        
+        Returns:
+            bool: True if a new model was swapped in, False otherwise
+        """
+        if not self.face_module_available:
+            return False
+        
+        # Take the signature first, so a change during loading is picked up by the next check
+        signature = self._get_model_signature()
+        recognizer = self._create_recognizer()
+        
+        if not self._load_model(recognizer):
+            # Don't retry until the files change again
+            self._model_signature = signature
+            return False
+        
+        with self._reload_lock:
+            self.recognizer = recognizer
+            self.model_loaded = True
+            self._model_signature = signature
+            self.model_version += 1
+        
+        self.logger.info(f"Face recognition model version {self.model_version} active")
+        return True
+    
+    def check_for_update(self):
+        """
+        Start a background reload if the model files changed.
+        
+        Returns:
+            bool: True if a reload was started, False otherwise
+        """
+        if self._reload_thread is not None and self._reload_thread.is_alive():
+            return False
+        
+        if not self.model_changed():
+            return False
+        
+        self._reload_thread = threading.Thread(target=self.reload_model, daemon=True)
+        self._reload_thread.start()
+        return True
+    
+    def _mark_model_saved(self):
+        """Record a model this recognizer saved itself, so it is not reloaded."""
+        with self._reload_lock:
+            self._model_signature = self._get_model_signature()
+            self.model_version += 1
+    
+    def _load_model(self, recognizer):
+        """
+        Load the model file into a recognizer.
+        
+        The NumPy backend memory-maps the binary model. If only the YAML model
+        exists (or it is newer), it is read once and converted to the binary
+        format for the next start.
+        
+        Args:
+            recognizer: Recognizer created by _create_recognizer
+        
+        Returns:
+            bool: True if a model was loaded, False otherwise
+        """
+        if isinstance(recognizer, LBPHEngine):
+            binary_exists = os.path.exists(self.binary_model_path)
+            yaml_exists = os.path.exists(self.model_path)
+            
+            if binary_exists and (not yaml_exists or
+                                  os.path.getmtime(self.binary_model_path) >= os.path.getmtime(self.model_path)):
+                try:
+                    recognizer.load(self.binary_model_path)
+                    self.logger.info(f"Face recognition model mapped from {self.binary_model_path}")
+                    return True
+                except Exception as e:
+                    self.logger.warning(f"Failed to load binary face recognition model: {e}")
+        
+        # Try to load model if it exists
+        if not os.path.exists(self.model_path):
+            self.logger.warning(f"Face recognition model not found at {self.model_path}")
+            return False
+        
+        try:
+            recognizer.read(self.model_path)
+            self.logger.info(f"Face recognition model loaded from {self.model_path}")
+        except Exception as e:
+            self.logger.warning(f"Failed to load face recognition model: {e}")
+            return False
+        
+        # Convert the YAML model so later starts skip parsing it
+        if isinstance(recognizer, LBPHEngine) and not is_binary_model(self.model_path):
+            try:
+                recognizer.save(self.binary_model_path)
+                self.logger.info(f"Face recognition model converted to {self.binary_model_path}")
+            except Exception as e:
+                self.logger.warning(f"Failed to convert face recognition model: {e}")
+        
+        return True
+
+    def set_roster(self, subject, student_ids):
+        """
+        Restrict matching to the students of a subject's roster.
+        
+        Args:
+            subject (str): Subject name, used as the key of the roster index
+            student_ids (list): Student IDs on the roster, or None to match every student
+        """
+        if student_ids is None:
+            self.roster_subject = None
+            self.roster_labels = None
+            return
+        
+        labels = []
+        for student_id in student_ids:
+            try:
+                labels.append(int(student_id))
+            except (TypeError, ValueError):
+                self.logger.warning(f"Ignoring non-numeric student ID {student_id!r} in roster of {subject}")
+        
+        self.roster_subject = subject
+        self.roster_labels = np.unique(np.array(labels, dtype=np.int32))
+    
+    def _get_active_recognizer(self):
+        """
+        Get the recognizer to match against: the model, or the roster's subset of it.
+        
+        Roster subsets are built from the active model on first use and kept for
+        the most recently used subjects; a new model version rebuilds them.
+        
+        Returns:
+            Recognizer to predict with, or None if no roster student is enrolled
+        """
+        with self._reload_lock:
+            recognizer = self.recognizer
+            version = self.model_version
+        
+        subject, labels = self.roster_subject, self.roster_labels
+        if labels is None:
+            return recognizer
+        
+        entry = self._roster_indexes.get(subject)
+        if entry is not None and entry[0] == version and np.array_equal(entry[1], labels):
+            self._roster_indexes.move_to_end(subject)
+            engine = entry[2]
+        else:
+            if isinstance(recognizer, LBPHEngine):
+                engine = recognizer.subset(labels)
+            else:
+                engine = LBPHEngine.from_opencv(recognizer, labels)
+            
+            self._roster_indexes[subject] = (version, labels, engine)
+            self._roster_indexes.move_to_end(subject)
+            while len(self._roster_indexes) > self.roster_cache_size:
+                self._roster_indexes.popitem(last=False)
+            
+            self.logger.info(f"Roster index for {subject}: {len(np.unique(engine.labels))} of {len(labels)} students enrolled")
+        
+        return None if engine.empty() else engine
+    
     def is_face_module_available(self):
         """
         Check if OpenCV face module is available.
@@ -96,21 +338,110 @@ class FaceRecognizer:
             if not os.path.exists(directory):
                 os.makedirs(directory)
                 
-            self.recognizer.write(self.model_path)
+            # The NumPy backend saves the binary model, OpenCV the YAML model
+            if isinstance(self.recognizer, LBPHEngine):
+                saved_path = self.binary_model_path
+                self.recognizer.save(saved_path)
+            else:
+                saved_path = self.model_path
+                self.recognizer.write(saved_path)
             self.model_loaded = True
+            self._mark_model_saved()
             
-            self.logger.info(f"Face recognition model trained and saved to {self.model_path}")
+            self.logger.info(f"Face recognition model trained and saved to {saved_path}")
             return True
         except Exception as e:
             self.logger.error(f"Error training face recognition model: {e}")
             return False
     
-    def recognize_face(self, face_img):
+    def update(self, faces, ids, replace=True):
+        """
+        Add faces to the model without retraining it.
+        
+        The NumPy backend persists only the change (see LBPHEngine.save_delta).
+        cv2.face can append samples but not remove them, so replacing an
+        enrolled student's samples fails there and needs a full retrain.
+        
+        Args:
+            faces (list): List of face images
+            ids (list): List of corresponding IDs
+            replace (bool): Whether to drop the existing samples of these IDs first
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.face_module_available:
+            self.logger.error("OpenCV face module not available. Cannot update model.")
+            return False
+        
+        # Nothing to update yet
+        if not self.model_loaded:
+            return self.train(faces, ids)
+        
+        try:
+            faces_array = np.array(faces, dtype=np.uint8)
+            ids_array = np.array(ids, dtype=np.int32)
+            
+            if isinstance(self.recognizer, LBPHEngine):
+                if replace:
+                    self.recognizer.remove(np.unique(ids_array))
+                self.recognizer.update(faces_array, ids_array)
+                self._save_delta()
+            else:
+                if replace and np.isin(ids_array, self.recognizer.getLabels()).any():
+                    self.logger.warning("OpenCV LBPH cannot replace samples of an enrolled student")
+                    return False
+                self.recognizer.update(list(faces_array), ids_array)
+                self.recognizer.write(self.model_path)
+                self._mark_model_saved()
+            
+            self.logger.info(f"Face recognition model updated with {len(ids_array)} images")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error updating face recognition model: {e}")
+            return False
+    
+    def remove_students(self, ids):
+        """
+        Remove students from the model without retraining it.
+        
+        Args:
+            ids (list): Student IDs to remove
+        
+        Returns:
+            bool: True if successful, False if the backend cannot remove samples
+        """
+        if not isinstance(self.recognizer, LBPHEngine) or not self.model_loaded:
+            self.logger.warning("Face recognition backend cannot remove students without retraining")
+            return False
+        
+        try:
+            removed = self.recognizer.remove(ids)
+            self._save_delta()
+            
+            self.logger.info(f"Removed {removed} images of {len(ids)} students from the face recognition model")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error removing students from face recognition model: {e}")
+            return False
+    
+    def _save_delta(self):
+        """Persist pending NumPy engine changes, compacting the journal once it grows large."""
+        self.recognizer.save_delta(self.binary_model_path)
+        
+        # Fold the journal into the model once it exceeds a quarter of the model size
+        delta_path = self.binary_model_path + ".delta"
+        if os.path.exists(delta_path) and os.path.getsize(delta_path) > os.path.getsize(self.binary_model_path) // 4:
+            self.recognizer.save(self.binary_model_path)
+        self._mark_model_saved()
+    
+    def recognize_face(self, face_img, box=None):
         """
         Recognize a face.
         
         Args:
-            face_img (numpy.ndarray): Face image
+            face_img (numpy.ndarray): Face image, or a full (preferably grayscale) frame if box is given
+            box (tuple, optional): Face rectangle (x, y, w, h) within face_img
             
         Returns:
             tuple: (id, confidence) where id is the recognized ID and confidence is the recognition confidence
@@ -124,19 +455,116 @@ class FaceRecognizer:
             return -1, 100
         
         try:
-            # Convert to grayscale if needed
-            if len(face_img.shape) > 2:
-                gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = face_img
+            # Canonical 100x100 grayscale face, shared with training
+            resized = self.preprocessor.face(face_img, box)
             
-            # Resize to standard size (100x100)
-            resized = cv2.resize(gray, (100, 100))
+            # Only the current roster's students can match
+            recognizer = self._get_active_recognizer()
+            if recognizer is None:
+                return -1, 100
             
             # Recognize face
-            id, confidence = self.recognizer.predict(resized)
+            id, confidence = recognizer.predict(resized)
             
             return id, confidence
         except Exception as e:
             self.logger.error(f"Error recognizing face: {e}")
             return -1, 100
+    
+    def recognize_faces(self, image, boxes):
+        """
+        Recognize several faces from one frame.
+        
+        All faces are preprocessed into one stacked array and predicted across a
+        thread pool, so frames with many faces use every core.
+        
+        Args:
+            image (numpy.ndarray): Frame containing the faces (grayscale avoids a color conversion)
+            boxes: Face rectangles (x, y, w, h)
+            
+        Returns:
+            tuple: (ids, confidences) as numpy arrays; unrecognized faces have id -1 and confidence 100
+        """
+        count = len(boxes)
+        ids = np.full(count, -1, dtype=np.int32)
+        confidences = np.full(count, 100.0, dtype=np.float64)
+        
+        if count == 0:
+            return ids, confidences
+        
+        if not self.face_module_available:
+            self.logger.warning("OpenCV face module not available. Cannot recognize faces.")
+            return ids, confidences
+        
+        if not self.model_loaded:
+            self.logger.warning("Face recognition model not loaded. Cannot recognize faces.")
+            return ids, confidences
+        
+        try:
+            # Convert the frame once and preprocess every face into one stacked array
+            gray = self.preprocessor.gray(image)
+            faces = np.empty((count, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+            for i, box in enumerate(boxes):
+                preprocess_face(gray, box, out=faces[i])
+            
+            # Use one model for the whole batch even if a reload swaps it meanwhile
+            recognizer = self._get_active_recognizer()
+            
+            if recognizer is None:
+                return ids, confidences
+            elif isinstance(recognizer, LBPHEngine):
+                # The whole batch is matched against the gallery in one vectorized call
+                return recognizer.predict_batch(faces)
+            elif count == 1 or self.max_workers <= 1:
+                results = [recognizer.predict(face) for face in faces]
+            else:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                results = list(self.executor.map(recognizer.predict, faces))
+            
+            for i, (face_id, confidence) in enumerate(results):
+                ids[i] = face_id
+                confidences[i] = confidence
+        except Exception as e:
+            self.logger.error(f"Error recognizing faces: {e}")
+        
+        return ids, confidences
+    
+    def get_top_matches(self, image, boxes, k=3):
+        """
+        Get the k closest students for each face.
+        
+        Args:
+            image (numpy.ndarray): Frame containing the faces
+            boxes: Face rectangles (x, y, w, h)
+            k (int): Number of matches per face
+            
+        Returns:
+            list: Per face, a list of (id, confidence) tuples sorted by confidence
+        """
+        if not self.face_module_available or not self.model_loaded or len(boxes) == 0:
+            return [[] for _ in boxes]
+        
+        try:
+            gray = self.preprocessor.gray(image)
+            faces = np.empty((len(boxes), FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+            for i, box in enumerate(boxes):
+                preprocess_face(gray, box, out=faces[i])
+            
+            recognizer = self._get_active_recognizer()
+            if recognizer is None:
+                return [[] for _ in boxes]
+            if isinstance(recognizer, LBPHEngine):
+                return recognizer.predict_top_k(faces, k)
+            
+            # cv2.face only reports the single best match
+            return [[tuple(recognizer.predict(face))] for face in faces]
+        except Exception as e:
+            self.logger.error(f"Error matching faces: {e}")
+            return [[] for _ in boxes]
+    
+    def shutdown(self):
+        """Shut down the recognition thread pool."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,215 @@
+"""
+Face Tracker Module
+This module provides lightweight tracking of detected faces between detections.
+"""
+
+import cv2
+import numpy as np
+
+def compute_iou(box_a, box_b):
+    """
+    Compute the intersection over union of two face rectangles.
+    
+    Args:
+        box_a (tuple): First rectangle (x, y, w, h)
+        box_b (tuple): Second rectangle (x, y, w, h)
+    
+    Returns:
+        float: Intersection over union in the range [0, 1]
+    """
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    
+    # Intersection rectangle
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = ix * iy
+    
+    union = aw * ah + bw * bh - intersection
+    if union <= 0:
+        return 0.0
+    
+    return intersection / float(union)
+
+class FaceTrack:
+    """
+    A single tracked face.
+    """
+    
+    def __init__(self, track_id, box):
+        """
+        Initialize the track.
+        
+        Args:
+            track_id (int): Stable track ID
+            box (tuple): Face rectangle (x, y, w, h)
+        """
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = None
+        self.scale = 1.0
+
+class FaceTracker:
+    """
+    A class for carrying faces forward between detections using template matching.
+    
+    Each face is matched against a downscaled template of itself within a small
+    search window around its last position, which is far cheaper than running the
+    full cascade detector on the whole frame.
+    """
+    
+    def __init__(self, search_margin=0.5, match_threshold=0.6, iou_threshold=0.3, template_size=32):
+        """
+        Initialize the face tracker.
+        
+        Args:
+            search_margin (float): Search window margin as a fraction of the face size
+            match_threshold (float): Minimum normalized correlation to keep a track
+            iou_threshold (float): Minimum IoU to associate a detection with a track
+            template_size (int): Template width in pixels used for matching
+        """
+        self.search_margin = search_margin
+        self.match_threshold = match_threshold
+        self.iou_threshold = iou_threshold
+        self.template_size = template_size
+        
+        self.tracks = []
+        self.next_track_id = 1
+        self.lost = False
+    
+    def reset(self):
+        """Drop all tracks."""
+        self.tracks = []
+        self.lost = False
+    
+    def _set_template(self, gray, track):
+        """
+        Store a downscaled template of the track's face region.
+        
+        Args:
+            gray (numpy.ndarray): Grayscale frame
+            track (FaceTrack): Track to update
+        """
+        x, y, w, h = track.box
+        face = gray[y:y + h, x:x + w]
+        if face.size == 0:
+            track.template = None
+            return
+        
+        track.scale = min(1.0, self.template_size / float(max(w, 1)))
+        if track.scale < 1.0:
+            size = (max(1, int(round(w * track.scale))), max(1, int(round(h * track.scale))))
+            track.template = cv2.resize(face, size, interpolation=cv2.INTER_AREA)
+        else:
+            track.template = face.copy()
+    
+    def _result(self):
+        """
+        Get the current tracks as arrays.
+        
+        Returns:
+            tuple: (faces, track_ids) where faces is an (n, 4) int32 array of (x, y, w, h)
+        """
+        if not self.tracks:
+            return np.empty((0, 4), dtype=np.int32), []
+        
+        faces = np.array([track.box for track in self.tracks], dtype=np.int32)
+        return faces, [track.track_id for track in self.tracks]
+    
+    def update(self, gray, faces):
+        """
+        Update tracks from a fresh set of detections.
+        
+        Detections overlapping an existing track keep its ID; the rest start new tracks,
+        and tracks without a matching detection are dropped.
+        
+        Args:
+            gray (numpy.ndarray): Grayscale frame the detections came from
+            faces: Detected face rectangles (x, y, w, h)
+        
+        Returns:
+            tuple: (faces, track_ids)
+        """
+        unmatched = list(self.tracks)
+        new_tracks = []
+        
+        for box in faces:
+            # Greedily associate with the best overlapping track
+            best_track, best_iou = None, self.iou_threshold
+            for track in unmatched:
+                iou = compute_iou(track.box, box)
+                if iou >= best_iou:
+                    best_track, best_iou = track, iou
+            
+            if best_track is not None:
+                unmatched.remove(best_track)
+                best_track.box = tuple(int(v) for v in box)
+                track = best_track
+            else:
+                track = FaceTrack(self.next_track_id, box)
+                self.next_track_id += 1
+            
+            self._set_template(gray, track)
+            new_tracks.append(track)
+        
+        self.tracks = new_tracks
+        self.lost = False
+        return self._result()
+    
+    def track(self, gray):
+        """
+        Carry the current tracks forward into a new frame.
+        
+        Tracks whose best match falls below the threshold are dropped and the
+        tracker is flagged as lost so the caller can run a full detection.
+        
+        Args:
+            gray (numpy.ndarray): Grayscale frame
+        
+        Returns:
+            tuple: (faces, track_ids)
+        """
+        frame_h, frame_w = gray.shape[:2]
+        kept = []
+        
+        for track in self.tracks:
+            if track.template is None:
+                self.lost = True
+                continue
+            
+            x, y, w, h = track.box
+            margin_x = int(w * self.search_margin)
+            margin_y = int(h * self.search_margin)
+            
+            # Search window around the last position, clipped to the frame
+            wx1, wy1 = max(0, x - margin_x), max(0, y - margin_y)
+            wx2, wy2 = min(frame_w, x + w + margin_x), min(frame_h, y + h + margin_y)
+            window = gray[wy1:wy2, wx1:wx2]
+            
+            if track.scale < 1.0:
+                size = (max(1, int(round((wx2 - wx1) * track.scale))), max(1, int(round((wy2 - wy1) * track.scale))))
+                window = cv2.resize(window, size, interpolation=cv2.INTER_AREA)
+            
+            th, tw = track.template.shape[:2]
+            if window.shape[0] < th or window.shape[1] < tw:
+                self.lost = True
+                continue
+            
+            result = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            
+            if max_val < self.match_threshold:
+                self.lost = True
+                continue
+            
+            # Map the match back to full-resolution coordinates
+            track.box = (
+                wx1 + int(round(max_loc[0] / track.scale)),
+                wy1 + int(round(max_loc[1] / track.scale)),
+                w,
+                h
+            )
+            kept.append(track)
+        
+        self.tracks = kept
+        return self._result()
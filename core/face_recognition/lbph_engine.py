@@ -0,0 +1,673 @@
+"""
+LBPH Engine Module
+This module provides a NumPy implementation of the LBPH face recognizer with a matrix gallery.
+"""
+
+import os
+import sys
+import struct
+import cv2
+import numpy as np
+
+# Binary model layout: header, int32 labels, then the float32 gallery matrix (64-byte aligned)
+BINARY_MAGIC = b"LBPHBIN1"
+BINARY_HEADER = struct.Struct("<8s5Id2Q")
+BINARY_ALIGNMENT = 64
+
+# Delta journal next to a binary model: header (tied to one base file), then add/remove records
+DELTA_MAGIC = b"LBPHDLT1"
+DELTA_HEADER = struct.Struct("<8s3Q")
+DELTA_RECORD = struct.Struct("<4siQ")
+DELTA_ADD = b"ADD "
+DELTA_REMOVE = b"DEL "
+
+def _align(offset):
+    """Round an offset up to the binary model alignment."""
+    return (offset + BINARY_ALIGNMENT - 1) // BINARY_ALIGNMENT * BINARY_ALIGNMENT
+
+def get_binary_model_path(model_path):
+    """
+    Get the binary model path that belongs to a model path.
+    
+    Args:
+        model_path (str): Configured model path (usually the YAML model)
+    
+    Returns:
+        str: Model path with a .lbph extension
+    """
+    return os.path.splitext(model_path)[0] + ".lbph"
+
+def is_binary_model(path):
+    """
+    Check whether a file is a binary LBPH model.
+    
+    Args:
+        path (str): Path to the model file
+    
+    Returns:
+        bool: True if the file starts with the binary model magic, False otherwise
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except OSError:
+        return False
+
+class LBPHEngine:
+    """
+    A NumPy LBPH face recognizer compatible with cv2.face.LBPHFaceRecognizer.
+    
+    Histograms are computed exactly like OpenCV (circular LBP, per-cell normalized
+    histograms). The gallery is one contiguous float32 matrix of square-rooted
+    histograms, so the similarity of a whole batch of query faces to every
+    training histogram is a single matrix product. The closest rows are then
+    re-ranked with the exact chi-square distance OpenCV uses, so distances and
+    thresholds keep their meaning. Models are read and written in the OpenCV
+    YAML format, so existing face_recognition_model.yml files can be used.
+    """
+    
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8, threshold=sys.float_info.max, rerank=64):
+        """
+        Initialize the LBPH engine.
+        
+        Args:
+            radius (int): Radius of the circular LBP pattern
+            neighbors (int): Number of sample points of the LBP pattern
+            grid_x (int): Number of histogram cells horizontally
+            grid_y (int): Number of histogram cells vertically
+            threshold (float): Distance above which predictions return -1
+            rerank (int): Closest gallery rows re-ranked with the exact distance per face
+        """
+        self.radius = int(radius)
+        self.neighbors = int(neighbors)
+        self.grid_x = int(grid_x)
+        self.grid_y = int(grid_y)
+        self.threshold = float(threshold)
+        self.rerank = max(1, int(rerank))
+        
+        self.gallery = np.empty((0, self.histogram_size), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int32)
+        
+        # Changes not yet written to a delta journal, as (op, label, rows)
+        self.pending = []
+    
+    @property
+    def histogram_size(self):
+        """
+        Get the length of one spatial histogram.
+        
+        Returns:
+            int: Number of histogram bins over all cells
+        """
+        return self.grid_x * self.grid_y * (1 << self.neighbors)
+    
+    def empty(self):
+        """
+        Check whether the gallery is empty.
+        
+        Returns:
+            bool: True if no histograms are stored, False otherwise
+        """
+        return len(self.labels) == 0
+    
+    def _sample_points(self):
+        """
+        Get the bilinear sample offsets and weights of each LBP neighbor (as in OpenCV).
+        
+        Returns:
+            list: (fy, fx, cy, cx, w1, w2, w3, w4) per neighbor
+        """
+        points = []
+        for n in range(self.neighbors):
+            angle = 2.0 * np.pi * n / float(self.neighbors)
+            x = np.float32(self.radius * np.cos(angle))
+            y = np.float32(-self.radius * np.sin(angle))
+            
+            fx, fy = int(np.floor(x)), int(np.floor(y))
+            cx, cy = int(np.ceil(x)), int(np.ceil(y))
+            
+            ty = y - np.float32(fy)
+            tx = x - np.float32(fx)
+            one = np.float32(1)
+            
+            points.append((
+                fy, fx, cy, cx,
+                (one - tx) * (one - ty),
+                tx * (one - ty),
+                (one - tx) * ty,
+                tx * ty
+            ))
+        return points
+    
+    def _lbp(self, faces):
+        """
+        Compute circular LBP codes for a stack of faces.
+        
+        Args:
+            faces (numpy.ndarray): Grayscale faces of shape (n, height, width)
+        
+        Returns:
+            numpy.ndarray: LBP codes of shape (n, height - 2r, width - 2r)
+        """
+        r = self.radius
+        src = faces.astype(np.float32)
+        rows, cols = src.shape[1:]
+        center = src[:, r:rows - r, r:cols - r]
+        codes = np.zeros(center.shape, dtype=np.int32)
+        eps = np.finfo(np.float32).eps
+        
+        def shifted(dy, dx):
+            return src[:, r + dy:rows - r + dy, r + dx:cols - r + dx]
+        
+        for n, (fy, fx, cy, cx, w1, w2, w3, w4) in enumerate(self._sample_points()):
+            t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+            bits = (t > center) | (np.abs(t - center) < eps)
+            codes |= bits.astype(np.int32) << n
+        
+        return codes
+    
+    def compute_histograms(self, faces):
+        """
+        Compute normalized spatial LBP histograms for a stack of faces.
+        
+        Args:
+            faces: Grayscale face or faces, (height, width) or (n, height, width)
+        
+        Returns:
+            numpy.ndarray: float32 histograms of shape (n, histogram_size)
+        """
+        faces = np.asarray(faces)
+        if faces.ndim == 2:
+            faces = faces[np.newaxis]
+        
+        codes = self._lbp(faces)
+        count, rows, cols = codes.shape
+        bins = 1 << self.neighbors
+        cell_h, cell_w = rows // self.grid_y, cols // self.grid_x
+        cells = self.grid_x * self.grid_y
+        
+        # Group the codes by cell (row-major, like OpenCV) and offset each cell into its own bin range
+        codes = codes[:, :cell_h * self.grid_y, :cell_w * self.grid_x]
+        codes = codes.reshape(count, self.grid_y, cell_h, self.grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+        codes = codes.reshape(count, cells, cell_h * cell_w)
+        codes = codes + (np.arange(count * cells, dtype=np.int64) * bins).reshape(count, cells, 1)
+        
+        histograms = np.bincount(codes.ravel(), minlength=count * cells * bins).astype(np.float32)
+        histograms /= np.float32(cell_h * cell_w)
+        return histograms.reshape(count, cells * bins)
+    
+    @property
+    def histograms(self):
+        """
+        Get the gallery as normalized LBP histograms (as stored by OpenCV).
+        
+        Returns:
+            numpy.ndarray: float32 histograms of shape (gallery size, histogram_size)
+        """
+        return np.square(self.gallery)
+    
+    def train(self, faces, labels):
+        """
+        Replace the gallery with histograms of the given faces.
+        
+        Args:
+            faces: Grayscale faces (list or array of equally sized images)
+            labels: Corresponding integer labels
+        """
+        self.gallery = np.empty((0, self.histogram_size), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int32)
+        self.update(faces, labels)
+        self.pending = []
+    
+    def update(self, faces, labels):
+        """
+        Add histograms of the given faces to the gallery.
+        
+        The additions are also kept as pending changes for save_delta.
+        
+        Args:
+            faces: Grayscale faces (list or array of equally sized images)
+            labels: Corresponding integer labels
+        """
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        if len(faces) != len(labels):
+            raise ValueError(f"Got {len(faces)} faces but {len(labels)} labels")
+        if len(labels) == 0:
+            raise ValueError("Empty training data was given")
+        
+        faces = np.asarray(faces, dtype=np.uint8)
+        
+        # Compute histograms in chunks to bound the LBP scratch memory
+        rows = [np.sqrt(self.compute_histograms(faces[start:start + 256])) for start in range(0, len(faces), 256)]
+        
+        rows = np.concatenate(rows)
+        
+        self.gallery = np.concatenate([self.gallery, rows])
+        self.labels = np.concatenate([self.labels, labels])
+        
+        for label in np.unique(labels):
+            self.pending.append((DELTA_ADD, int(label), rows[labels == label]))
+    
+    def remove(self, labels):
+        """
+        Remove every histogram of the given labels from the gallery.
+        
+        Args:
+            labels: Labels to remove
+        
+        Returns:
+            int: Number of histograms removed
+        """
+        labels = np.unique(np.asarray(labels, dtype=np.int32).ravel())
+        keep = ~np.isin(self.labels, labels)
+        removed = len(keep) - int(keep.sum())
+        
+        if removed:
+            self.gallery = self.gallery[keep]
+            self.labels = self.labels[keep]
+        
+        for label in labels:
+            self.pending.append((DELTA_REMOVE, int(label), None))
+        return removed
+    
+    def subset(self, labels):
+        """
+        Create an engine matching only the given labels.
+        
+        The selected rows are copied into a new contiguous gallery, so a roster
+        of a few hundred students is searched without touching the full gallery.
+        
+        Args:
+            labels: Labels to keep
+        
+        Returns:
+            LBPHEngine: New engine with the same parameters and the selected histograms
+        """
+        engine = LBPHEngine(self.radius, self.neighbors, self.grid_x, self.grid_y, self.threshold, self.rerank)
+        keep = np.isin(self.labels, np.asarray(labels, dtype=np.int32).ravel())
+        engine.gallery = np.ascontiguousarray(self.gallery[keep])
+        engine.labels = np.array(self.labels[keep], dtype=np.int32)
+        return engine
+    
+    @classmethod
+    def from_opencv(cls, recognizer, labels=None):
+        """
+        Create an engine from a trained cv2.face LBPH recognizer.
+        
+        Args:
+            recognizer: cv2.face.LBPHFaceRecognizer instance
+            labels (optional): Only copy the histograms of these labels
+        
+        Returns:
+            LBPHEngine: Engine giving the same predictions as the recognizer
+        """
+        engine = cls(recognizer.getRadius(), recognizer.getNeighbors(), recognizer.getGridX(),
+                     recognizer.getGridY(), recognizer.getThreshold())
+        
+        model_labels = recognizer.getLabels()
+        model_labels = np.empty(0, dtype=np.int32) if model_labels is None else model_labels.ravel().astype(np.int32)
+        if labels is None:
+            keep = np.ones(len(model_labels), dtype=bool)
+        else:
+            keep = np.isin(model_labels, np.asarray(labels, dtype=np.int32).ravel())
+        
+        histograms = [histogram for histogram, kept in zip(recognizer.getHistograms(), keep) if kept]
+        gallery = np.empty((len(histograms), engine.histogram_size), dtype=np.float32)
+        for i, histogram in enumerate(histograms):
+            gallery[i] = histogram.ravel()
+        np.sqrt(gallery, out=gallery)
+        
+        engine.gallery = gallery
+        engine.labels = model_labels[keep]
+        return engine
+    
+    def _match(self, faces):
+        """
+        Find the closest gallery rows of each face.
+        
+        Args:
+            faces: Grayscale face or faces, (height, width) or (n, height, width)
+        
+        Returns:
+            tuple: (rows, distances) of shape (n, rerank), sorted by exact chi-square distance
+        """
+        if self.empty():
+            raise ValueError("The LBPH model is not trained")
+        
+        queries = self.compute_histograms(faces)
+        count = len(queries)
+        gallery_size = len(self.labels)
+        
+        # Shortlist by Bhattacharyya similarity: one matrix product for the whole batch
+        if gallery_size > self.rerank:
+            similarity = np.sqrt(queries) @ self.gallery.T
+            rows = np.argpartition(similarity, gallery_size - self.rerank, axis=1)[:, -self.rerank:]
+        else:
+            rows = np.tile(np.arange(gallery_size), (count, 1))
+        
+        # Exact chi-square distance (the same as OpenCV's HISTCMP_CHISQR_ALT) on the shortlist
+        distances = np.empty(rows.shape, dtype=np.float64)
+        for i in range(count):
+            candidates = np.square(self.gallery[rows[i]])
+            diff = candidates - queries[i]
+            total = candidates + queries[i]
+            np.multiply(diff, diff, out=diff)
+            np.divide(diff, total, out=diff, where=total > 0)
+            distances[i] = 2 * diff.sum(axis=1, dtype=np.float64)
+        
+        order = np.argsort(distances, axis=1, kind="stable")
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(distances, order, axis=1)
+    
+    def predict_batch(self, faces):
+        """
+        Predict the label of each face.
+        
+        Args:
+            faces: Grayscale faces of shape (n, height, width)
+        
+        Returns:
+            tuple: (labels, distances) as numpy arrays; faces above the threshold get -1
+        """
+        rows, distances = self._match(faces)
+        labels = self.labels[rows[:, 0]].astype(np.int32)
+        best_distances = distances[:, 0].copy()
+        
+        rejected = best_distances >= self.threshold
+        labels[rejected] = -1
+        best_distances[rejected] = sys.float_info.max
+        return labels, best_distances
+    
+    def predict(self, face):
+        """
+        Predict the label of one face.
+        
+        Args:
+            face (numpy.ndarray): Grayscale face
+        
+        Returns:
+            tuple: (label, distance)
+        """
+        labels, distances = self.predict_batch(np.asarray(face)[np.newaxis])
+        return int(labels[0]), float(distances[0])
+    
+    def predict_top_k(self, faces, k=3):
+        """
+        Get the k closest distinct labels of each face.
+        
+        Args:
+            faces: Grayscale faces of shape (n, height, width)
+            k (int): Number of labels to return per face
+        
+        Returns:
+            list: Per face, a list of up to k (label, distance) tuples sorted by distance
+        """
+        rows, distances = self._match(faces)
+        
+        matches = []
+        for face_rows, face_distances in zip(rows, distances):
+            # Rows are sorted by distance, so the first row of each label is its best match
+            _, first = np.unique(self.labels[face_rows], return_index=True)
+            first = np.sort(first)[:k]
+            matches.append([(int(self.labels[face_rows[j]]), float(face_distances[j])) for j in first])
+        return matches
+    
+    def save(self, path):
+        """
+        Save the model in the binary format.
+        
+        The file is written next to the target and renamed over it, so readers
+        never see a partially written model.
+        
+        Args:
+            path (str): Path to the binary model file
+        """
+        count, size = self.gallery.shape
+        labels_offset = _align(BINARY_HEADER.size)
+        gallery_offset = _align(labels_offset + 4 * count)
+        
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(BINARY_HEADER.pack(
+                BINARY_MAGIC, 1, self.radius, self.neighbors, self.grid_x, self.grid_y,
+                self.threshold, count, size
+            ))
+            f.seek(labels_offset)
+            f.write(np.ascontiguousarray(self.labels, dtype="<i4").tobytes())
+            f.seek(gallery_offset)
+            f.write(np.ascontiguousarray(self.gallery, dtype="<f4").tobytes())
+        os.replace(temp_path, path)
+        
+        # A full save contains every change, so any journal is obsolete
+        if os.path.exists(path + ".delta"):
+            os.remove(path + ".delta")
+        self.pending = []
+    
+    @staticmethod
+    def _base_signature(path):
+        """Identify one version of a binary model file by its size and modification time."""
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    
+    def save_delta(self, path):
+        """
+        Append the pending changes to the delta journal of a binary model.
+        
+        Only the added histograms and removed labels are written, so enrolling or
+        removing one student does not rewrite the whole model. Falls back to a full
+        save when the binary model does not exist yet.
+        
+        Args:
+            path (str): Path to the binary model file
+        """
+        if not os.path.exists(path):
+            self.save(path)
+            return
+        
+        delta_path = path + ".delta"
+        size, mtime_ns = self._base_signature(path)
+        
+        # Start a new journal if there is none or it belongs to an older base file
+        mode = "ab"
+        if not os.path.exists(delta_path) or self._read_delta_header(delta_path) != (size, mtime_ns):
+            mode = "wb"
+        
+        with open(delta_path, mode) as f:
+            if mode == "wb":
+                f.write(DELTA_HEADER.pack(DELTA_MAGIC, size, mtime_ns, self.histogram_size))
+            for op, label, rows in self.pending:
+                count = 0 if rows is None else len(rows)
+                f.write(DELTA_RECORD.pack(op, label, count))
+                if count:
+                    f.write(np.ascontiguousarray(rows, dtype="<f4").tobytes())
+        self.pending = []
+    
+    def _read_delta_header(self, delta_path):
+        """
+        Read which base file a delta journal belongs to.
+        
+        Returns:
+            tuple: (size, mtime_ns) of the base file, or None if the journal is invalid
+        """
+        with open(delta_path, "rb") as f:
+            header = f.read(DELTA_HEADER.size)
+        if len(header) < DELTA_HEADER.size:
+            return None
+        
+        magic, size, mtime_ns, histogram_size = DELTA_HEADER.unpack(header)
+        if magic != DELTA_MAGIC or histogram_size != self.histogram_size:
+            return None
+        return size, mtime_ns
+    
+    def _apply_delta(self, path):
+        """Replay the delta journal of a binary model onto the loaded gallery."""
+        delta_path = path + ".delta"
+        if not os.path.exists(delta_path) or self._read_delta_header(delta_path) != self._base_signature(path):
+            return
+        
+        removed = set()
+        added = []
+        row_bytes = 4 * self.histogram_size
+        with open(delta_path, "rb") as f:
+            f.seek(DELTA_HEADER.size)
+            while True:
+                record = f.read(DELTA_RECORD.size)
+                if len(record) < DELTA_RECORD.size:
+                    break
+                op, label, count = DELTA_RECORD.unpack(record)
+                
+                data = f.read(count * row_bytes)
+                if len(data) < count * row_bytes:
+                    # A partially written record ends the journal
+                    break
+                
+                if op == DELTA_REMOVE:
+                    removed.add(label)
+                    added = [(added_label, rows) for added_label, rows in added if added_label != label]
+                elif op == DELTA_ADD:
+                    added.append((label, np.frombuffer(data, dtype="<f4").reshape(count, self.histogram_size)))
+        
+        if not removed and not added:
+            return
+        
+        # Keep the mapped base rows that survive, then append the journal's rows
+        keep = ~np.isin(self.labels, list(removed))
+        self.gallery = np.concatenate([self.gallery[keep]] + [rows for _, rows in added])
+        self.labels = np.concatenate(
+            [self.labels[keep]] + [np.full(len(rows), label, dtype=np.int32) for label, rows in added]
+        )
+    
+    def load(self, path):
+        """
+        Load a binary model by memory-mapping it.
+        
+        Nothing is parsed or copied: the gallery is a read-only view of the file,
+        so startup is near-instant and processes loading the same model share
+        its pages through the OS page cache. A delta journal written by
+        save_delta is replayed on top; a full save folds it back in.
+        
+        Args:
+            path (str): Path to the binary model file
+        """
+        with open(path, "rb") as f:
+            header = f.read(BINARY_HEADER.size)
+        if len(header) < BINARY_HEADER.size:
+            raise ValueError(f"Not a binary LBPH model: {path}")
+        
+        magic, version, radius, neighbors, grid_x, grid_y, threshold, count, size = BINARY_HEADER.unpack(header)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"Not a binary LBPH model: {path}")
+        if version != 1:
+            raise ValueError(f"Unsupported binary LBPH model version {version}: {path}")
+        
+        self.radius, self.neighbors, self.grid_x, self.grid_y = radius, neighbors, grid_x, grid_y
+        self.threshold = threshold
+        if size != self.histogram_size:
+            raise ValueError(f"Corrupt binary LBPH model (histogram size {size}): {path}")
+        
+        self.pending = []
+        if count == 0:
+            self.labels = np.empty(0, dtype=np.int32)
+            self.gallery = np.empty((0, size), dtype=np.float32)
+        else:
+            labels_offset = _align(BINARY_HEADER.size)
+            gallery_offset = _align(labels_offset + 4 * count)
+            self.labels = np.memmap(path, dtype="<i4", mode="r", offset=labels_offset, shape=(count,))
+            self.gallery = np.memmap(path, dtype="<f4", mode="r", offset=gallery_offset, shape=(count, size))
+        
+        # Incremental changes since the last full save (the result is then held in memory)
+        self._apply_delta(path)
+    
+    def read(self, path):
+        """
+        Load a model saved in the OpenCV LBPH YAML format (or the binary format).
+        
+        Args:
+            path (str): Path to the model file
+        """
+        if is_binary_model(path):
+            self.load(path)
+            return
+        
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+        try:
+            if not fs.isOpened():
+                raise IOError(f"Cannot open model file: {path}")
+            
+            node = fs.getNode("opencv_lbphfaces")
+            if node.empty():
+                raise ValueError(f"Not an LBPH model: {path}")
+            
+            self.radius = int(node.getNode("radius").real())
+            self.neighbors = int(node.getNode("neighbors").real())
+            self.grid_x = int(node.getNode("grid_x").real())
+            self.grid_y = int(node.getNode("grid_y").real())
+            if not node.getNode("threshold").empty():
+                self.threshold = node.getNode("threshold").real()
+            
+            # Stack every histogram into one contiguous gallery matrix
+            histograms_node = node.getNode("histograms")
+            gallery = np.empty((histograms_node.size(), self.histogram_size), dtype=np.float32)
+            for i in range(histograms_node.size()):
+                gallery[i] = histograms_node.at(i).mat().ravel()
+            np.sqrt(gallery, out=gallery)
+            
+            labels = node.getNode("labels").mat()
+            self.labels = np.empty(0, dtype=np.int32) if labels is None else labels.ravel().astype(np.int32)
+            self.gallery = gallery
+            self.pending = []
+        finally:
+            fs.release()
+    
+    def write(self, path):
+        """
+        Save the model in the OpenCV LBPH YAML format.
+        
+        Args:
+            path (str): Path to the model file
+        """
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        try:
+            fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+            fs.write("threshold", self.threshold)
+            fs.write("radius", self.radius)
+            fs.write("neighbors", self.neighbors)
+            fs.write("grid_x", self.grid_x)
+            fs.write("grid_y", self.grid_y)
+            
+            fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+            for row in self.gallery:
+                fs.write("", np.square(row).reshape(1, -1))
+            fs.endWriteStruct()
+            
+            fs.write("labels", self.labels.reshape(-1, 1))
+            fs.endWriteStruct()
+        finally:
+            fs.release()
+
+def convert_yaml_model(yaml_path, binary_path=None):
+    """
+    Convert an OpenCV LBPH YAML model to the binary format.
+    
+    Args:
+        yaml_path (str): Path to the YAML model
+        binary_path (str, optional): Output path. Defaults to the YAML path with a .lbph extension.
+    
+    Returns:
+        str: Path of the binary model
+    """
+    if binary_path is None:
+        binary_path = get_binary_model_path(yaml_path)
+    
+    engine = LBPHEngine()
+    engine.read(yaml_path)
+    engine.save(binary_path)
+    return binary_path
+
+# Convert a model from the command line
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m core.face_recognition.lbph_engine <model.yml> [model.lbph]")
+        sys.exit(1)
+    
+    output_path = convert_yaml_model(*sys.argv[1:])
+    print(f"Binary model written to {output_path}")
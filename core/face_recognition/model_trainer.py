@@ -8,8 +8,28 @@ import cv2
 import numpy as np
 import logging
 import glob
+import time
+import shutil
+import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
+from core.face_recognition.face_preprocessor import preprocess_face, FACE_SIZE
+from core.face_recognition.lbph_engine import get_binary_model_path
+
+# Preprocessed faces of a student directory, with the size and mtime of each source image
+CACHE_FILENAME = "faces_cache.npz"
+
+# Training image extensions
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Directory next to the data directory that holds the images of removed students
+REMOVED_DIRNAME = "removed_images"
+
+class TrainingCancelled(Exception):
+    """Raised when a training run is cancelled."""
+
 class ModelTrainer:
     """
     A class for training face recognition models.
@@ -41,13 +61,245 @@ class ModelTrainer:
                 self.logger.error(f"Error initializing config in ModelTrainer: {e}")
                 raise ValueError("Config is required for ModelTrainer")
     
-    def train_model(self, data_dir=None):
+    def _collect_samples(self, data_dir, student_dirs):
+        """
+        Collect the image paths of the given student directories.
+        
+        Args:
+            data_dir (str): Directory containing face images
+            student_dirs (list): Student directory names (student IDs)
+        
+        Returns:
+            list: (student_id, image_path) tuples
+        """
+        samples = []
+        
+        for student_dir in student_dirs:
+            try:
+                # Get student ID from directory name
+                student_id = int(student_dir)
+                
+                # Get all image files with one directory listing
+                student_path = os.path.join(data_dir, student_dir)
+                image_paths = [
+                    os.path.join(student_path, name) for name in sorted(os.listdir(student_path))
+                    if name.endswith(IMAGE_EXTENSIONS) and not name.startswith('.')
+                ]
+                
+                if not image_paths:
+                    self.logger.warning(f"No images found for student {student_id}")
+                    continue
+                
+                samples.extend((student_id, image_path) for image_path in image_paths)
+            except Exception as e:
+                self.logger.warning(f"Error processing student directory {student_dir}: {e}")
+        
+        return samples
+    
+    def _decode_image(self, image_path, out):
+        """
+        Read one image and preprocess it into an output buffer.
+        
+        Args:
+            image_path (str): Path to the image
+            out (numpy.ndarray): (100, 100) uint8 buffer for the face
+        
+        Returns:
+            bool: True if the image was read, False otherwise
+        """
+        # Read image straight to grayscale
+        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        
+        if img is None:
+            self.logger.warning(f"Failed to read image: {image_path}")
+            return False
+        
+        # Same preprocessing as recognition (grayscale, 100x100)
+        preprocess_face(img, out=out)
+        return True
+    
+    def _read_cache(self, student_dir):
+        """
+        Read the preprocessed face cache of a student directory.
+        
+        Args:
+            student_dir (str): Student image directory
+        
+        Returns:
+            dict: Image filename -> (size, mtime_ns, face); empty if there is no valid cache
+        """
+        cache_path = os.path.join(student_dir, CACHE_FILENAME)
+        if not os.path.exists(cache_path):
+            return {}
+        
+        try:
+            with np.load(cache_path, allow_pickle=False) as data:
+                faces = data["faces"]
+                return {
+                    str(name): (int(size), int(mtime), faces[i])
+                    for i, (name, size, mtime) in enumerate(zip(data["names"], data["sizes"], data["mtimes"]))
+                }
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable face cache {cache_path}: {e}")
+            return {}
+    
+    def _write_cache(self, student_dir, faces, names, sizes, mtimes):
+        """
+        Write the preprocessed face cache of a student directory.
+        
+        Args:
+            student_dir (str): Student image directory
+            faces (numpy.ndarray): Preprocessed faces, one per image
+            names (list): Image filenames
+            sizes (list): Image file sizes
+            mtimes (list): Image modification times (ns)
+        """
+        cache_path = os.path.join(student_dir, CACHE_FILENAME)
+        temp_path = os.path.join(student_dir, "faces_cache.tmp.npz")
+        
+        try:
+            np.savez(
+                temp_path,
+                faces=faces,
+                names=np.array(names, dtype=str),
+                sizes=np.array(sizes, dtype=np.int64),
+                mtimes=np.array(mtimes, dtype=np.int64)
+            )
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            self.logger.warning(f"Failed to write face cache {cache_path}: {e}")
+    
+    def _get_worker_count(self):
+        """
+        Get the number of image loading threads.
+        
+        Returns:
+            int: FaceRecognition.TrainingWorkers, or the CPU count when it is 0
+        """
+        try:
+            workers = int(self.config.get_value('FaceRecognition', 'TrainingWorkers', '0'))
+        except (TypeError, ValueError):
+            workers = 0
+        return workers if workers > 0 else (os.cpu_count() or 1)
+    
+    def _load_student_faces(self, student_dir, student_samples):
+        """
+        Read and preprocess the images of one student directory.
+        
+        The directory keeps a cache of its preprocessed faces. Images whose size
+        and modification time match the cache are copied from it; only new or
+        changed images are decoded, and the cache is rewritten when anything changed.
+        
+        Args:
+            student_dir (str): Student image directory
+            student_samples (list): (student_id, image_path) tuples in the directory
+        
+        Returns:
+            tuple: (faces_array, ids) of the images that could be read
+        """
+        faces_array = np.empty((len(student_samples), FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8)
+        ids = []
+        
+        cache = self._read_cache(student_dir)
+        names, sizes, mtimes = [], [], []
+        changed = False
+        
+        for student_id, image_path in student_samples:
+            try:
+                stat = os.stat(image_path)
+                name = os.path.basename(image_path)
+                cached = cache.get(name)
+                
+                if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                    faces_array[len(ids)] = cached[2]
+                elif self._decode_image(image_path, faces_array[len(ids)]):
+                    changed = True
+                else:
+                    continue
+                
+                # Add to training data
+                names.append(name)
+                sizes.append(stat.st_size)
+                mtimes.append(stat.st_mtime_ns)
+                ids.append(student_id)
+            except Exception as e:
+                self.logger.warning(f"Error processing image {image_path}: {e}")
+        
+        # Drop the slots of images that failed to load
+        faces_array = faces_array[:len(ids)]
+        
+        # Rewrite the cache when images were added, changed or removed
+        if changed or len(names) != len(cache):
+            self._write_cache(student_dir, faces_array, names, sizes, mtimes)
+        
+        return faces_array, ids
+    
+    def _load_faces(self, samples, progress=None, cancel_event=None):
+        """
+        Read and preprocess sample images.
+        
+        Student directories are loaded in parallel on a thread pool
+        (FaceRecognition.TrainingWorkers); OpenCV releases the GIL while decoding.
+        
+        Args:
+            samples (list): (student_id, image_path) tuples
+            progress (callable, optional): Called as progress("loading", images_done, images_total)
+            cancel_event (optional): threading/multiprocessing Event that stops loading when set
+        
+        Returns:
+            tuple: (faces_array, ids_array) of the images that could be read
+        
+        Raises:
+            TrainingCancelled: If cancel_event was set
+        """
+        # Group the samples by student directory
+        groups = {}
+        for student_id, image_path in samples:
+            groups.setdefault(os.path.dirname(image_path), []).append((student_id, image_path))
+        
+        def load(student_dir, group):
+            # Skip the remaining directories once cancelled
+            if cancel_event is not None and cancel_event.is_set():
+                return np.empty((0, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8), []
+            return self._load_student_faces(student_dir, group)
+        
+        workers = min(self._get_worker_count(), len(groups))
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        results = []
+        done = 0
+        
+        try:
+            loaded = executor.map(load, groups.keys(), groups.values()) if executor else map(load, groups.keys(), groups.values())
+            for group, result in zip(groups.values(), loaded):
+                results.append(result)
+                done += len(group)
+                if progress is not None:
+                    progress("loading", done, len(samples))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise TrainingCancelled("Training cancelled")
+        
+        # Stack the per-student arrays in sample order
+        if not results:
+            return np.empty((0, FACE_SIZE[1], FACE_SIZE[0]), dtype=np.uint8), np.empty(0, dtype=np.int32)
+        
+        faces_array = np.concatenate([faces for faces, _ in results])
+        ids_array = np.array([student_id for _, ids in results for student_id in ids], dtype=np.int32)
+        return faces_array, ids_array
+    
+    def train_model(self, data_dir=None, exclude=None, progress=None, cancel_event=None):
         """
         Train the face recognition model.
         
         Args:
             data_dir (str, optional): Directory containing face images. If None, uses default.
-            
+            exclude (list, optional): Student IDs to leave out of the model
+            progress (callable, optional): Called as progress(phase, images_done, images_total)
+            cancel_event (optional): threading/multiprocessing Event that cancels training when set
+        
         Returns:
             tuple: (success, message) where success is a boolean and message is a status message
         """
@@ -63,78 +315,169 @@ class ModelTrainer:
             
             # Get all subdirectories (one per student)
             student_dirs = [d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d))]
+            if exclude:
+                excluded = {str(student_id) for student_id in exclude}
+                student_dirs = [d for d in student_dirs if d not in excluded]
             
             if not student_dirs:
                 self.logger.error("No student directories found")
                 return False, "No student directories found. Please register students first."
             
-            # Collect faces and IDs
-            faces = []
-            ids = []
-            
-            for student_dir in student_dirs:
-                try:
-                    # Get student ID from directory name
-                    student_id = int(student_dir)
-                    
-                    # Get all image files
-                    image_paths = []
-                    for ext in ['jpg', 'jpeg', 'png']:
-                        image_paths.extend(glob.glob(os.path.join(data_dir, student_dir, f'*.{ext}')))
-                    
-                    if not image_paths:
-                        self.logger.warning(f"No images found for student {student_id}")
-                        continue
-                    
-                    # Process each image
-                    for image_path in image_paths:
-                        try:
-                            # Read image
-                            img = cv2.imread(image_path)
-                            
-                            # Convert to grayscale
-                            if img is None:
-                                self.logger.warning(f"Failed to read image: {image_path}")
-                                continue
-                                
-                            if len(img.shape) > 2:
-                                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                            else:
-                                gray = img
-                            
-                            # Resize to standard size
-                            resized = cv2.resize(gray, (100, 100))
-                            
-                            # Add to training data
-                            faces.append(resized)
-                            ids.append(student_id)
-                        except Exception as e:
-                            self.logger.warning(f"Error processing image {image_path}: {e}")
-                except Exception as e:
-                    self.logger.warning(f"Error processing student directory {student_dir}: {e}")
+            # Collect image paths and IDs, then read them into one array
+            samples = self._collect_samples(data_dir, student_dirs)
+            faces_array, ids_array = self._load_faces(samples, progress, cancel_event)
+            ids = ids_array.tolist()
             
             # Check if we have any faces
-            if not faces:
+            if not ids:
                 self.logger.error("No faces found in the directory")
                 return False, "No faces found. Please capture face images for students first."
             
-            # Convert to numpy arrays with consistent types
-            faces_array = np.array(faces, dtype=np.uint8)
-            ids_array = np.array(ids, dtype=np.int32)
+            if cancel_event is not None and cancel_event.is_set():
+                raise TrainingCancelled("Training cancelled")
+            
+            if progress is not None:
+                progress("training", len(ids), len(samples))
             
             # Train the model
             success = self.face_recognizer.train(faces_array, ids_array)
             
             if success:
-                self.logger.info(f"Model trained successfully with {len(faces)} images from {len(set(ids))} students")
-                return True, f"Model trained successfully with {len(faces)} images from {len(set(ids))} students"
+                self.logger.info(f"Model trained successfully with {len(ids)} images from {len(set(ids))} students")
+                return True, f"Model trained successfully with {len(ids)} images from {len(set(ids))} students"
             else:
                 self.logger.error("Failed to train model")
                 return False, "Failed to train model. Please check the logs for details."
+        except TrainingCancelled:
+            self.logger.info("Model training cancelled")
+            return False, "Training cancelled"
         except Exception as e:
             self.logger.error(f"Error training model: {e}")
             return False, f"Error training model: {e}"
     
+    def start_training_job(self, data_dir=None):
+        """
+        Start training the model in a separate process.
+        
+        Args:
+            data_dir (str, optional): Directory containing face images. If None, uses default.
+        
+        Returns:
+            TrainingJob: The running job
+        """
+        if data_dir is None:
+            data_dir = self.config.get_path('FaceRecognition', 'DataDir')
+        
+        return TrainingJob(self.config.config_file, data_dir, self.face_recognizer.model_path).start()
+    
+    def train_student(self, student_id, data_dir=None):
+        """
+        Add or replace one student's samples without retraining the whole model.
+        
+        Only this student's images are read. If the recognizer cannot update the
+        model in place, the full model is retrained instead.
+        
+        Args:
+            student_id: Student ID
+            data_dir (str, optional): Directory containing face images. If None, uses default.
+        
+        Returns:
+            tuple: (success, message) where success is a boolean and message is a status message
+        """
+        try:
+            # Get data directory
+            if data_dir is None:
+                data_dir = self.config.get_path('FaceRecognition', 'DataDir')
+            
+            student_dir = os.path.join(data_dir, str(student_id))
+            if not os.path.isdir(student_dir):
+                self.logger.error(f"Student directory not found: {student_dir}")
+                return False, f"No face images found for student {student_id}"
+            
+            faces_array, ids_array = self._load_faces(self._collect_samples(data_dir, [str(student_id)]))
+            
+            if len(ids_array) == 0:
+                self.logger.error(f"No faces found for student {student_id}")
+                return False, f"No faces found for student {student_id}. Please capture face images first."
+            
+            # Replace the student's samples in place
+            if self.face_recognizer.update(faces_array, ids_array, replace=True):
+                self.logger.info(f"Model updated with {len(ids_array)} images for student {student_id}")
+                return True, f"Model updated with {len(ids_array)} images for student {student_id}"
+            
+            self.logger.info("Incremental update not possible, retraining the full model")
+            return self.train_model(data_dir)
+        except Exception as e:
+            self.logger.error(f"Error training student {student_id}: {e}")
+            return False, f"Error training student {student_id}: {e}"
+    
+    def _archive_student_images(self, data_dir, student_id):
+        """
+        Move a student's image directory out of the data directory.
+        
+        Full retrains enroll every directory under the data directory, so a removed
+        student's images are kept in a sibling directory instead of being deleted.
+        
+        Args:
+            data_dir (str): Directory containing face images
+            student_id: Student ID
+        
+        Returns:
+            str: Path the images were moved to, or None if the student had no images
+        """
+        student_dir = os.path.join(data_dir, str(student_id))
+        if not os.path.isdir(student_dir):
+            return None
+        
+        removed_dir = os.path.join(os.path.dirname(os.path.abspath(data_dir)), REMOVED_DIRNAME)
+        archived_dir = os.path.join(removed_dir, str(student_id))
+        os.makedirs(removed_dir, exist_ok=True)
+        
+        # Replace images archived by an earlier removal
+        if os.path.exists(archived_dir):
+            shutil.rmtree(archived_dir)
+        shutil.move(student_dir, archived_dir)
+        return archived_dir
+    
+    def remove_student(self, student_id, data_dir=None):
+        """
+        Remove a student from the model without retraining it.
+        
+        If the recognizer cannot remove samples, the model is retrained without the student.
+        The student's images are then moved out of the data directory, so later full
+        retrains do not enroll them again.
+        
+        Args:
+            student_id: Student ID
+            data_dir (str, optional): Directory containing face images. If None, uses default.
+        
+        Returns:
+            tuple: (success, message) where success is a boolean and message is a status message
+        """
+        try:
+            # Get data directory
+            if data_dir is None:
+                data_dir = self.config.get_path('FaceRecognition', 'DataDir')
+            
+            if self.face_recognizer.remove_students([int(student_id)]):
+                success, message = True, f"Student {student_id} removed from the model"
+            else:
+                self.logger.info("Incremental removal not possible, retraining the full model")
+                success, message = self.train_model(data_dir, exclude=[student_id])
+            
+            if not success:
+                return False, message
+            
+            archived_dir = self._archive_student_images(data_dir, student_id)
+            if archived_dir:
+                self.logger.info(f"Images of student {student_id} moved to {archived_dir}")
+            
+            self.logger.info(f"Student {student_id} removed from the model")
+            return True, f"Student {student_id} removed from the model"
+        except Exception as e:
+            self.logger.error(f"Error removing student {student_id}: {e}")
+            return False, f"Error removing student {student_id}: {e}"
+    
     def validate_training_data(self, data_dir=None):
         """
         Validate training data.
@@ -256,3 +599,200 @@ class ModelTrainer:
                 summary += f"- Student {student_id}: {student_stats['valid_images']} valid images\n"
         
         return summary
+
+def _run_training_job(config_file, data_dir, model_path, progress_queue, cancel_event):
+    """
+    Train a model in a child process and move it into place.
+    
+    The model is trained into a temporary file next to the real one and renamed
+    over it only on success, so a recognizer never reads a partial model.
+    Progress and the final result are put on progress_queue as dicts.
+    
+    Args:
+        config_file (str): Configuration file path
+        data_dir (str): Directory containing face images
+        model_path (str): Model path to replace
+        progress_queue: multiprocessing Queue for progress messages
+        cancel_event: multiprocessing Event that cancels training when set
+    """
+    # Imported here so the parent process does not need them for the job API
+    from core.data_management.config import ConfigManager
+    from core.face_recognition.face_recognizer import FaceRecognizer
+    
+    def report(phase, done, total):
+        message = f"Loaded {done}/{total} images" if phase == "loading" else f"Training on {done} images..."
+        progress_queue.put({"phase": phase, "done": done, "total": total, "message": message})
+    
+    root, ext = os.path.splitext(model_path)
+    temp_model_path = f"{root}.training{ext}"
+    
+    try:
+        config = ConfigManager(config_file)
+        recognizer = FaceRecognizer(temp_model_path, config)
+        trainer = ModelTrainer(recognizer, config)
+        
+        success, message = trainer.train_model(data_dir, progress=report, cancel_event=cancel_event)
+        
+        if success:
+            # Swap the new model into place
+            if os.path.exists(recognizer.binary_model_path):
+                binary_model_path = get_binary_model_path(model_path)
+                os.replace(recognizer.binary_model_path, binary_model_path)
+                # The old model's delta journal no longer applies
+                if os.path.exists(binary_model_path + ".delta"):
+                    os.remove(binary_model_path + ".delta")
+            if os.path.exists(temp_model_path):
+                os.replace(temp_model_path, model_path)
+        
+        progress_queue.put({
+            "phase": "done",
+            "success": success,
+            "cancelled": cancel_event.is_set() and not success,
+            "message": message
+        })
+    except Exception as e:
+        progress_queue.put({"phase": "done", "success": False, "cancelled": False, "message": f"Error training model: {e}"})
+    finally:
+        # Leave no temporary model behind after a failed or cancelled run
+        for path in (temp_model_path, get_binary_model_path(temp_model_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+class TrainingJob:
+    """
+    A model training run in a separate process.
+    
+    Training does not block the caller (e.g. the Tk event loop). Call poll()
+    periodically to collect progress, cancel() to stop the run.
+    """
+    
+    def __init__(self, config_file, data_dir, model_path):
+        """
+        Initialize the training job.
+        
+        Args:
+            config_file (str): Configuration file path
+            data_dir (str): Directory containing face images
+            model_path (str): Model path to replace when training finishes
+        """
+        self.logger = logging.getLogger("AttendanceSystem")
+        
+        # Spawn a fresh interpreter: forking a process with UI and camera threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        self.progress_queue = context.Queue()
+        self.cancel_event = context.Event()
+        self.process = context.Process(
+            target=_run_training_job,
+            args=(config_file, data_dir, model_path, self.progress_queue, self.cancel_event),
+            daemon=True
+        )
+        
+        self.phase = "starting"
+        self.done_count = 0
+        self.total_count = 0
+        self.message = "Starting training..."
+        self.finished = False
+        self.success = False
+        self.cancelled = False
+    
+    def start(self):
+        """
+        Start the training process.
+        
+        Returns:
+            TrainingJob: This job
+        """
+        self.process.start()
+        return self
+    
+    @property
+    def percent(self):
+        """
+        Get the overall progress (loading images is most of the work).
+        
+        Returns:
+            int: Progress from 0 to 100
+        """
+        if self.finished:
+            return 100
+        if self.phase == "training":
+            return 90
+        if self.phase == "loading" and self.total_count:
+            return int(90 * self.done_count / self.total_count)
+        return 0
+    
+    def _apply(self, update):
+        """Apply one progress message to the job state."""
+        self.phase = update["phase"]
+        self.message = update["message"]
+        if update["phase"] == "done":
+            self.finished = True
+            self.success = update["success"]
+            self.cancelled = update["cancelled"]
+        else:
+            self.done_count = update["done"]
+            self.total_count = update["total"]
+    
+    def poll(self):
+        """
+        Collect pending progress messages without blocking.
+        
+        Returns:
+            list: Progress messages received since the last poll
+        """
+        updates = []
+        while True:
+            try:
+                update = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            updates.append(update)
+            self._apply(update)
+        
+        # A process that died without reporting (e.g. killed) still ends the job
+        if not self.finished and not self.process.is_alive():
+            try:
+                update = self.progress_queue.get(timeout=0.5)
+                updates.append(update)
+                self._apply(update)
+            except queue.Empty:
+                self._apply({
+                    "phase": "done",
+                    "success": False,
+                    "cancelled": self.cancel_event.is_set(),
+                    "message": f"Training process exited unexpectedly (code {self.process.exitcode})"
+                })
+        
+        return updates
+    
+    def cancel(self):
+        """Ask the training process to stop; the current model is kept."""
+        self.cancel_event.set()
+    
+    def wait(self, timeout=None):
+        """
+        Wait for the training process to finish.
+        
+        Args:
+            timeout (float, optional): Seconds to wait
+        
+        Returns:
+            bool: True if the job finished, False otherwise
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        # Keep draining the queue: a child blocked on a full queue never exits
+        while self.process.is_alive():
+            self.poll()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            self.process.join(0.1)
+        
+        self.poll()
+        return self.finished
+    
+    def terminate(self):
+        """Kill the training process if it is still running."""
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
@@ -0,0 +1,133 @@
+"""
+Recognition Cache Module
+This module provides temporal vote-based recognition results for tracked faces.
+"""
+
+from collections import deque, defaultdict
+
+class RecognitionCache:
+    """
+    A class for accumulating recognition votes per tracked face.
+    
+    Each track collects (id, confidence) votes over a short window. Once one ID
+    wins by enough votes the identity is committed and kept until the track is
+    lost, so callers can skip further predictions for that face. An unknown
+    (-1) win is reported once but not committed: the track keeps voting, so a
+    face first seen blurred or turned away is still recognized later.
+    """
+    
+    def __init__(self, min_votes=3, min_margin=2, window=7):
+        """
+        Initialize the recognition cache.
+        
+        Args:
+            min_votes (int): Votes an ID needs before it can be committed
+            min_margin (int): Votes the winning ID needs over the runner-up
+            window (int): Number of most recent votes considered per track
+        """
+        self.min_votes = max(1, int(min_votes))
+        self.min_margin = max(0, int(min_margin))
+        self.window = max(self.min_votes, int(window))
+        
+        self.votes = {}
+        self.committed = {}
+        
+        # Tracks currently judged unknown (still voting), with their latest result
+        self.unknown = {}
+    
+    def clear(self):
+        """Drop all votes and committed identities."""
+        self.votes = {}
+        self.committed = {}
+        self.unknown = {}
+    
+    def prune(self, active_track_ids):
+        """
+        Forget tracks that are no longer present.
+        
+        Args:
+            active_track_ids: Track IDs present in the current frame
+        """
+        active = set(active_track_ids)
+        for track_id in [t for t in self.votes if t not in active]:
+            del self.votes[track_id]
+        for track_id in [t for t in self.committed if t not in active]:
+            del self.committed[track_id]
+        for track_id in [t for t in self.unknown if t not in active]:
+            del self.unknown[track_id]
+    
+    def get(self, track_id):
+        """
+        Get the committed identity for a track.
+        
+        Args:
+            track_id (int): Track ID
+        
+        Returns:
+            tuple: (id, confidence) if committed, (-1, confidence) if currently judged
+                unknown, otherwise None
+        """
+        result = self.committed.get(track_id)
+        if result is None:
+            result = self.unknown.get(track_id)
+        return result
+    
+    def is_committed(self, track_id):
+        """
+        Check if a track has a committed identity, so it needs no more predictions.
+        
+        Args:
+            track_id (int): Track ID
+        
+        Returns:
+            bool: True if a known identity is committed (unknown tracks keep voting)
+        """
+        return track_id in self.committed
+    
+    def add_vote(self, track_id, face_id, confidence):
+        """
+        Add a recognition vote for a track.
+        
+        Args:
+            track_id (int): Track ID
+            face_id (int): Recognized ID, or -1 for an unknown face
+            confidence (float): Recognition confidence (distance, lower is better)
+        
+        Returns:
+            tuple: (id, confidence) if this vote committed an identity, or first judged
+                the track unknown (-1), otherwise None
+        """
+        if track_id in self.committed:
+            return None
+        
+        votes = self.votes.get(track_id)
+        if votes is None:
+            votes = self.votes[track_id] = deque(maxlen=self.window)
+        votes.append((face_id, confidence))
+        
+        # Tally the votes in the window
+        counts = defaultdict(int)
+        totals = defaultdict(float)
+        for vote_id, vote_confidence in votes:
+            counts[vote_id] += 1
+            totals[vote_id] += vote_confidence
+        
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        best_id, best_count = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        
+        if best_count < self.min_votes or best_count - runner_up < self.min_margin:
+            return None
+        
+        result = (best_id, totals[best_id] / best_count)
+        
+        # Unknown: keep voting, and report it only the first time
+        if best_id == -1:
+            first = track_id not in self.unknown
+            self.unknown[track_id] = result
+            return result if first else None
+        
+        self.committed[track_id] = result
+        self.unknown.pop(track_id, None)
+        del self.votes[track_id]
+        return result
@@ -45,7 +45,7 @@ class MainApp:
         self.config.ensure_directories_exist()
         
         # Initialize database
-        self.db = DatabaseManager()
+        self.db = DatabaseManager(config=self.config)
         
         # Initialize theme manager
         self.theme_manager = ThemeManager()
@@ -11,6 +11,10 @@ import cv2
 import numpy as np
 import shutil
 import tempfile
+import datetime
+import time
+import threading
+from unittest import mock
 
 # Add parent directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,9 +24,17 @@ sys.path.append(parent_dir)
 # Import modules
 from core.data_management.config import ConfigManager
 from core.data_management.database import DatabaseManager
+from core.data_management.attendance_logger import AttendanceLogger
+from core.data_management.storage import migrate_csv_to_sqlite
 from core.face_recognition.face_detector import FaceDetector
 from core.face_recognition.face_recognizer import FaceRecognizer
-from core.face_recognition.model_trainer import ModelTrainer
+from core.face_recognition.model_trainer import ModelTrainer, TrainingJob
+from core.face_recognition.face_tracker import FaceTracker
+from core.face_recognition.recognition_cache import RecognitionCache
+from core.face_recognition.face_preprocessor import preprocess_face
+from core.face_recognition.lbph_engine import LBPHEngine, convert_yaml_model
+from utils.frame_buffer import LatestFrameSlot
+from utils.frame_context import FrameContext
 
 class TestFaceRecognition(unittest.TestCase):
     """Test face recognition functionality."""
@@ -87,6 +99,373 @@ class TestFaceRecognition(unittest.TestCase):
         self.assertIsNotNone(trainer_without_config, "Model trainer without config should not be None")
         self.assertIsNotNone(trainer_without_config.config, 
                             "Model trainer should create config if not provided")
+    
+    def _create_training_images(self, student_ids, count=3):
+        """Write synthetic face images for each student and return them by ID."""
+        rng = np.random.RandomState(1)
+        images = {}
+        for student_id in student_ids:
+            student_dir = os.path.join(self.data_dir, str(student_id))
+            os.makedirs(student_dir, exist_ok=True)
+            base = rng.randint(0, 256, (120, 120, 3), dtype=np.uint8)
+            images[student_id] = base
+            for i in range(count):
+                cv2.imwrite(os.path.join(student_dir, f"{i}.png"), base)
+        return images
+    
+    def test_training_and_recognition_share_preprocessing(self):
+        """Test that a frame crop and a face image preprocess identically and are recognized."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        images = self._create_training_images([1001, 1002])
+        
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        success, message = trainer.train_model(self.data_dir)
+        self.assertTrue(success, message)
+        
+        # Place a face in a larger frame and recognize it from the grayscale frame plus box
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        frame[50:170, 60:180] = images[1002]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        box = (60, 50, 120, 120)
+        
+        self.assertTrue(np.array_equal(preprocess_face(gray, box), preprocess_face(images[1002])),
+                        "Gray frame crop and BGR face should preprocess identically")
+        
+        student_id, confidence = self.face_recognizer.recognize_face(gray, box)
+        self.assertEqual(student_id, 1002, "Should recognize the trained student")
+    
+    def test_batched_recognition_matches_single(self):
+        """Test that batched recognition returns the same results as per-face recognition."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        images = self._create_training_images([1001, 1002, 1003])
+        
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        success, message = trainer.train_model(self.data_dir)
+        self.assertTrue(success, message)
+        
+        # Place every face side by side in one frame
+        frame = np.zeros((120, 360, 3), dtype=np.uint8)
+        boxes = []
+        for i, student_id in enumerate([1001, 1002, 1003]):
+            frame[:, i * 120:(i + 1) * 120] = images[student_id]
+            boxes.append((i * 120, 0, 120, 120))
+        
+        ids, confidences = self.face_recognizer.recognize_faces(frame, boxes)
+        self.assertEqual(list(ids), [1001, 1002, 1003], "Batch should recognize every face")
+        
+        for i, box in enumerate(boxes):
+            student_id, confidence = self.face_recognizer.recognize_face(frame, box)
+            self.assertEqual(ids[i], student_id, "Batch and single IDs should match")
+            self.assertAlmostEqual(confidences[i], confidence, places=6)
+        
+        self.face_recognizer.shutdown()
+    
+    def test_numpy_engine_matches_opencv_model(self):
+        """Test that the NumPy LBPH engine loads the OpenCV model and predicts the same."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        images = self._create_training_images([1001, 1002, 1003])
+        
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        success, message = trainer.train_model(self.data_dir)
+        self.assertTrue(success, message)
+        
+        # Load the saved OpenCV model with the NumPy backend
+        self.config.set_value('FaceRecognition', 'Backend', 'numpy')
+        try:
+            engine_recognizer = FaceRecognizer(self.model_path, self.config)
+        finally:
+            self.config.set_value('FaceRecognition', 'Backend', 'opencv')
+        self.assertIsInstance(engine_recognizer.recognizer, LBPHEngine)
+        self.assertTrue(engine_recognizer.is_model_loaded(), "Engine should import the YAML model")
+        
+        frame = np.zeros((120, 360, 3), dtype=np.uint8)
+        boxes = []
+        for i, student_id in enumerate([1001, 1002, 1003]):
+            frame[:, i * 120:(i + 1) * 120] = images[student_id]
+            boxes.append((i * 120, 0, 120, 120))
+        
+        # Use a noisy copy so distances are non-zero
+        rng = np.random.RandomState(2)
+        noisy = np.clip(frame.astype(np.int32) + rng.randint(-20, 21, frame.shape), 0, 255).astype(np.uint8)
+        
+        expected_ids, expected_confidences = self.face_recognizer.recognize_faces(noisy, boxes)
+        ids, confidences = engine_recognizer.recognize_faces(noisy, boxes)
+        self.assertEqual(list(ids), list(expected_ids), "Engine and OpenCV IDs should match")
+        self.assertTrue(np.allclose(confidences, expected_confidences, rtol=1e-5), "Distances should match")
+        
+        matches = engine_recognizer.get_top_matches(noisy, boxes[:1], k=2)
+        self.assertEqual(len(matches[0]), 2, "Should return two distinct students")
+        self.assertEqual(matches[0][0][0], 1001, "Closest match should come first")
+    
+    def test_binary_model_is_memory_mapped(self):
+        """Test that the binary model converts from YAML and loads as a memory map."""
+        images = self._create_training_images([1001, 1002])
+        faces = np.array([preprocess_face(images[1001]), preprocess_face(images[1002])])
+        
+        engine = LBPHEngine()
+        engine.train(faces, [1001, 1002])
+        yaml_path = os.path.join(self.test_dir, "engine_model.yml")
+        engine.write(yaml_path)
+        
+        # Convert the YAML model and map the binary file
+        binary_path = convert_yaml_model(yaml_path)
+        self.assertTrue(binary_path.endswith(".lbph"), "Converter should default to a .lbph file")
+        
+        mapped = LBPHEngine()
+        mapped.load(binary_path)
+        self.assertIsInstance(mapped.gallery, np.memmap, "Gallery should be memory-mapped")
+        self.assertEqual(list(mapped.labels), list(engine.labels), "Labels should round-trip")
+        self.assertTrue(np.allclose(mapped.gallery, engine.gallery), "Gallery should round-trip")
+        self.assertEqual(mapped.predict(faces[1])[0], 1002, "Mapped model should predict")
+        
+        # The NumPy backend prefers the binary model next to the YAML path
+        self.config.set_value('FaceRecognition', 'Backend', 'numpy')
+        try:
+            recognizer = FaceRecognizer(yaml_path, self.config)
+        finally:
+            self.config.set_value('FaceRecognition', 'Backend', 'opencv')
+        self.assertTrue(recognizer.is_model_loaded(), "Binary model should load")
+        self.assertIsInstance(recognizer.recognizer.gallery, np.memmap, "Recognizer should map the binary model")
+    
+    def test_incremental_enrollment_writes_delta(self):
+        """Test that enrolling and removing a student updates the model without a full save."""
+        self.config.set_value('FaceRecognition', 'Backend', 'numpy')
+        try:
+            recognizer = FaceRecognizer(self.model_path, self.config)
+            images = self._create_training_images([1001, 1002, 1003, 1004], count=6)
+            held_dir = os.path.join(self.test_dir, "held")
+            os.rename(os.path.join(self.data_dir, "1003"), held_dir)
+            
+            trainer = ModelTrainer(recognizer, self.config)
+            success, message = trainer.train_model(self.data_dir)
+            self.assertTrue(success, message)
+            base_signature = LBPHEngine._base_signature(recognizer.binary_model_path)
+            
+            # Enroll one more student incrementally (two images keep the delta small)
+            os.rename(held_dir, os.path.join(self.data_dir, "1003"))
+            for i in range(2, 6):
+                os.remove(os.path.join(self.data_dir, "1003", f"{i}.png"))
+            success, message = trainer.train_student(1003, self.data_dir)
+            self.assertTrue(success, message)
+            self.assertEqual(LBPHEngine._base_signature(recognizer.binary_model_path), base_signature,
+                             "Base model should not be rewritten")
+            self.assertTrue(os.path.exists(recognizer.binary_model_path + ".delta"), "Delta journal should exist")
+            
+            success, message = trainer.remove_student(1001, self.data_dir)
+            self.assertTrue(success, message)
+            
+            # A fresh recognizer replays the journal
+            reloaded = FaceRecognizer(self.model_path, self.config)
+        finally:
+            self.config.set_value('FaceRecognition', 'Backend', 'opencv')
+        
+        self.assertEqual(sorted(set(reloaded.recognizer.labels.tolist())), [1002, 1003, 1004])
+        self.assertEqual(reloaded.recognize_face(images[1003])[0], 1003, "New student should be recognized")
+        
+        # The removal survives a full retrain: the images were moved out of the data directory
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, "1001")))
+        success, message = ModelTrainer(reloaded, self.config).train_model(self.data_dir)
+        self.assertTrue(success, message)
+        self.assertEqual(sorted(set(reloaded.recognizer.labels.tolist())), [1002, 1003, 1004])
+    
+    def test_training_cache_decodes_only_changed_images(self):
+        """Test that retraining reuses cached faces and decodes only changed images."""
+        images = self._create_training_images([1001, 1002])
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        samples = trainer._collect_samples(self.data_dir, ["1001", "1002"])
+        
+        first_faces, first_ids = trainer._load_faces(samples)
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, "1001", "faces_cache.npz")))
+        
+        # Nothing changed: no image is decoded
+        with mock.patch.object(cv2, "imread", wraps=cv2.imread) as imread:
+            cached_faces, cached_ids = trainer._load_faces(samples)
+        self.assertEqual(imread.call_count, 0, "Unchanged images should come from the cache")
+        self.assertTrue(np.array_equal(cached_faces, first_faces))
+        self.assertEqual(list(cached_ids), list(first_ids))
+        
+        # Replace one image: only that one is decoded
+        changed_path = os.path.join(self.data_dir, "1002", "0.png")
+        cv2.imwrite(changed_path, images[1001])
+        os.utime(changed_path, ns=(0, os.stat(changed_path).st_mtime_ns + 1000000))
+        with mock.patch.object(cv2, "imread", wraps=cv2.imread) as imread:
+            faces, ids = trainer._load_faces(samples)
+        self.assertEqual(imread.call_count, 1, "Only the changed image should be decoded")
+        expected = preprocess_face(cv2.imread(changed_path, cv2.IMREAD_GRAYSCALE))
+        self.assertTrue(any(np.array_equal(face, expected) for face in faces[ids == 1002]),
+                        "Changed image should be re-decoded")
+    
+    def test_parallel_loading_matches_serial(self):
+        """Test that parallel image loading stacks the same faces and reports bad images."""
+        self._create_training_images([1001, 1002, 1003, 1004])
+        bad_path = os.path.join(self.data_dir, "1002", "broken.jpg")
+        with open(bad_path, "wb") as f:
+            f.write(b"not an image")
+        
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        samples = trainer._collect_samples(self.data_dir, ["1001", "1002", "1003", "1004"])
+        
+        results = {}
+        for workers in ["1", "4"]:
+            self.config.set_value('FaceRecognition', 'TrainingWorkers', workers)
+            # Drop the caches so every image is decoded again
+            for student_id in ["1001", "1002", "1003", "1004"]:
+                cache_path = os.path.join(self.data_dir, student_id, "faces_cache.npz")
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+            with self.assertLogs("AttendanceSystem", level="WARNING") as logs:
+                results[workers] = trainer._load_faces(samples)
+            self.assertIn(f"Failed to read image: {bad_path}", "\n".join(logs.output))
+        self.config.set_value('FaceRecognition', 'TrainingWorkers', '0')
+        
+        serial_faces, serial_ids = results["1"]
+        parallel_faces, parallel_ids = results["4"]
+        self.assertEqual(len(serial_ids), 12, "Broken image should be skipped")
+        self.assertEqual(list(parallel_ids), list(serial_ids), "Parallel IDs should keep sample order")
+        self.assertTrue(np.array_equal(parallel_faces, serial_faces), "Parallel faces should match")
+    
+    def test_training_job_swaps_model_into_place(self):
+        """Test that a background training job reports progress and replaces the model file."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        self._create_training_images([1001, 1002])
+        
+        job = TrainingJob(self.config.config_file, self.data_dir, self.model_path).start()
+        self.assertTrue(job.wait(60), "Training job should finish")
+        self.assertTrue(job.success, job.message)
+        self.assertEqual(job.percent, 100)
+        self.assertEqual(job.total_count, 6, "Progress should count every image")
+        self.assertTrue(os.path.exists(self.model_path), "Model should be moved into place")
+        self.assertFalse(any(".training" in name for name in os.listdir(self.test_dir)),
+                         "No temporary model should remain")
+        
+        self.assertTrue(self.face_recognizer.reload_model(), "Recognizer should load the new model")
+    
+    def test_cancelled_training_job_keeps_model(self):
+        """Test that a cancelled training job leaves no model behind."""
+        self._create_training_images([1001, 1002])
+        
+        job = TrainingJob(self.config.config_file, self.data_dir, self.model_path)
+        job.cancel()
+        job.start()
+        self.assertTrue(job.wait(60), "Training job should finish")
+        self.assertFalse(job.success)
+        self.assertTrue(job.cancelled, job.message)
+        self.assertFalse(os.path.exists(self.model_path), "Cancelled job should not write a model")
+    
+    def test_model_hot_reload(self):
+        """Test that a recognizer picks up a model retrained by another process."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        images = self._create_training_images([1001, 1002, 1003])
+        faces = {student_id: preprocess_face(image) for student_id, image in images.items()}
+        
+        self.assertTrue(self.face_recognizer.train([faces[1001], faces[1002]], [1001, 1002]))
+        version = self.face_recognizer.model_version
+        self.assertFalse(self.face_recognizer.model_changed(), "Own saves should not trigger a reload")
+        
+        # Another recognizer (e.g. the admin's training job) writes a new model
+        trainer_recognizer = FaceRecognizer(self.model_path, self.config)
+        self.assertTrue(trainer_recognizer.train([faces[1001], faces[1003]], [1001, 1003]))
+        
+        self.assertTrue(self.face_recognizer.model_changed(), "New model file should be detected")
+        self.assertTrue(self.face_recognizer.check_for_update(), "Reload should start")
+        self.face_recognizer._reload_thread.join(10)
+        
+        self.assertEqual(self.face_recognizer.model_version, version + 1, "Version should advance")
+        self.assertEqual(self.face_recognizer.recognize_face(images[1003])[0], 1003, "New model should be active")
+        self.assertFalse(self.face_recognizer.check_for_update(), "Unchanged files should not reload")
+    
+    def test_roster_scoped_recognition(self):
+        """Test that the subject set on the attendance logger restricts matching to its roster."""
+        if not self.face_recognizer.is_face_module_available():
+            self.skipTest("OpenCV face module not available")
+        
+        images = self._create_training_images([1001, 1002, 1003])
+        
+        trainer = ModelTrainer(self.face_recognizer, self.config)
+        success, message = trainer.train_model(self.data_dir)
+        self.assertTrue(success, message)
+        self.assertEqual(self.face_recognizer.recognize_face(images[1003])[0], 1003)
+        full_distance = self.face_recognizer.recognize_face(images[1002])[1]
+        
+        db = DatabaseManager(os.path.join(self.test_dir, "db"))
+        self.assertTrue(db.set_subject_roster("Math", ["1001", "1002"]))
+        logger = AttendanceLogger(db, self.config, self.face_recognizer)
+        self.assertTrue(logger.set_subject("Math"))
+        
+        self.assertNotEqual(self.face_recognizer.recognize_face(images[1003])[0], 1003,
+                            "Students outside the roster should not match")
+        student_id, distance = self.face_recognizer.recognize_face(images[1002])
+        self.assertEqual(student_id, 1002, "Roster students should still match")
+        self.assertAlmostEqual(distance, full_distance, places=3, msg="Roster index should keep distances")
+        
+        # A subject without a roster matches every student
+        self.assertTrue(logger.set_subject("Art"))
+        self.assertEqual(self.face_recognizer.recognize_face(images[1003])[0], 1003)
+    
+    def test_face_tracker_follows_moving_face(self):
+        """Test that the tracker carries a face forward with a stable ID."""
+        rng = np.random.RandomState(0)
+        frame = cv2.GaussianBlur(rng.randint(0, 256, (240, 320), dtype=np.uint8), (5, 5), 0)
+        
+        tracker = FaceTracker()
+        faces, track_ids = tracker.update(frame, [(100, 80, 60, 60)])
+        self.assertEqual(len(faces), 1, "Detection should start one track")
+        
+        # Shift the whole frame and track the face into it
+        moved = np.roll(frame, (6, 4), axis=(0, 1))
+        moved_faces, moved_ids = tracker.track(moved)
+        self.assertEqual(moved_ids, track_ids, "Track ID should be stable")
+        self.assertLessEqual(abs(moved_faces[0][0] - 104), 2, "Tracked x should follow the face")
+        self.assertLessEqual(abs(moved_faces[0][1] - 86), 2, "Tracked y should follow the face")
+        self.assertFalse(tracker.lost, "Track should not be lost")
+    
+    def test_recognition_cache_commits_after_votes(self):
+        """Test that an identity is committed only after enough agreeing votes."""
+        cache = RecognitionCache(min_votes=3, min_margin=2)
+        
+        self.assertIsNone(cache.add_vote(1, 1001, 40.0))
+        self.assertIsNone(cache.add_vote(1, 2002, 45.0), "A single misrecognition should not commit")
+        self.assertIsNone(cache.add_vote(1, 1001, 42.0), "Two votes are below min_votes")
+        self.assertEqual(cache.add_vote(1, 1001, 44.0), (1001, 42.0))
+        self.assertEqual(cache.get(1), (1001, 42.0))
+        
+        # Enough votes but too small a margin over the runner-up
+        for face_id in (2002, 2002, 1001, 1001):
+            self.assertIsNone(cache.add_vote(2, face_id, 40.0))
+        self.assertIsNone(cache.add_vote(2, 1001, 40.0), "Margin over the runner-up is required")
+        self.assertEqual(cache.add_vote(2, 1001, 40.0), (1001, 40.0))
+        
+        # Losing the track forgets the identity
+        cache.prune([])
+        self.assertIsNone(cache.get(1))
+    
+    def test_recognition_cache_unknown_keeps_voting(self):
+        """Test that an unknown face is reported once and can still be recognized later."""
+        cache = RecognitionCache(min_votes=3, min_margin=2, window=7)
+        
+        self.assertIsNone(cache.add_vote(1, -1, 100.0))
+        self.assertIsNone(cache.add_vote(1, -1, 100.0))
+        self.assertEqual(cache.add_vote(1, -1, 100.0), (-1, 100.0), "Unknown should be reported")
+        self.assertEqual(cache.get(1), (-1, 100.0))
+        self.assertFalse(cache.is_committed(1), "Unknown faces keep being predicted")
+        self.assertIsNone(cache.add_vote(1, -1, 100.0), "Unknown should be reported only once")
+        
+        # The face turns toward the camera: known votes take over the window
+        results = [cache.add_vote(1, 1001, 40.0) for _ in range(5)]
+        self.assertEqual(results[:-1], [None] * 4)
+        self.assertEqual(results[-1], (1001, 40.0))
+        self.assertTrue(cache.is_committed(1))
+        self.assertEqual(cache.get(1), (1001, 40.0))
 
 class TestDatabaseManager(unittest.TestCase):
     """Test database manager functionality."""
@@ -104,7 +483,8 @@ class TestDatabaseManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment."""
-        # Remove temporary directory
+        # Close pooled files, then remove temporary directory
+        self.db.close()
         shutil.rmtree(self.test_dir)
     
     def test_database_initialization(self):
@@ -136,6 +516,568 @@ class TestDatabaseManager(unittest.TestCase):
         # Convert ID to string for comparison to ensure consistent type
         self.assertEqual(str(students.iloc[0]["ID"]), "1001", "Student ID should match")
         self.assertEqual(students.iloc[0]["Name"], "Test Student", "Student name should match")
+    
+    def test_roster_index_tracks_file_changes(self):
+        """Test that the roster index picks up changes made by another writer."""
+        self.assertTrue(self.db.add_student("1001", "Test Student"))
+        self.assertTrue(self.db.student_exists("1001"))
+        
+        # Add a student through a second manager sharing the same files
+        other_db = DatabaseManager(self.db_path)
+        self.assertTrue(other_db.add_student("1002", "Other Student"))
+        
+        self.assertEqual(self.db.get_student_name("1002"), "Other Student",
+                        "Roster index should reload after the file changes")
+        self.assertIsNone(self.db.get_student_name("9999"), "Unknown student should have no name")
+    
+    def test_lookups_reuse_connection_check(self):
+        """Test that roster lookups don't repeat the connection check's file system calls."""
+        self.assertTrue(self.db.add_student("1001", "Test Student"))
+        self.assertTrue(self.db.is_connected())
+        
+        with mock.patch.object(os, "stat", wraps=os.stat) as stat, \
+                mock.patch.object(os, "access", wraps=os.access) as access:
+            self.assertTrue(self.db.student_exists("1001"))
+            self.assertEqual(self.db.get_student_name("1001"), "Test Student")
+            
+            # Only the roster signature is checked, once per lookup
+            self.assertEqual(stat.call_count, 2)
+            access.assert_not_called()
+        
+        # A failed check isn't cached
+        self.db._connected = False
+        with mock.patch.object(os, "access", wraps=os.access) as access:
+            self.assertTrue(self.db.is_connected())
+            access.assert_called()
+    
+    def test_repeat_attendance_is_deduplicated(self):
+        """Test that repeat marks within the re-mark window don't append rows."""
+        self.assertTrue(self.db.add_student("1001", "Test Student"))
+        
+        self.assertFalse(self.db.is_attendance_marked("1001", "Math"))
+        for _ in range(5):
+            self.assertTrue(self.db.mark_attendance("1001", "Math", remark_window=0))
+        self.assertTrue(self.db.is_attendance_marked("1001", "Math"))
+        self.assertEqual(len(self.db.get_attendance("Math")), 1, "Only one record should be written")
+        
+        # A fresh manager rebuilds the set from today's file
+        other_db = DatabaseManager(self.db_path)
+        self.assertTrue(other_db.is_attendance_marked("1001", "Math"))
+    
+    def test_subject_rosters(self):
+        """Test that subject rosters are saved and shared between managers."""
+        self.assertIsNone(self.db.get_subject_roster("Math"), "Subjects have no roster by default")
+        
+        self.assertTrue(self.db.set_subject_roster("Math", ["1001", "1002", "1001"]))
+        self.assertEqual(self.db.get_subject_roster("Math"), ["1001", "1002"], "Duplicates should be dropped")
+        
+        other_db = DatabaseManager(self.db_path)
+        self.assertEqual(other_db.get_subject_roster("Math"), ["1001", "1002"])
+        
+        self.assertTrue(self.db.set_subject_roster("Math", None))
+        self.assertIsNone(other_db.get_subject_roster("Math"), "Removed roster should be picked up")
+    
+    def test_subject_switch_applies_roster(self):
+        """Test that switching subject re-scopes the recognizer and bumps the roster version."""
+        self.assertTrue(self.db.set_subject_roster("Math", ["1001"]))
+        
+        config = mock.Mock()
+        config.get_value.side_effect = lambda section, key, fallback=None: fallback
+        recognizer = mock.Mock()
+        logger = AttendanceLogger(self.db, config, face_recognizer=recognizer)
+        
+        self.assertTrue(logger.set_subject("Math"))
+        recognizer.set_roster.assert_called_with("Math", ["1001"])
+        version = logger.roster_version
+        
+        # Re-applying the same subject changes nothing
+        self.assertTrue(logger.set_subject("Math"))
+        self.assertEqual(logger.roster_version, version)
+        
+        # A new subject, or an edited roster, is applied and bumps the version
+        self.assertTrue(logger.set_subject("Art"))
+        recognizer.set_roster.assert_called_with("Art", None)
+        self.assertEqual(logger.roster_version, version + 1)
+        
+        self.assertTrue(self.db.set_subject_roster("Art", ["1002"]))
+        self.assertTrue(logger.set_subject("Art"))
+        recognizer.set_roster.assert_called_with("Art", ["1002"])
+        self.assertEqual(logger.roster_version, version + 2)
+    
+    def test_attendance_range_projection(self):
+        """Test that range queries read day files in date order and load only the requested columns."""
+        subject_dir = os.path.join(self.db_path, "attendance", "Math")
+        os.makedirs(subject_dir, exist_ok=True)
+        for day in range(12, 0, -1):
+            with open(os.path.join(subject_dir, f"2024-01-{day:02d}.csv"), "w") as f:
+                f.write("ID,Name,Time,Status\n")
+                f.write(f"0{day},Student {day},09:00:00,Present\n")
+        
+        records = self.db.get_attendance_range("Math", "2024-01-03", "2024-01-10")
+        self.assertEqual(list(records.columns), ['ID', 'Name', 'Date', 'Time', 'Status'])
+        self.assertEqual(list(records["Date"]), [f"2024-01-{day:02d}" for day in range(3, 11)])
+        self.assertEqual(records["ID"].iloc[0], "03", "IDs should be read as text")
+        
+        projected = self.db.get_attendance_range("Math", columns=["ID", "Date"])
+        self.assertEqual(list(projected.columns), ["ID", "Date"])
+        self.assertEqual(len(projected), 12)
+    
+    def test_range_reads_share_one_pool(self):
+        """Test that concurrent range reads share one thread pool and reads after close run serially."""
+        subject_dir = os.path.join(self.db_path, "attendance", "Math")
+        os.makedirs(subject_dir, exist_ok=True)
+        for day in range(1, 6):
+            with open(os.path.join(subject_dir, f"2024-01-{day:02d}.csv"), "w") as f:
+                f.write("ID,Name,Time,Status\n")
+                f.write(f"0{day},Student {day},09:00:00,Present\n")
+        
+        storage = self.db.storage
+        storage.max_workers = 2
+        executors = []
+        results = []
+        
+        def read():
+            results.append(len(storage.read_attendance_range("Math")))
+            executors.append(storage.executor)
+        
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [5] * 4)
+        self.assertEqual(len({id(executor) for executor in executors}), 1, "Readers should share one pool")
+        
+        storage.close()
+        self.assertEqual(len(storage.read_attendance_range("Math")), 5)
+        self.assertIsNone(storage.executor, "A closed storage should not start a new pool")
+    
+    def test_attendance_summary_matrix(self):
+        """Test the student x date presence matrix with totals."""
+        self.assertTrue(self.db.add_student("1001", "First Student"))
+        self.assertTrue(self.db.add_student("1002", "Second Student"))
+        
+        subject_dir = os.path.join(self.db_path, "attendance", "Math")
+        os.makedirs(subject_dir, exist_ok=True)
+        days = {
+            "2024-01-01": "1001,First Student,09:00:00,Present\n1001,First Student,10:00:00,Present\n",
+            "2024-01-02": "1002,Second Student,09:00:00,Present\n9999,Visitor,09:00:00,Present\n",
+            "2024-01-03": "1002,Second Student,09:00:00,Absent\n",
+            "2024-01-04": "",
+        }
+        for date, rows in days.items():
+            with open(os.path.join(subject_dir, f"{date}.csv"), "w") as f:
+                f.write("ID,Name,Time,Status\n" + rows)
+        
+        summary = self.db.get_attendance_summary("Math")
+        self.assertEqual(list(summary.index), ["1001", "1002"], "Only roster students should be listed")
+        self.assertEqual(list(summary.columns), ["Name"] + list(days) + ["Total", "Percentage"])
+        self.assertEqual(list(summary["Name"]), ["First Student", "Second Student"])
+        self.assertEqual(list(summary.loc["1001", list(days)]), ["Present", "Absent", "Absent", "Absent"])
+        self.assertEqual(list(summary.loc["1002", list(days)]), ["Absent", "Present", "Absent", "Absent"])
+        self.assertEqual(list(summary["Total"]), [1, 1])
+        self.assertEqual(list(summary["Percentage"]), [25.0, 25.0])
+        
+        output_file = os.path.join(self.test_dir, "reports", "math.csv")
+        self.assertTrue(self.db.export_attendance("Math", output_file))
+        self.assertTrue(os.path.exists(output_file))
+    
+    def test_presence_index(self):
+        """Test presence index queries, in-place updates and refresh from changed files."""
+        for student_id in ("1001", "1002", "1003"):
+            self.assertTrue(self.db.add_student(student_id, f"Student {student_id}"))
+        
+        subject_dir = os.path.join(self.db_path, "attendance", "Math")
+        os.makedirs(subject_dir, exist_ok=True)
+        days = {
+            "2024-01-02": ["1001", "1002"],
+            "2024-01-03": ["1001"],
+            "2024-01-04": ["1001", "1003"],
+        }
+        for date, student_ids in days.items():
+            with open(os.path.join(subject_dir, f"{date}.csv"), "w") as f:
+                f.write("ID,Name,Time,Status\n")
+                for student_id in student_ids:
+                    f.write(f"{student_id},Student {student_id},09:00:00,Present\n")
+        
+        index = self.db.get_presence_index("Math")
+        self.assertEqual(index.counts().to_dict(), {"1001": 3, "1002": 1, "1003": 1})
+        self.assertEqual(index.counts("2024-01-03", "2024-01-04").to_dict(), {"1001": 2, "1002": 0, "1003": 1})
+        self.assertEqual(index.percentages(student_ids=["1002"]).iloc[0], 33.33)
+        self.assertEqual(index.absentees("2024-01-03"), ["1002", "1003"])
+        self.assertEqual(index.day_counts().tolist(), [2, 1, 2])
+        streaks = index.streaks()
+        self.assertEqual(streaks.loc["1001"].tolist(), [3, 3])
+        self.assertEqual(streaks.loc["1002"].tolist(), [0, 1])
+        self.assertEqual(streaks.loc["1003"].tolist(), [1, 1])
+        
+        # Marking attendance updates the loaded index without re-reading files
+        self.assertTrue(self.db.mark_attendance("1002", "Math"))
+        self.assertEqual(index.counts(student_ids=["1002"]).iloc[0], 2)
+        self.db.close()
+        
+        # A day written by someone else (here an earlier one) is picked up by the persisted index
+        with open(os.path.join(subject_dir, "2024-01-01.csv"), "w") as f:
+            f.write("ID,Name,Time,Status\n1003,Student 1003,09:00:00,Present\n")
+        
+        other_db = DatabaseManager(self.db_path)
+        self.assertTrue(os.path.exists(other_db._presence_index_path("Math")), "Index should be saved")
+        other_index = other_db.get_presence_index("Math")
+        self.assertEqual(other_index.dates[:4], ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"])
+        self.assertEqual(other_index.counts().to_dict(), {"1001": 3, "1002": 2, "1003": 2})
+    
+    def test_add_students_bulk(self):
+        """Test bulk student import and its per-row report."""
+        self.db.add_student("4000", "Existing Student")
+        
+        report = self.db.add_students_bulk([
+            ("4001", "Ada Lovelace"),
+            ("4000", "Existing Again"),
+            ("40", "Short Id"),
+            ("4002", "R2D2"),
+            ("4001", "Ada Twice"),
+            (" 4003 ", " Grace Hopper "),
+        ])
+        
+        self.assertEqual(list(report["Result"]), [
+            "Added", "Already registered", "Invalid ID", "Invalid name", "Duplicate in import", "Added"
+        ])
+        self.assertEqual(list(report["Row"]), [1, 2, 3, 4, 5, 6])
+        
+        # Added students are on the roster, including after a reload
+        self.db.invalidate_roster()
+        self.assertEqual(self.db.get_student_name("4003"), "Grace Hopper")
+        self.assertEqual(self.db.get_student_name("4000"), "Existing Student")
+        self.assertFalse(self.db.student_exists("4002"))
+        self.assertEqual(len(self.db.get_all_students()), 3)
+    
+    def test_mark_attendance_many(self):
+        """Test marking a batch of attendance records grouped by file."""
+        for i in range(3):
+            self.db.add_student(f"{5000 + i}", f"Batch Student {i}")
+        
+        yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+        records = [
+            ("5000", "Physics", "Present"),
+            ("5001", "Physics", "Late"),
+            ("5000", "Physics", "Present"),
+            ("5002", "Biology", "Present"),
+            ("9999", "Physics", "Present"),
+            ("5002", "Physics", "Present", yesterday),
+        ]
+        
+        with mock.patch.object(self.db.storage, "append_attendance",
+                               wraps=self.db.storage.append_attendance) as append:
+            # The repeat is skipped by the once-per-day window; the unknown ID fails
+            self.assertEqual(self.db.mark_attendance_many(records, remark_window=0), 5)
+            self.assertEqual(append.call_count, 3)
+        
+        physics = self.db.get_attendance("Physics")
+        self.assertEqual(list(physics["ID"].astype(str)), ["5000", "5001"])
+        self.assertEqual(list(physics["Status"]), ["Present", "Late"])
+        self.assertEqual(list(physics["Name"]), ["Batch Student 0", "Batch Student 1"])
+        self.assertEqual(len(self.db.get_attendance("Biology")), 1)
+        self.assertEqual(len(self.db.get_attendance("Physics", yesterday.strftime("%Y-%m-%d"))), 1)
+    
+    def test_appender_pool(self):
+        """Test pooled attendance file handles, rollover and eviction."""
+        self.db.add_student("6000", "Pool Student")
+        self.db.add_student("6001", "Pool Student Two")
+        pool = self.db.storage.appenders
+        today = datetime.datetime.now()
+        tomorrow = today + datetime.timedelta(days=1)
+        
+        # The second append reuses the open file: no directory or header checks
+        self.assertTrue(self.db.mark_attendance("6000", "History"))
+        with mock.patch.object(os, "makedirs", wraps=os.makedirs) as makedirs:
+            self.assertTrue(self.db.mark_attendance("6001", "History"))
+            makedirs.assert_not_called()
+        self.assertEqual(len(pool), 1)
+        
+        # Appends are visible to readers right away, with a single header
+        self.assertEqual(len(self.db.get_attendance("History")), 2)
+        
+        # A new day closes the subject's previous day
+        self.assertEqual(self.db.mark_attendance_many([("6000", "History", "Present", tomorrow)]), 1)
+        self.assertEqual(list(pool._handles), [("History", tomorrow.strftime("%Y-%m-%d"))])
+        
+        # The least recently used file is closed beyond max_open
+        pool.max_open = 2
+        self.db.mark_attendance("6000", "Art")
+        self.db.mark_attendance("6000", "Music")
+        self.assertEqual([subject for subject, _ in pool._handles], ["Art", "Music"])
+        
+        # Reopening an existing file appends without a second header
+        self.db.mark_attendance("6000", "History")
+        with open(os.path.join(self.db.attendance_dir, "History", f"{today.strftime('%Y-%m-%d')}.csv")) as f:
+            self.assertEqual(f.read().count("ID,Name,Time,Status"), 1)
+        self.assertEqual(len(self.db.get_attendance("History")), 3)
+    
+    def test_student_history(self):
+        """Test the per-student history index across subjects."""
+        self.db.add_student("7000", "History Student")
+        self.db.add_student("7001", "Other Student")
+        day = lambda d: datetime.datetime(2026, 9, d, 9, 0, 0)
+        self.db.mark_attendance_many([
+            ("7000", "Maths", "Present", day(1)),
+            ("7001", "Maths", "Present", day(1)),
+            ("7000", "Physics", "Late", day(2)),
+            ("7000", "Maths", "Present", day(3)),
+        ])
+        
+        history = self.db.get_student_history("7000", "2026-09-02", "2026-09-30")
+        self.assertEqual(list(history.columns), ["Subject", "Date", "Time", "Status"])
+        self.assertEqual(list(zip(history["Subject"], history["Date"], history["Status"])), [
+            ("Physics", "2026-09-02", "Late"), ("Maths", "2026-09-03", "Present")
+        ])
+        
+        # Writes update the loaded index without re-reading records
+        with mock.patch.object(self.db.storage, "read_attendance_range") as read_range:
+            self.db.mark_attendance_many([("7001", "Physics", "Present", day(4))])
+            self.assertEqual(len(self.db.get_student_history("7001")), 2)
+            read_range.assert_not_called()
+        
+        # A persisted index picks up days changed behind its back
+        self.db.close()
+        with open(os.path.join(self.db.attendance_dir, "Maths", "2026-09-05.csv"), "w") as f:
+            f.write("ID,Name,Time,Status\n7000,History Student,10:00:00,Present\n")
+        db = DatabaseManager(self.db_path)
+        self.assertEqual(list(db.get_student_history("7000")["Date"]),
+                         ["2026-09-01", "2026-09-02", "2026-09-03", "2026-09-05"])
+        
+        # Rebuilding from the stored records gives the same index
+        self.assertEqual(len(db.rebuild_history_index()), 6)
+        self.assertTrue(db.get_student_history("9999").empty)
+        db.close()
+    
+    def test_attendance_writer_latency_flush(self):
+        """Test that a lone queued record is written after the latency without a flush."""
+        self.db.add_student("3100", "Latency Student")
+        
+        config = mock.Mock()
+        config.get_value.side_effect = lambda section, key, fallback=None: fallback
+        logger = AttendanceLogger(self.db, config)
+        logger.write_latency = 0.2
+        self.assertTrue(logger.set_subject("Geography"))
+        self.assertTrue(logger.start_continuous_logging())
+        
+        try:
+            # Let the writer go idle on the empty queue first, as it does in the scanner
+            time.sleep(0.1)
+            self.assertTrue(logger.log_attendance("3100"))
+            
+            # Poll the stored records; the batch of 64 is never reached
+            deadline = time.monotonic() + 3
+            while self.db.get_attendance("Geography").empty and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(len(self.db.get_attendance("Geography")), 1)
+            self.assertEqual(logger.writer.flush_count, 1)
+        finally:
+            logger.stop_continuous_logging()
+    
+    def test_attendance_writer_failed_write_backoff(self):
+        """Test that failed writes are retried with a backoff and a subject switch doesn't block."""
+        self.db.add_student("3200", "Outage Student")
+        
+        config = mock.Mock()
+        config.get_value.side_effect = lambda section, key, fallback=None: fallback
+        logger = AttendanceLogger(self.db, config)
+        logger.write_batch_size = 1
+        logger.write_latency = 0.05
+        self.assertTrue(logger.set_subject("Geography"))
+        self.assertTrue(logger.start_continuous_logging())
+        
+        try:
+            with mock.patch.object(self.db, "write_attendance", side_effect=OSError("disk full")) as write:
+                self.assertTrue(logger.log_attendance("3200"))
+                time.sleep(0.6)
+                
+                # A full batch that keeps failing waits 0.1, 0.2, 0.4 s between attempts
+                self.assertGreaterEqual(write.call_count, 1)
+                self.assertLessEqual(write.call_count, 6, "Failed writes should back off")
+                
+                # Switching subject waits a bounded time and keeps the queued record's mark
+                started = time.monotonic()
+                self.assertTrue(logger.set_subject("History"))
+                self.assertTrue(logger.set_subject("Geography"))
+                self.assertLess(time.monotonic() - started, 2, "Subject switch should not block on the outage")
+                self.assertTrue(logger.is_marked("3200"))
+            
+            # Once the storage recovers the record is written
+            self.assertTrue(logger.flush(timeout=10))
+            self.assertEqual(len(self.db.get_attendance("Geography")), 1)
+        finally:
+            logger.stop_continuous_logging()
+    
+    def test_mark_attendance_many_interleaved_dates(self):
+        """Test that a catch-up batch mixing dates keeps its own reservations."""
+        self.db.add_student("5100", "Catch Up Student")
+        first = datetime.datetime(2026, 3, 2, 9, 0, 0)
+        second = datetime.datetime(2026, 3, 3, 9, 0, 0)
+        
+        records = [
+            ("5100", "Physics", "Present", first),
+            ("5100", "Physics", "Present", second),
+            ("5100", "Physics", "Present", first + datetime.timedelta(minutes=5)),
+            ("5100", "Physics", "Present", second + datetime.timedelta(minutes=5)),
+        ]
+        self.assertEqual(self.db.mark_attendance_many(records, remark_window=0), 4)
+        
+        # One row per day; the repeats were skipped
+        self.assertEqual(len(self.db.get_attendance("Physics", "2026-03-02")), 1)
+        self.assertEqual(len(self.db.get_attendance("Physics", "2026-03-03")), 1)
+        
+        # Today's marks survive loading a past day
+        self.assertTrue(self.db.mark_attendance("5100", "Physics", remark_window=0))
+        self.db.mark_attendance_many([("5100", "Physics", "Present", first)], remark_window=0)
+        self.assertTrue(self.db.is_attendance_marked("5100", "Physics"))
+        self.assertEqual(len(self.db.get_attendance("Physics", "2026-03-02")), 1)
+    
+    def test_appender_pool_interval_sync(self):
+        """Test that a burst below the record threshold is fsynced once the interval passes."""
+        self.db.add_student("6100", "Sync Student")
+        pool = self.db.storage.appenders
+        pool.fsync_interval = 0.2
+        
+        with mock.patch.object(os, "fsync", wraps=os.fsync) as fsync, \
+                mock.patch.object(os, "access", wraps=os.access) as access:
+            # The file was just opened, so neither threshold is reached yet
+            self.assertTrue(self.db.mark_attendance("6100", "Drama"))
+            self.assertTrue(self.db.mark_attendance("6100", "Drama"))
+            self.assertEqual(fsync.call_count, 0)
+            
+            # The connection check isn't repeated for each mark
+            access.assert_not_called()
+            
+            # No further appends: the timer syncs the idle file
+            deadline = time.monotonic() + 3
+            while fsync.call_count == 0 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(fsync.call_count, 1)
+        with pool._lock:
+            self.assertEqual([handle["unsynced"] for handle in pool._handles.values()], [0])
+    
+    def test_attendance_writer_group_commit(self):
+        """Test that queued attendance is written in grouped batches."""
+        for i in range(5):
+            self.db.add_student(f"{3000 + i}", f"Writer Student {i}")
+        
+        config = mock.Mock()
+        config.get_value.side_effect = lambda section, key, fallback=None: fallback
+        logger = AttendanceLogger(self.db, config)
+        logger.write_latency = 60
+        self.assertTrue(logger.set_subject("Chemistry"))
+        self.assertTrue(logger.start_continuous_logging())
+        
+        # Queued records count as marked before they reach the file
+        for i in range(5):
+            self.assertTrue(logger.log_attendance(f"{3000 + i}"))
+        self.assertTrue(logger.is_marked("3002"))
+        self.assertTrue(self.db.get_attendance("Chemistry").empty)
+        
+        # A flush writes all five in one append
+        self.assertTrue(logger.flush(timeout=5))
+        self.assertEqual(logger.writer.flush_count, 1)
+        attendance = self.db.get_attendance("Chemistry")
+        self.assertEqual(sorted(attendance["ID"].astype(str)), [f"{3000 + i}" for i in range(5)])
+        
+        # Repeat detections are not queued again, and closing drains the rest
+        self.assertTrue(logger.log_attendance("3001"))
+        self.db.add_student("3005", "Writer Student 5")
+        self.assertTrue(logger.log_attendance("3005"))
+        self.assertTrue(logger.stop_continuous_logging())
+        self.assertEqual(len(self.db.get_attendance("Chemistry")), 6)
+    
+    def _create_sqlite_config(self):
+        """Create a configuration selecting the SQLite backend."""
+        config = ConfigManager(os.path.join(self.test_dir, "config.json"))
+        config.set_value("Database", "Backend", "sqlite")
+        return config
+    
+    def test_sqlite_backend(self):
+        """Test that the SQLite backend keeps the DataFrame API."""
+        config = self._create_sqlite_config()
+        data_dir = os.path.join(self.test_dir, "sqlite_data")
+        db = DatabaseManager(data_dir, config)
+        self.assertTrue(os.path.exists(os.path.join(data_dir, "attendance.db")), "Database file should exist")
+        
+        self.assertTrue(db.add_student("1001", "First Student"))
+        self.assertTrue(db.add_student("1002", "Second Student"))
+        self.assertFalse(db.add_student("1001", "Duplicate"), "Duplicate IDs should be rejected")
+        
+        for _ in range(3):
+            self.assertTrue(db.mark_attendance("1001", "Math", remark_window=0))
+        self.assertTrue(db.mark_attendance("1002", "Math"))
+        
+        attendance = db.get_attendance("Math")
+        self.assertEqual(list(attendance.columns), ['ID', 'Name', 'Time', 'Status'])
+        self.assertEqual(list(attendance['ID']), ["1001", "1002"], "Repeat marks should not be stored")
+        
+        records = db.get_attendance_range("Math")
+        self.assertEqual(list(records.columns), ['ID', 'Name', 'Date', 'Time', 'Status'])
+        self.assertEqual(len(records), 2)
+        
+        summary = db.get_attendance_summary("Math")
+        self.assertEqual(list(summary[records['Date'].iloc[0]]), ["Present", "Present"])
+        
+        # Another manager on the same database sees new students
+        other_db = DatabaseManager(data_dir, config)
+        self.assertTrue(other_db.add_student("1003", "Third Student"))
+        self.assertEqual(db.get_student_name("1003"), "Third Student", "Roster index should reload")
+        self.assertTrue(other_db.is_attendance_marked("1001", "Math"))
+        
+        other_db.close()
+        db.close()
+    
+    def test_csv_to_sqlite_migration(self):
+        """Test that the CSV tree is migrated once into the SQLite database."""
+        self.assertTrue(self.db.add_student("1001", "First Student"))
+        self.assertTrue(self.db.add_student("1002", "Second Student"))
+        self.assertTrue(self.db.mark_attendance("1001", "Math"))
+        self.assertTrue(self.db.mark_attendance("1002", "Science"))
+        
+        self.assertEqual(migrate_csv_to_sqlite(self.db_path), (2, 2))
+        self.assertEqual(migrate_csv_to_sqlite(self.db_path), (0, 0), "Migrating again should add nothing")
+        
+        db = DatabaseManager(self.db_path, self._create_sqlite_config())
+        self.assertEqual(db.get_student_name("1002"), "Second Student")
+        self.assertEqual(list(db.get_attendance("Math")['ID']), ["1001"])
+        self.assertEqual(list(db.get_attendance("Science")['ID']), ["1002"])
+        db.close()
+
+class TestLatestFrameSlot(unittest.TestCase):
+    """Test the latest-frame slot used between camera pipeline stages."""
+    
+    def test_latest_frame_wins(self):
+        """Test that unconsumed frames are replaced and counted as dropped."""
+        slot = LatestFrameSlot()
+        self.assertIsNone(slot.get(timeout=0), "Empty slot should return None")
+        
+        slot.put("frame1")
+        slot.put("frame2")
+        self.assertEqual(slot.get(timeout=0), "frame2", "Consumer should see the latest frame")
+        self.assertEqual(slot.dropped, 1, "Replaced frame should be counted as dropped")
+        
+        # Closing wakes up a blocked consumer
+        slot.close()
+        self.assertIsNone(slot.get(), "Closed slot should return None")
+
+class TestFrameContext(unittest.TestCase):
+    """Test the frame context passed through the frame processors."""
+    
+    def test_annotations_do_not_touch_raw_frame(self):
+        """Test that annotations are only drawn by the render step."""
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        context = FrameContext(frame)
+        
+        self.assertIs(context.gray, context.gray, "Grayscale view should be computed once")
+        
+        context.add_box((10, 20, 30, 40), (0, 0, 255), label="Unknown")
+        self.assertEqual(int(frame.sum()), 0, "Raw frame should not be modified")
+        
+        display = np.zeros((60, 80, 3), dtype=np.uint8)
+        context.render(display, 0.5, 0.5, rgb=True)
+        self.assertEqual(tuple(display[10, 5]), (255, 0, 0), "Box should be drawn scaled and in RGB")
 
 class TestConfigManager(unittest.TestCase):
     """Test configuration manager functionality."""
@@ -26,6 +26,7 @@ from core.data_management.database import DatabaseManager
 from core.face_recognition.face_detector import FaceDetector
 from core.face_recognition.face_recognizer import FaceRecognizer
 from core.face_recognition.model_trainer import ModelTrainer
+from core.face_recognition.face_preprocessor import FacePreprocessor, FACE_SIZE
 from utils.logger import Logger
 from utils.ui_components import ModernUI, CameraFeed
 from utils.theme_manager import ThemeManager
@@ -49,7 +50,7 @@ class AdminApp:
         self.config = ConfigManager()
         
         # Initialize database
-        self.db = DatabaseManager()
+        self.db = DatabaseManager(config=self.config)
         
         # Initialize theme manager
         self.theme_manager = ThemeManager()
@@ -63,9 +64,12 @@ class AdminApp:
         self.capture_delay = 0.5  # Ensure this is defined
         self.student_id_for_capture = None
         
+        # Background model training job
+        self.training_job = None
+        
         # Standard face size for consistent processing
-        self.face_width = 100
-        self.face_height = 100
+        self.face_width, self.face_height = FACE_SIZE
+        self.face_preprocessor = FacePreprocessor()
         
         # Initialize UI elements to None first
         self.notebook = None
@@ -103,7 +107,7 @@ class AdminApp:
             cascade_path = self.config.get_path("FaceRecognition", "CascadePath")
             model_path = self.config.get_path("FaceRecognition", "ModelPath")
             self.face_detector = FaceDetector(cascade_path)
-            self.face_recognizer = FaceRecognizer(model_path)
+            self.face_recognizer = FaceRecognizer(model_path, self.config)
             
             # Check if face module is available
             if not self.face_recognizer.is_face_module_available():
@@ -220,6 +224,13 @@ class AdminApp:
         )
         self.train_btn.pack(side=tk.LEFT, padx=5)
         
+        import_btn = ttk.Button(
+            buttons_frame,
+            text="Import CSV",
+            command=self.import_students
+        )
+        import_btn.pack(side=tk.LEFT, padx=5)
+        
         # Create camera frame
         camera_frame = ttk.LabelFrame(right_frame, text="Camera", padding=10)
         camera_frame.pack(fill=tk.BOTH, expand=True)
@@ -332,6 +343,20 @@ class AdminApp:
         )
         export_btn.pack(side=tk.LEFT, padx=5)
         
+        roster_btn = ttk.Button(
+            buttons_frame,
+            text="Import Roster",
+            command=self.import_subject_roster
+        )
+        roster_btn.pack(side=tk.LEFT, padx=5)
+        
+        clear_roster_btn = ttk.Button(
+            buttons_frame,
+            text="Clear Roster",
+            command=self.clear_subject_roster
+        )
+        clear_roster_btn.pack(side=tk.LEFT, padx=5)
+        
         # Create attendance table
         table_frame = ttk.Frame(tab, padding=10)
         table_frame.pack(fill=tk.BOTH, expand=True)
@@ -385,6 +410,17 @@ class AdminApp:
         subject_entry = ttk.Entry(subject_frame, textvariable=self.report_subject_var, width=20)
         subject_entry.pack(side=tk.LEFT)
         
+        # Student filter (for a student's history across subjects)
+        student_frame = ttk.Frame(filters_frame)
+        student_frame.pack(side=tk.LEFT, padx=10)
+        
+        student_label = ttk.Label(student_frame, text="Student ID:")
+        student_label.pack(side=tk.LEFT, padx=5)
+        
+        self.report_student_var = tk.StringVar()
+        student_entry = ttk.Entry(student_frame, textvariable=self.report_student_var, width=12)
+        student_entry.pack(side=tk.LEFT)
+
         # Date range filter
         date_frame = ttk.Frame(filters_frame)
         date_frame.pack(side=tk.LEFT, padx=10)
@@ -414,6 +450,13 @@ class AdminApp:
         )
         generate_btn.pack(side=tk.LEFT, padx=5)
         
+        history_btn = ttk.Button(
+            buttons_frame,
+            text="Student History",
+            command=self.show_student_history
+        )
+        history_btn.pack(side=tk.LEFT, padx=5)
+        
         export_btn = ttk.Button(
             buttons_frame,
             text="Export Report",
@@ -677,6 +720,68 @@ class AdminApp:
         else:
             messagebox.showerror("Error", "Failed to register student")
     
+    def import_students(self):
+        """Register students in bulk from a CSV file with ID and Name columns."""
+        # Ask for the file to import
+        filepath = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv")]
+        )
+        
+        if not filepath:
+            return
+        
+        # Read the file as text so IDs keep their leading zeros
+        try:
+            records = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+            records.columns = [str(column).strip() for column in records.columns]
+        except Exception as e:
+            self.logger.error(f"Error reading student import: {e}")
+            messagebox.showerror("Error", f"Failed to read {filepath}: {e}")
+            return
+        
+        if 'ID' not in records.columns or 'Name' not in records.columns:
+            messagebox.showerror("Error", "The CSV file must have ID and Name columns")
+            return
+        
+        # Add all students at once
+        report = self.db.add_students_bulk(records[['ID', 'Name']])
+        
+        if report.empty and not records.empty:
+            messagebox.showerror("Error", "Failed to import students")
+            return
+        
+        counts = report['Result'].value_counts()
+        added = int(counts.get('Added', 0))
+        rejected = len(report) - added
+        summary = "\n".join(f"{result}: {count}" for result, count in counts.items())
+        self.logger.info(f"Imported {added} of {len(report)} students from {filepath}")
+        
+        if not rejected:
+            messagebox.showinfo("Success", f"{added} students registered successfully")
+            return
+        
+        # Offer to save the rows that were not added
+        if not messagebox.askyesno(
+            "Import Complete",
+            f"{added} of {len(report)} students registered.\n\n{summary}\n\nSave the rejected rows?"
+        ):
+            return
+        
+        report_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv")],
+            initialfile="import_rejected.csv"
+        )
+        
+        if not report_path:
+            return
+        
+        try:
+            report[report['Result'] != 'Added'].to_csv(report_path, index=False)
+        except Exception as e:
+            self.logger.error(f"Error saving import report: {e}")
+            messagebox.showerror("Error", f"Failed to save import report: {e}")
+
     def start_camera(self):
         """Start the camera feed."""
         if self.camera_feed.start():
@@ -708,41 +813,27 @@ class AdminApp:
             numpy.ndarray: Preprocessed face image
         """
         try:
-            # Convert to grayscale if needed
-            if len(face_img.shape) > 2 and face_img.shape[2] > 1:
-                gray_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-            else:
-                gray_img = face_img
-            
-            # Resize to standard size
-            resized_img = cv2.resize(gray_img, (self.face_width, self.face_height))
-            
-            return resized_img
+            # Same preprocessing as recognition, so training and inference stay identical
+            return self.face_preprocessor.face(face_img)
         except Exception as e:
             self.logger.error(f"Error preprocessing face: {e}")
             return None
     
-    def process_frame(self, frame):
+    def process_frame(self, context):
         """
         Process a frame from the camera feed.
         
         Args:
-            frame: Frame to process
-            
-        Returns:
-            Frame with faces detected
+            context (FrameContext): Frame to process; the detected face is added as an annotation
         """
         try:
-            # Create a copy of the frame
-            result_frame = frame.copy()
-            
             # Check if face detector is initialized
             if self.face_detector is None:
                 self.logger.warning("Face detector not initialized.")
-                return frame
+                return
             
-            # Detect faces
-            faces = self.face_detector.detect_faces(frame)
+            # Detect faces on the shared grayscale view
+            faces = self.face_detector.detect_faces(context.gray)
             
             # Update face detection status
             if len(faces) > 0:
@@ -753,12 +844,12 @@ class AdminApp:
                 x, y, w, h = largest_face
                 
                 # Draw rectangle around face
-                cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                context.add_box(largest_face, (0, 255, 0))
                 
                 # Update preview if capturing
                 if self.capture_active:
-                    # Extract face
-                    face_img = frame[y:y+h, x:x+w]
+                    # Extract face from the shared grayscale view
+                    face_img = context.gray[y:y+h, x:x+w]
                     
                     # Check if it's time for a new capture
                     current_time = time.time()
@@ -788,11 +879,8 @@ class AdminApp:
                         self.logger.error(f"Error updating preview: {e}")
             else:
                 self.face_detected_var.set("Face detected: No")
-            
-            return result_frame
         except Exception as e:
             self.logger.error(f"Error processing frame: {e}")
-            return frame
     
     def start_capture(self):
         """Start capturing images for face registration."""
@@ -824,7 +912,7 @@ class AdminApp:
         self.capture_btn.config(state=tk.DISABLED)
         
         # Create directory for student images
-        images_dir = self.config.get_path("FaceRecognition", "ImagesDirectory")
+        images_dir = self.config.get_path("FaceRecognition", "DataDir")
         student_dir = os.path.join(images_dir, student_id)
         os.makedirs(student_dir, exist_ok=True)
     
@@ -849,7 +937,7 @@ class AdminApp:
                 return
             
             # Get image directory
-            images_dir = self.config.get_path("FaceRecognition", "ImagesDirectory")
+            images_dir = self.config.get_path("FaceRecognition", "DataDir")
             student_dir = os.path.join(images_dir, self.student_id_for_capture)
             
             # Save face image
@@ -891,55 +979,69 @@ class AdminApp:
             )
             return
         
-        # Start training thread
-        self.training_thread = threading.Thread(target=self.train_model_thread)
-        self.training_thread.daemon = True
-        self.training_thread.start()
-    
-    def train_model_thread(self):
-        """Train the face recognition model in a separate thread."""
+        # Only one training job at a time
+        if self.training_job is not None and not self.training_job.finished:
+            return
+        
+        # Check if directory exists
+        images_dir = self.config.get_path("FaceRecognition", "DataDir")
+        if not os.path.exists(images_dir):
+            messagebox.showerror("Error", "Images directory does not exist")
+            self.status_var.set("Error training model")
+            return
+        
         try:
-            # Update status
-            self.status_var.set("Training model...")
-            self.progress_var.set(0)
-            
-            # Get image directory
-            images_dir = self.config.get_path("FaceRecognition", "ImagesDirectory")
-            
-            # Check if directory exists
-            if not os.path.exists(images_dir):
-                messagebox.showerror("Error", "Images directory does not exist")
-                self.status_var.set("Error training model")
-                return
-            
-            # Create model trainer
-            cascade_path = self.config.get_path("FaceRecognition", "CascadePath")
-            model_trainer = ModelTrainer(cascade_path)
-            
-            # Define progress callback
-            def progress_callback(progress, message):
-                self.status_var.set(message)
-                self.progress_var.set(int(progress))
-            
-            # Define completion callback
-            def completion_callback(success):
-                if success:
-                    self.status_var.set("Model training complete")
-                    messagebox.showinfo("Success", "Model training complete")
-                else:
-                    self.status_var.set("Error training model")
-                    messagebox.showerror("Error", "Failed to train model")
-            
-            # Get model path
-            model_path = self.config.get_path("FaceRecognition", "ModelPath")
-            
-            # Train the model
-            model_trainer.train_async(images_dir, model_path, progress_callback, completion_callback)
+            # Train in a separate process so the UI stays responsive
+            model_trainer = ModelTrainer(self.face_recognizer, self.config)
+            self.training_job = model_trainer.start_training_job(images_dir)
         except Exception as e:
             self.logger.error(f"Error training model: {e}")
             messagebox.showerror("Error", f"Failed to train model: {e}")
             self.status_var.set("Error training model")
+            return
+        
+        # Update status
+        self.status_var.set("Training model...")
+        self.progress_var.set(0)
+        self.train_btn.config(text="Cancel Training", command=self.cancel_training)
+        
+        self.root.after(200, self.poll_training_job)
+    
+    def poll_training_job(self):
+        """Show the training job's progress and handle its result."""
+        job = self.training_job
+        if job is None:
+            return
+        
+        job.poll()
+        self.status_var.set(job.message)
+        self.progress_var.set(job.percent)
+        
+        if not job.finished:
+            self.root.after(200, self.poll_training_job)
+            return
+        
+        self.train_btn.config(text="Train Model", command=self.train_model, state=tk.NORMAL)
+        
+        if job.success:
+            # Load the model the job swapped into place
+            self.face_recognizer.reload_model()
+            self.status_var.set("Model training complete")
+            messagebox.showinfo("Success", job.message)
+        elif job.cancelled:
+            self.status_var.set("Training cancelled")
+            self.progress_var.set(0)
+        else:
+            self.status_var.set("Error training model")
+            messagebox.showerror("Error", f"Failed to train model: {job.message}")
     
+    def cancel_training(self):
+        """Cancel the running training job."""
+        if self.training_job is not None and not self.training_job.finished:
+            self.training_job.cancel()
+            self.status_var.set("Cancelling training...")
+            self.train_btn.config(state=tk.DISABLED)
+
     def load_attendance(self):
         """Load attendance data."""
         # Get subject and date
@@ -1006,6 +1108,68 @@ class AdminApp:
             self.logger.error(f"Error exporting attendance: {e}")
             messagebox.showerror("Error", f"Failed to export attendance: {e}")
     
+    def import_subject_roster(self):
+        """Set the subject's roster from a CSV file with an ID column."""
+        subject = self.subject_var.get().strip()
+        
+        if not subject:
+            messagebox.showerror("Error", "Subject is required")
+            return
+        
+        # Ask for the roster file
+        filepath = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv")]
+        )
+        
+        if not filepath:
+            return
+        
+        # Read the file as text so IDs keep their leading zeros
+        try:
+            roster = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+            roster.columns = [str(column).strip() for column in roster.columns]
+        except Exception as e:
+            self.logger.error(f"Error reading subject roster: {e}")
+            messagebox.showerror("Error", f"Failed to read {filepath}: {e}")
+            return
+        
+        if 'ID' not in roster.columns:
+            messagebox.showerror("Error", "The CSV file must have an ID column")
+            return
+        
+        student_ids = [student_id.strip() for student_id in roster['ID'] if student_id.strip()]
+        unknown = [student_id for student_id in student_ids if not self.db.student_exists(student_id)]
+        
+        if not self.db.set_subject_roster(subject, student_ids):
+            messagebox.showerror("Error", "Failed to save subject roster")
+            return
+        
+        message = f"Roster for {subject} set to {len(set(student_ids))} students"
+        if unknown:
+            message += f"\n\n{len(unknown)} IDs are not registered yet: {', '.join(unknown[:10])}"
+        self.logger.info(message)
+        messagebox.showinfo("Success", message)
+    
+    def clear_subject_roster(self):
+        """Remove the subject's roster so every student can attend it."""
+        subject = self.subject_var.get().strip()
+        
+        if not subject:
+            messagebox.showerror("Error", "Subject is required")
+            return
+        
+        if self.db.get_subject_roster(subject) is None:
+            messagebox.showinfo("Info", f"{subject} has no roster")
+            return
+        
+        if not messagebox.askyesno("Clear Roster", f"Let every student attend {subject}?"):
+            return
+        
+        if self.db.set_subject_roster(subject, None):
+            messagebox.showinfo("Success", f"Roster for {subject} cleared")
+        else:
+            messagebox.showerror("Error", "Failed to clear subject roster")
+    
     def generate_report(self):
         """Generate attendance report."""
         # Get report parameters
@@ -1041,35 +1205,90 @@ class AdminApp:
                 subject
             ))
         
-        # Generate summary
-        total_students = len(attendance["ID"].unique())
-        total_days = len(attendance["Date"].unique())
+        # Generate summary: a day counts for a student with any record on it (any status,
+        # on the roster or not), grouped once over the loaded records
+        student_groups = attendance.groupby("ID", sort=False)
+        student_names = student_groups["Name"].first()
+        student_days = student_groups["Date"].nunique()
+        total_students = len(student_days)
+        total_days = attendance["Date"].nunique()
+        percentages = student_days / total_days * 100 if total_days > 0 else student_days * 0.0
         
         summary = f"Attendance Summary for {subject}\n"
         summary += f"Period: {from_date} to {to_date}\n\n"
         summary += f"Total Students: {total_students}\n"
         summary += f"Total Days: {total_days}\n\n"
         
-        # Calculate attendance percentage for each student
-        student_attendance = {}
-        for student_id in attendance["ID"].unique():
-            student_name = attendance[attendance["ID"] == student_id]["Name"].iloc[0]
-            student_days = len(attendance[attendance["ID"] == student_id]["Date"].unique())
-            percentage = (student_days / total_days) * 100 if total_days > 0 else 0
-            student_attendance[student_id] = (student_name, student_days, percentage)
-        
         # Add student attendance to summary
         summary += "Student Attendance:\n"
         summary += "-" * 60 + "\n"
         summary += f"{'ID':<10} {'Name':<30} {'Days':<10} {'Percentage':<10}\n"
         summary += "-" * 60 + "\n"
         
-        for student_id, (name, days, percentage) in student_attendance.items():
+        for student_id, name, days, percentage in zip(
+            student_days.index, student_names, student_days, percentages
+        ):
             summary += f"{student_id:<10} {name:<30} {days:<10} {percentage:.2f}%\n"
         
         # Add summary to text widget
         self.summary_text.insert(tk.END, summary)
     
+    def show_student_history(self):
+        """Show a student's attendance across all subjects."""
+        # Get report parameters
+        student_id = self.report_student_var.get().strip()
+        from_date = self.from_date_var.get().strip()
+        to_date = self.to_date_var.get().strip()
+        
+        if not student_id:
+            messagebox.showerror("Error", "Student ID is required")
+            return
+        
+        if not self.db.student_exists(student_id):
+            messagebox.showerror("Error", f"Student with ID {student_id} does not exist")
+            return
+        
+        # Clear treeview
+        for item in self.report_tree.get_children():
+            self.report_tree.delete(item)
+        
+        # Clear summary text
+        self.summary_text.delete(1.0, tk.END)
+        
+        # Get the student's records from the history index
+        history = self.db.get_student_history(student_id, from_date, to_date)
+        
+        if history.empty:
+            messagebox.showinfo("Info", "No attendance records found")
+            return
+        
+        # Add data to treeview
+        name = self.db.get_student_name(student_id)
+        for subject, date, time, status in zip(history["Subject"], history["Date"], history["Time"], history["Status"]):
+            self.report_tree.insert("", "end", values=(
+                student_id,
+                name,
+                date,
+                time,
+                subject
+            ))
+        
+        # Summarize days present per subject
+        present = history[history["Status"] == "Present"]
+        days_present = present.groupby("Subject")["Date"].nunique()
+        
+        summary = f"Attendance History for {name} ({student_id})\n"
+        summary += f"Period: {from_date} to {to_date}\n\n"
+        summary += f"Total Records: {len(history)}\n\n"
+        summary += f"{'Subject':<30} {'Days Present':<12}\n"
+        summary += "-" * 44 + "\n"
+        
+        for subject in sorted(history["Subject"].unique()):
+            summary += f"{subject:<30} {int(days_present.get(subject, 0)):<12}\n"
+        
+        # Add summary to text widget
+        self.summary_text.insert(tk.END, summary)
+    
     def export_report(self):
         """Export attendance report."""
         # Get report parameters
@@ -1159,10 +1378,19 @@ class AdminApp:
     
     def on_close(self):
         """Handle window close event."""
+        # Stop a running training job; the current model is kept
+        if self.training_job is not None and not self.training_job.finished:
+            self.training_job.cancel()
+            if not self.training_job.wait(2):
+                self.training_job.terminate()
+        
         # Stop camera if running
         if hasattr(self, "camera_feed") and self.camera_feed.is_running():
             self.camera_feed.stop()
         
+        # Close the attendance database
+        self.db.close()
+        
         # Destroy window
         self.root.destroy()
 
@@ -9,8 +9,6 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
 import datetime
-import cv2
-import numpy as np
 import pandas as pd
 import logging
 import time
@@ -27,6 +25,7 @@ from core.data_management.attendance_logger import AttendanceLogger
 from core.data_management.alert_system import AlertSystem
 from core.face_recognition.face_detector import FaceDetector
 from core.face_recognition.face_recognizer import FaceRecognizer
+from core.face_recognition.recognition_cache import RecognitionCache
 from utils.logger import Logger
 from utils.ui_components import ModernUI, CameraFeed
 from utils.theme_manager import ThemeManager
@@ -50,7 +49,7 @@ class ScannerApp:
         self.config = ConfigManager()
         
         # Initialize database
-        self.db = DatabaseManager()
+        self.db = DatabaseManager(config=self.config)
         
         # Initialize attendance logger with default subject
         self.attendance_logger = AttendanceLogger(self.db, self.config)
@@ -59,6 +58,9 @@ class ScannerApp:
         default_subject = self.config.get_value('General', 'DefaultSubject', 'General')
         self.attendance_logger.set_subject(default_subject)
         
+        # Write recognized attendance from a background group-commit writer
+        self.attendance_logger.start_continuous_logging()
+        
         # Initialize theme manager
         self.theme_manager = ThemeManager()
         
@@ -69,7 +71,32 @@ class ScannerApp:
         # Initialize face recognition components
         try:
             self.face_detector = FaceDetector(cascade_path)
-            self.face_recognizer = FaceRecognizer(model_path)
+            self.face_recognizer = FaceRecognizer(model_path, self.config)
+            
+            # Match only the students on the current subject's roster
+            self.attendance_logger.set_face_recognizer(self.face_recognizer)
+
+            # Poll for a retrained model and swap it in without restarting
+            self.model_version = self.face_recognizer.model_version
+            self.model_check_interval = int(float(self.config.get_value('FaceRecognition', 'ModelCheckInterval', '2')) * 1000)
+            self.model_check_job = None
+            
+            # Run the full detector every N frames and track faces in between
+            detection_interval = int(self.config.get_value('FaceRecognition', 'DetectionInterval', '5'))
+            self.face_detector.set_tracking(detection_interval)
+            
+            # Commit an identity per tracked face only after enough agreeing votes
+            self.recognition_cache = RecognitionCache(
+                min_votes=int(self.config.get_value('FaceRecognition', 'RecognitionVotes', '3')),
+                min_margin=int(self.config.get_value('FaceRecognition', 'RecognitionVoteMargin', '2'))
+            )
+            
+            # Roster the committed identities were recognized against
+            self.applied_roster_version = self.attendance_logger.roster_version
+            
+            # Set on the Tk thread to drop committed identities; the cache is only
+            # touched by the processing thread, which clears it before its next frame
+            self.cache_reset_requested = False
             
             # Check if face module is available
             if not self.face_recognizer.is_face_module_available():
@@ -80,6 +107,7 @@ class ScannerApp:
             
             # Set up the interface
             self.setup_interface()
+            self.model_check_job = self.root.after(self.model_check_interval, self.check_model_update)
             
             # Scanning state
             self.scanning = False
@@ -265,6 +293,11 @@ class ScannerApp:
         )
         theme_btn.pack(side=tk.RIGHT, padx=10, pady=5)
         
+        # Active recognition model version
+        self.model_version_var = tk.StringVar(value=f"Model v{self.face_recognizer.model_version}")
+        model_version_label = ttk.Label(theme_frame, textvariable=self.model_version_var)
+        model_version_label.pack(side=tk.LEFT, padx=10)
+        
         # Status bar
         self.status_var = tk.StringVar(value="Ready")
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
@@ -326,107 +359,160 @@ class ScannerApp:
         # Start new camera
         self.start_camera()
     
-    def process_frame(self, frame):
+    def process_frame(self, context):
         """
         Process a frame from the camera feed.
         
         Args:
-            frame: Frame to process
-            
-        Returns:
-            Frame with faces detected
+            context (FrameContext): Frame to process; detected faces are added as annotations
         """
         try:
-            if frame is None:
-                return np.zeros((480, 640, 3), dtype=np.uint8)  # Return black frame
-                
-            # Detect faces
-            result_frame, faces = self.face_detector.detect_and_draw(frame)
+            frame = context.frame
+            
+            # Switch subject (and roster) before recognizing anything in this frame
+            self.apply_subject()
+            
+            # Detect faces (tracked between full detections) on the shared grayscale view
+            faces, track_ids = self.face_detector.detect_and_track(context.gray)
             
-            # If scanning, process each face
-            if self.scanning and faces is not None and len(faces) > 0:
-                for face_rect in faces:
-                    x, y, w, h = face_rect
+            # Forget votes for faces that are no longer tracked
+            self.recognition_cache.prune(track_ids)
+            
+            # Faces that can be recognized this frame: scanning and fully inside the frame
+            valid = [
+                self.scanning and x >= 0 and y >= 0 and x+w <= frame.shape[1] and y+h <= frame.shape[0]
+                for (x, y, w, h) in faces
+            ]
+            
+            # Recognize all faces still collecting votes in one batch
+            predictions = {}
+            if self.face_recognizer.is_face_module_available() and self.face_recognizer.is_model_loaded():
+                pending = [
+                    i for i, track_id in enumerate(track_ids)
+                    if valid[i] and not self.recognition_cache.is_committed(track_id)
+                ]
+                if pending:
+                    # Reuse the frame's grayscale conversion from detection
+                    pending_ids, pending_confidences = self.face_recognizer.recognize_faces(
+                        context.gray, [faces[i] for i in pending]
+                    )
+                    predictions = {
+                        i: (int(face_id), float(confidence))
+                        for i, face_id, confidence in zip(pending, pending_ids, pending_confidences)
+                    }
+            
+            # Get confidence threshold
+            threshold = float(self.config.get_value('FaceRecognition', 'ConfidenceThreshold', '80'))
+            
+            # Process each face
+            for i, (face_rect, track_id) in enumerate(zip(faces, track_ids)):
+                x, y, w, h = face_rect
+                
+                # Only recognize faces while scanning and when the face region is valid
+                if not valid[i]:
+                    context.add_box(face_rect, (0, 255, 0))
+                    continue
                     
-                    # Ensure face region is valid
-                    if x < 0 or y < 0 or x+w > frame.shape[1] or y+h > frame.shape[0]:
-                        continue
+                # View into the frame, not a copy
+                face_img = frame[y:y+h, x:x+w]
+                
+                # Skip empty or invalid face images
+                if face_img is None or face_img.size == 0:
+                    context.add_box(face_rect, (0, 255, 0))
+                    continue
+                
+                # Recognize face if face module is available
+                if self.face_recognizer.is_face_module_available() and self.face_recognizer.is_model_loaded():
+                    # Faces with a committed identity skip prediction until the track is lost;
+                    # unknown faces keep voting so they can still be recognized
+                    newly_committed = False
+                    
+                    if not self.recognition_cache.is_committed(track_id):
+                        student_id, confidence = predictions.get(i, (-1, 100.0))
+                        
+                        # Votes below the threshold count as unknown
+                        if student_id == -1 or confidence >= 100 - threshold:
+                            student_id = -1
                         
-                    face_img = frame[y:y+h, x:x+w]
+                        newly_committed = self.recognition_cache.add_vote(track_id, student_id, confidence) is not None
                     
-                    # Skip empty or invalid face images
-                    if face_img is None or face_img.size == 0:
+                    committed = self.recognition_cache.get(track_id)
+                    if committed is None:
+                        # Still collecting votes
+                        context.add_box(face_rect, (0, 255, 255), label="Identifying...")
                         continue
                     
-                    # Recognize face if face module is available
-                    if self.face_recognizer.is_face_module_available() and self.face_recognizer.is_model_loaded():
-                        student_id, confidence = self.face_recognizer.recognize_face(face_img)
-                        
-                        # Get confidence threshold
-                        threshold = float(self.config.get_value('FaceRecognition', 'ConfidenceThreshold', '80'))
+                    student_id, confidence = committed
+                    
+                    if student_id != -1:
+                        # Known student
+                        student_name = self.db.get_student_name(str(student_id))
                         
-                        if student_id != -1 and confidence < 100 - threshold:
-                            # Known student
-                            student_name = self.db.get_student_name(str(student_id))
-                            
-                            # Mark attendance
-                            subject = self.subject_var.get().strip()
-                            if not subject:  # If subject is empty, use default
-                                subject = self.config.get_value('General', 'DefaultSubject', 'General')
+                        if newly_committed:
+                            # Mark attendance under the subject applied at the top of the frame;
+                            # repeat recognitions are a set lookup, only new marks hit the disk
+                            if not self.attendance_logger.is_marked(str(student_id)):
+                                self.attendance_logger.log_attendance(str(student_id))
                                 
-                            self.attendance_logger.set_subject(subject)
-                            self.db.mark_attendance(str(student_id), subject)
-                            
-                            # Add to log
-                            self.add_to_log(str(student_id), student_name, confidence, "Recognized")
-                            
-                            # Draw green box and name
-                            cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                            cv2.putText(
-                                result_frame,
-                                f"{student_name} ({confidence:.2f})",
-                                (x, y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 255, 0),
-                                2
-                            )
-                        else:
-                            # Unknown person
+                                # Add to log
+                                self.add_to_log(str(student_id), student_name, confidence, "Recognized")
+                        
+                        # Draw green box and name
+                        context.add_box(face_rect, (0, 255, 0), label=f"{student_name} ({confidence:.2f})")
+                    else:
+                        # Unknown person
+                        if newly_committed:
                             self.add_to_log("Unknown", "Unknown", confidence, "Alert")
                             
                             # Trigger alert
                             self.alert_system.trigger_alert(frame, face_rect)
-                            
-                            # Draw red box
-                            cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-                            cv2.putText(
-                                result_frame,
-                                "Unknown",
-                                (x, y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX,
-                                0.5,
-                                (0, 0, 255),
-                                2
-                            )
-                    else:
-                        # Face module not available or model not loaded
-                        # Just draw yellow box
-                        cv2.rectangle(result_frame, (x, y), (x + w, y + h), (0, 255, 255), 2)
-                        cv2.putText(
-                            result_frame,
-                            "Face Detection Only",
-                            (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5,
-                            (0, 255, 255),
-                            2
-                        )
-            
-            return result_frame
+                        
+                        # Draw red box
+                        context.add_box(face_rect, (0, 0, 255), label="Unknown")
+                else:
+                    # Face module not available or model not loaded
+                    # Just draw yellow box
+                    context.add_box(face_rect, (0, 255, 255), label="Face Detection Only")
         except Exception as e:
             self.logger.error(f"Error processing frame: {e}")
-            return frame
+    
+    def apply_subject(self):
+        """
+        Apply the subject entry to attendance logging and recognition.
+        
+        Called from the processing thread before each frame is recognized. When
+        the subject or its roster changes, or the Tk thread requested a reset,
+        committed identities are dropped so every face is recognized again.
+        """
+        subject = self.subject_var.get().strip()
+        if not subject:  # If subject is empty, use default
+            subject = self.config.get_value('General', 'DefaultSubject', 'General')
+        
+        self.attendance_logger.set_subject(subject)
+        
+        if self.cache_reset_requested or self.attendance_logger.roster_version != self.applied_roster_version:
+            # Take the request before clearing, so a new one is kept for the next frame
+            self.cache_reset_requested = False
+            self.applied_roster_version = self.attendance_logger.roster_version
+            self.recognition_cache.clear()
+    
+    def check_model_update(self):
+        """Start a background reload when the model was retrained, and show the active version."""
+        try:
+            self.face_recognizer.check_for_update()
+            
+            version = self.face_recognizer.model_version
+            if version != self.model_version:
+                # Identities committed by the previous model are re-checked with the new one
+                # (cleared by the processing thread before its next frame)
+                self.cache_reset_requested = True
+                self.model_version = version
+                self.model_version_var.set(f"Model v{version}")
+                self.status_var.set(f"Recognition model updated (v{version})")
+        except Exception as e:
+            self.logger.error(f"Error checking for model update: {e}")
+        
+        self.model_check_job = self.root.after(self.model_check_interval, self.check_model_update)
     
     def start_scanning(self):
         """Start automatic attendance scanning."""
@@ -467,7 +553,8 @@ class ScannerApp:
             if result != 'yes':
                 return
         
-        # Start scanning
+        # Start scanning with fresh recognition votes
+        self.cache_reset_requested = True
         self.scanning = True
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
@@ -522,6 +609,11 @@ class ScannerApp:
     
     def on_close(self):
         """Handle window close event."""
+        # Stop polling for model updates
+        if self.model_check_job is not None:
+            self.root.after_cancel(self.model_check_job)
+            self.model_check_job = None
+        
         # Stop scanning if running
         if self.scanning:
             self.stop_scanning()
@@ -530,6 +622,15 @@ class ScannerApp:
         if self.camera_feed.is_running():
             self.camera_feed.stop()
         
+        # Release the recognition thread pool
+        self.face_recognizer.shutdown()
+        
+        # Write queued attendance before the database closes
+        self.attendance_logger.stop_continuous_logging()
+        
+        # Close the attendance database
+        self.db.close()
+        
         # Destroy window
         self.root.destroy()
 
@@ -0,0 +1,96 @@
+"""
+Frame Buffer Utilities Module
+This module provides a single-slot "latest frame wins" buffer for connecting pipeline stages.
+"""
+
+import threading
+import time
+
+class LatestFrameSlot:
+    """
+    A single-slot buffer where a new item replaces any item not yet taken.
+    
+    Producers never block: if the consumer hasn't taken the previous item it is
+    dropped and counted, so a slow consumer always sees the most recent frame.
+    """
+    
+    def __init__(self):
+        """Initialize the frame slot."""
+        self.condition = threading.Condition()
+        self.item = None
+        self.has_item = False
+        self.closed = False
+        self.put_count = 0
+        self.get_count = 0
+        self.dropped = 0
+    
+    def put(self, item):
+        """
+        Put an item into the slot, replacing any unconsumed item.
+        
+        Args:
+            item: Item to store
+        
+        Returns:
+            bool: True if an unconsumed item was dropped, False otherwise
+        """
+        with self.condition:
+            dropped = self.has_item
+            if dropped:
+                self.dropped += 1
+            
+            self.item = item
+            self.has_item = True
+            self.put_count += 1
+            self.condition.notify()
+            return dropped
+    
+    def get(self, timeout=None):
+        """
+        Take the latest item from the slot.
+        
+        Args:
+            timeout (float, optional): Seconds to wait for an item. 0 returns immediately,
+                None waits until an item arrives or the slot is closed.
+        
+        Returns:
+            The latest item, or None if no item arrived in time or the slot is closed
+        """
+        with self.condition:
+            if timeout is None:
+                while not self.has_item and not self.closed:
+                    self.condition.wait()
+            elif timeout > 0:
+                deadline = time.monotonic() + timeout
+                while not self.has_item and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            
+            if not self.has_item:
+                return None
+            
+            item = self.item
+            self.item = None
+            self.has_item = False
+            self.get_count += 1
+            return item
+    
+    def close(self):
+        """Close the slot and wake up any waiting consumer."""
+        with self.condition:
+            self.closed = True
+            self.item = None
+            self.has_item = False
+            self.condition.notify_all()
+    
+    def reset(self):
+        """Reopen the slot and clear its contents and counters."""
+        with self.condition:
+            self.closed = False
+            self.item = None
+            self.has_item = False
+            self.put_count = 0
+            self.get_count = 0
+            self.dropped = 0
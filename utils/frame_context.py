@@ -0,0 +1,111 @@
+"""
+Frame Context Module
+This module provides a per-frame context shared by the camera frame processors.
+"""
+
+import cv2
+import numpy as np
+
+class FrameContext:
+    """
+    A class carrying one camera frame through the frame processors.
+    
+    Processors read the raw frame (never modify it), share a lazily computed
+    grayscale view, and add annotations instead of drawing on copies. A single
+    render step then draws all annotations onto the display buffer.
+    """
+    
+    def __init__(self, frame, gray_buffer=None):
+        """
+        Initialize the frame context.
+        
+        Args:
+            frame (numpy.ndarray): Raw BGR frame from the camera
+            gray_buffer (numpy.ndarray, optional): Reusable buffer for the grayscale conversion
+        """
+        self.frame = frame
+        self.annotations = []
+        self.gray_buffer = gray_buffer
+        self._gray = None
+    
+    @property
+    def gray(self):
+        """
+        Get the grayscale version of the frame, converting it on first access.
+        
+        Returns:
+            numpy.ndarray: Grayscale frame
+        """
+        if self._gray is None:
+            if len(self.frame.shape) == 3:
+                # Convert into the reusable buffer, reallocating only when the frame size changes
+                if self.gray_buffer is None or self.gray_buffer.shape != self.frame.shape[:2]:
+                    self.gray_buffer = np.empty(self.frame.shape[:2], dtype=np.uint8)
+                self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=self.gray_buffer)
+            else:
+                self._gray = self.frame
+        return self._gray
+    
+    def set_frame(self, frame):
+        """
+        Replace the frame (used for processors that return a new image).
+        
+        Args:
+            frame (numpy.ndarray): New BGR frame
+        """
+        self.frame = frame
+        self._gray = None
+    
+    def add_box(self, rect, color=(0, 255, 0), thickness=2, label=None):
+        """
+        Add a box annotation.
+        
+        Args:
+            rect (tuple): Rectangle (x, y, w, h)
+            color (tuple): Box color (B, G, R)
+            thickness (int): Line thickness
+            label (str, optional): Text drawn above the box
+        """
+        self.annotations.append({
+            "rect": tuple(int(v) for v in rect),
+            "color": color,
+            "thickness": thickness,
+            "label": label
+        })
+    
+    def render(self, image, scale_x=1.0, scale_y=1.0, rgb=False):
+        """
+        Draw all annotations onto an image in place.
+        
+        Args:
+            image (numpy.ndarray): Image to draw on (typically the display buffer)
+            scale_x (float): Horizontal scale from frame to image coordinates
+            scale_y (float): Vertical scale from frame to image coordinates
+            rgb (bool): Whether the image is RGB (annotation colors are BGR)
+        
+        Returns:
+            numpy.ndarray: The image with annotations drawn
+        """
+        for annotation in self.annotations:
+            x, y, w, h = annotation["rect"]
+            x1, y1 = int(x * scale_x), int(y * scale_y)
+            x2, y2 = int((x + w) * scale_x), int((y + h) * scale_y)
+            
+            color = annotation["color"]
+            if rgb:
+                color = tuple(reversed(color))
+            
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, annotation["thickness"])
+            
+            if annotation["label"]:
+                cv2.putText(
+                    image,
+                    annotation["label"],
+                    (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5,
+                    color,
+                    2
+                )
+        
+        return image
@@ -12,6 +12,9 @@ import time
 import logging
 from PIL import Image, ImageTk
 
+from utils.frame_buffer import LatestFrameSlot
+from utils.frame_context import FrameContext
+
 class ModernUI:
     """
     A class providing modern UI components.
@@ -476,6 +479,15 @@ class CameraFeed:
         self.last_retry_time = 0
         self.stop_event = threading.Event()
         
+        # Pipeline stages: capture -> process -> display, each joined by a latest-frame slot
+        self.process_thread = None
+        self.capture_slot = LatestFrameSlot()
+        self.display_slot = LatestFrameSlot()
+        self.display_job = None
+        self.display_interval = 15  # milliseconds
+        self.displayed_count = 0
+        self.gray_buffer = None
+        
         # Create status label
         self.status_var = tk.StringVar(value="Camera not started")
         self.status_label = ttk.Label(parent, textvariable=self.status_var)
@@ -519,12 +531,24 @@ class CameraFeed:
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
             
-            # Start the camera thread
+            # Reset the stage buffers
+            self.capture_slot.reset()
+            self.display_slot.reset()
+            self.displayed_count = 0
+            
+            # Start the capture and processing threads
             self.running = True
             self.thread = threading.Thread(target=self.update)
             self.thread.daemon = True
             self.thread.start()
             
+            self.process_thread = threading.Thread(target=self.process_loop)
+            self.process_thread.daemon = True
+            self.process_thread.start()
+            
+            # Start the display step on the Tk thread
+            self.display_job = self.parent.after(self.display_interval, self.display_loop)
+            
             self.status_var.set("Camera started")
             self.retry_count = 0
             return True
@@ -535,14 +559,29 @@ class CameraFeed:
     
     def stop(self):
         """Stop the camera feed."""
-        # Signal thread to stop
+        # Signal threads to stop
         self.stop_event.set()
         self.running = False
         
-        # Wait for thread to finish
-        if self.thread and self.thread.is_alive():
+        # Wake up the stages waiting on frames
+        self.capture_slot.close()
+        self.display_slot.close()
+        
+        # Cancel the display step
+        if self.display_job is not None:
+            try:
+                self.parent.after_cancel(self.display_job)
+            except Exception:
+                pass  # Parent might be destroyed
+            self.display_job = None
+        
+        # Wait for threads to finish
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
             self.thread.join(timeout=1.0)
         
+        if self.process_thread and self.process_thread.is_alive():
+            self.process_thread.join(timeout=1.0)
+        
         # Release the camera
         if self.cap:
             self.cap.release()
@@ -556,7 +595,7 @@ class CameraFeed:
             pass  # Canvas might be destroyed already
     
     def update(self):
-        """Update the camera feed."""
+        """Capture frames from the camera and hand the latest one to the processing stage."""
         try:
             while self.running and not self.stop_event.is_set():
                 # Check if camera is still open
@@ -602,35 +641,11 @@ class CameraFeed:
                 # Reset retry count on successful frame grab
                 self.retry_count = 0
                 
-                # Store the last successful frame
-                self.last_frame = frame.copy()
-                
-                # Process the frame
-                processed_frame = self.process_frame(frame)
-                
-                # Convert to RGB for tkinter
-                rgb_frame = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-                
-                # Resize to fit canvas if needed
-                if rgb_frame.shape[1] != self.width or rgb_frame.shape[0] != self.height:
-                    rgb_frame = cv2.resize(rgb_frame, (self.width, self.height))
+                # Store the last successful frame (processors never draw on it, so no copy is needed)
+                self.last_frame = frame
                 
-                # Update canvas safely
-                try:
-                    # Convert to PhotoImage
-                    img = Image.fromarray(rgb_frame)
-                    photo = ImageTk.PhotoImage(image=img)
-                    
-                    # Update canvas
-                    self.canvas.delete("all")
-                    self.canvas.create_image(0, 0, image=photo, anchor=tk.NW)
-                    self.canvas.photo = photo  # Keep a reference
-                except Exception:
-                    # Canvas might be destroyed or invalid
-                    break
-                
-                # Short sleep to reduce CPU usage
-                time.sleep(0.03)
+                # Hand the frame to the processing stage; an unprocessed older frame is dropped
+                self.capture_slot.put(frame)
         except Exception as e:
             self.logger.error(f"Error in camera update loop: {e}")
             self.handle_camera_error(f"Error: {e}")
@@ -648,6 +663,75 @@ class CameraFeed:
                     pass  # Parent might be destroyed
                 self.running = False
     
+    def process_loop(self):
+        """Process the latest captured frame and hand the result to the display step."""
+        while self.running and not self.stop_event.is_set():
+            frame = self.capture_slot.get(timeout=0.5)
+            if frame is None:
+                continue
+            
+            try:
+                # Process the frame
+                context = self.process_frame(frame)
+                
+                # Convert to RGB for tkinter; this is the only full-frame buffer allocated
+                rgb_frame = cv2.cvtColor(context.frame, cv2.COLOR_BGR2RGB)
+                
+                # Resize to fit canvas if needed
+                frame_h, frame_w = rgb_frame.shape[:2]
+                if frame_w != self.width or frame_h != self.height:
+                    rgb_frame = cv2.resize(rgb_frame, (self.width, self.height))
+                
+                # Render the processors' annotations onto the display buffer
+                context.render(rgb_frame, self.width / frame_w, self.height / frame_h, rgb=True)
+                
+                self.display_slot.put(rgb_frame)
+            except Exception as e:
+                self.logger.error(f"Error in camera processing loop: {e}")
+    
+    def display_loop(self):
+        """Paint the latest processed frame on the canvas (runs on the Tk thread)."""
+        self.display_job = None
+        if not self.running or self.stop_event.is_set():
+            return
+        
+        rgb_frame = self.display_slot.get(timeout=0)
+        if rgb_frame is not None:
+            # Update canvas safely
+            try:
+                # Convert to PhotoImage
+                img = Image.fromarray(rgb_frame)
+                photo = ImageTk.PhotoImage(image=img)
+                
+                # Update canvas
+                self.canvas.delete("all")
+                self.canvas.create_image(0, 0, image=photo, anchor=tk.NW)
+                self.canvas.photo = photo  # Keep a reference
+                self.displayed_count += 1
+            except Exception:
+                # Canvas might be destroyed or invalid
+                return
+        
+        try:
+            self.display_job = self.parent.after(self.display_interval, self.display_loop)
+        except Exception:
+            pass  # Parent might be destroyed
+    
+    def get_stats(self):
+        """
+        Get frame pipeline statistics.
+        
+        Returns:
+            dict: Frame counts per stage and frames dropped between stages
+        """
+        return {
+            "captured": self.capture_slot.put_count,
+            "processed": self.display_slot.put_count,
+            "displayed": self.displayed_count,
+            "dropped_before_processing": self.capture_slot.dropped,
+            "dropped_before_display": self.display_slot.dropped
+        }
+    
     def handle_camera_error(self, message):
         """
         Handle camera error.
@@ -666,31 +750,42 @@ class CameraFeed:
         """
         Process a frame using registered processors.
         
+        Processors receive a FrameContext and add annotations to it rather than
+        drawing on a copy of the frame. A processor that returns a new image
+        replaces the context's frame.
+        
         Args:
             frame: Frame to process
             
         Returns:
-            Processed frame
+            FrameContext: Context holding the frame and the processors' annotations
         """
-        processed_frame = frame.copy()
+        context = FrameContext(frame, self.gray_buffer)
         
         # Apply all frame processors
         for processor in self.frame_processors:
             try:
-                processed_frame = processor(processed_frame)
+                result = processor(context)
+                if isinstance(result, np.ndarray) and result is not context.frame:
+                    context.set_frame(result)
             except Exception as e:
                 self.logger.error(f"Error in frame processor: {e}")
         
-        return processed_frame
+        # Keep the grayscale buffer for the next frame
+        self.gray_buffer = context.gray_buffer
+        
+        return context
     
     def add_frame_processor(self, processor):
         """
         Add a frame processor.
         
         Args:
-            processor: Function that takes a frame and returns a processed frame
+            processor: Function that takes a FrameContext and annotates it
         """
-        self.frame_processors.append(processor)
+        # Restarting the camera shouldn't register the same processor twice
+        if processor not in self.frame_processors:
+            self.frame_processors.append(processor)
     
     def remove_frame_processor(self, processor):
         """
@@ -5,6 +5,7 @@ This module provides validation functions for user input.
 
 import re
 import os
+import pandas as pd
 
 def validate_student_id(student_id):
     """
@@ -54,6 +55,39 @@ def validate_name(name):
     
     return True
 
+def validate_student_ids(student_ids):
+    """
+    Validate many student IDs at once with the rules of validate_student_id.
+    
+    Args:
+        student_ids (pandas.Series): Student IDs as strings
+    
+    Returns:
+        pandas.Series: Boolean mask, True where the ID is valid
+    """
+    ids = pd.Series(student_ids, dtype=object).fillna('').astype(str)
+    
+    # Digits only, 3 to 10 characters
+    lengths = ids.str.len()
+    return ids.str.isdigit() & (lengths >= 3) & (lengths <= 10)
+
+def validate_names(names):
+    """
+    Validate many names at once with the rules of validate_name.
+    
+    Args:
+        names (pandas.Series): Names as strings
+    
+    Returns:
+        pandas.Series: Boolean mask, True where the name is valid
+    """
+    names = pd.Series(names, dtype=object).fillna('').astype(str)
+    
+    # 2 to 50 characters of letters, spaces, and common name characters
+    lengths = names.str.len()
+    pattern = names.str.match(r'^[A-Za-z\s\'\-\.]+$')
+    return pattern.fillna(False).astype(bool) & (lengths >= 2) & (lengths <= 50)
+
 def validate_subject(subject):
     """
     Validate a subject name.